@@ -1,14 +1,123 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from time import perf_counter
+begin = perf_counter()
 
+import argparse
 import sys
-import qdarkstyle
-from PyQt5 import (QtWidgets as qtw, QtCore as qtc, QtGui as qtg)
-from src import MainWindow
-
-app = qtw.QApplication(sys.argv)
-style = qdarkstyle.load_stylesheet_pyqt5()
-app.setStyleSheet(style)
-window = MainWindow()
-sys.exit(app.exec_())
+
+
+def main():
+    # the expert AI's worker processes import this module again, see
+    # ai.samplerPool
+    parser = argparse.ArgumentParser(description='battleship')
+    parser.add_argument('--server', metavar='HOST:PORT',
+                        help='play against other players on a match server')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print the time needed by the phases of the '
+                             'startup')
+    parser.add_argument('--metrics', metavar='FILE', nargs='?',
+                        const='metrics.jsonl',
+                        help='record timings of the hot paths as JSON lines '
+                             '(default file: %(const)s)')
+    parser.add_argument('--metrics-overlay', action='store_true',
+                        help='show frame and AI timings in the window')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='watch a recorded game')
+    parser.add_argument('--record', action='store_true',
+                        help='record the games against the AI as replays')
+    parser.add_argument('--ai', metavar='NAME', default='expert',
+                        help='the targeting strategy of the opponent, see '
+                             'src/strategies.py (default: %(default)s)')
+    parser.add_argument('--ai-workers', type=int, metavar='N',
+                        help='processes of the expert AI (0: none, default: '
+                             'one per core)')
+    parser.add_argument('--ai-budget', type=int, metavar='MS',
+                        help='time per move of the expert AI (default: 50)')
+    parser.add_argument('--size', metavar='WIDTHxHEIGHT',
+                        help='size of the grid (default: 10x10)')
+    parser.add_argument('--fleet', metavar='SHIPS',
+                        help='ships per type, e.g. Carrier=2,Destroyer=4 '
+                             '(default: one of each)')
+    args, qtArgs = parser.parse_known_args()
+    if args.ai != 'expert':
+        from src import strategies
+        if args.ai not in strategies.names():
+            parser.error(f"unknown AI {args.ai}, known are "
+                         f"{', '.join(strategies.names())}")
+    server = None
+    if args.server:
+        host, _, port = args.server.rpartition(':')
+        server = (host or 'localhost', int(port))
+
+    if args.metrics or args.metrics_overlay:
+        # before the instrumented modules are imported
+        from src import metrics
+        metrics.enable(args.metrics)
+
+    # parsed after metrics are enabled, the parsers import the engine
+    gridSize = fleet = None
+    if args.size or args.fleet:
+        from src.engine import FLEET
+        from src.placement import samplePlacements
+        from src.simulate import parseFleet, parseSize
+        try:
+            gridSize = parseSize(args.size) if args.size else (10, 10)
+            fleet = parseFleet(args.fleet) if args.fleet else FLEET
+            samplePlacements(gridSize, fleet)
+        except (ValueError, argparse.ArgumentTypeError) as error:
+            parser.error(f'unsupported grid size or fleet: {error}')
+
+    if args.ai_workers is not None or args.ai_budget is not None:
+        from src.ai import MonteCarloAI
+        if args.ai_workers is not None:
+            MonteCarloAI.workers = args.ai_workers
+        if args.ai_budget is not None:
+            MonteCarloAI.budget = args.ai_budget/1000
+
+    from src.startup import StartupProfile
+    profile = StartupProfile(begin, enabled=args.profile_startup)
+    profile.mark('arguments')
+
+    from PyQt5 import QtWidgets as qtw
+    profile.mark('import PyQt5')
+
+    app = qtw.QApplication(sys.argv[:1] + qtArgs)
+    profile.mark('QApplication')
+
+    from src.style import loadStylesheet
+    cached = loadStylesheet(app)
+    profile.mark('stylesheet (cached)' if cached else 'stylesheet (built)')
+
+    from src import MainWindow
+    profile.mark('import MainWindow')
+
+    window = MainWindow(server=server, strategy=args.ai, record=args.record,
+                        gridSize=gridSize, fleet=fleet)
+    profile.mark('MainWindow')
+
+    if args.replay:
+        try:
+            window.showReplay(args.replay)
+        except (OSError, ValueError) as error:
+            parser.error(f'can not open the replay: {error}')
+
+    if args.metrics_overlay:
+        from src.metricsWidgets import MetricsOverlay
+        # kept alive by its parent
+        MetricsOverlay(window)
+
+    if args.profile_startup:
+        window.firstPaint.connect(lambda: profile.mark('first paint'))
+
+        def warmedUp():
+            profile.mark('warm up')
+            profile.printReport()
+        window.warmedUp.connect(warmedUp)
+
+    sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,7 @@
-from .mainWindow import MainWindow
+def __getattr__(name):
+    # the Qt parts are only imported when they are used, so the engine and
+    # the AIs can be used without PyQt5
+    if name == 'MainWindow':
+        from .mainWindow import MainWindow
+        return MainWindow
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
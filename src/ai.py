@@ -0,0 +1,484 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait
+from math import lgamma, log
+from os import cpu_count
+from random import Random
+from time import monotonic
+import numpy as np
+
+from .engine import Geometry, FLEET
+from .openingBook import OpeningBook
+from .placement import PlacementTable
+
+
+class RandomAI:
+    """
+    simple opponent which fires at a random field that was not shot yet.
+
+    AIs only get to see an Observation of the board and must not depend on
+    Qt, so they can run in worker threads and processes
+    """
+
+    def __init__(self, fleet=FLEET, seed=None):
+        self.fleet = fleet
+        self.rng = Random(seed)
+
+    def nextShot(self, observation):
+        """
+        returns the (row, column) index of the next field to fire at
+        """
+        geometry = Geometry.get(observation.gridSize)
+        shots = observation.shots
+        free = geometry.size - len(shots)
+        if not free:
+            raise ValueError('there is no field left to fire at')
+        if 2*free > geometry.size:
+            # mostly unshot board, guessing is cheaper than counting
+            while True:
+                n = self.rng.randrange(geometry.size)
+                if n not in shots:
+                    return divmod(n, geometry.width)
+        # pick the k-th free field, skipping whole chunks of 64 fields
+        k = self.rng.randrange(free)
+        for key in range((geometry.size + 63) >> 6):
+            chunk = ~shots.chunks.get(key, 0) & ((1 << 64) - 1)
+            if (key + 1) << 6 > geometry.size:
+                chunk &= (1 << (geometry.size - (key << 6))) - 1
+            count = bin(chunk).count('1')
+            if k >= count:
+                k -= count
+                continue
+            for _ in range(k):
+                chunk &= chunk - 1
+            n = (key << 6) + (chunk & -chunk).bit_length() - 1
+            return divmod(n, geometry.width)
+
+
+def _cumulative(a):
+    """
+    cumulative sums along the last axis of a with a leading 0, the sum of the
+    n entries starting at k is c[..., k + n] - c[..., k]
+    """
+    c = np.zeros(a.shape[:-1] + (a.shape[-1] + 1,), dtype=np.int64)
+    np.cumsum(a, axis=-1, out=c[..., 1:])
+    return c
+
+
+def _windowSum(c, n):
+    """
+    sums of n consecutive entries for the cumulative sums c
+    """
+    return c[..., n:] - c[..., :-n]
+
+
+class HunterAI:
+    """
+    opponent which fires at the field covered by the most legal placements of
+    the remaining ships (probability density). Placements are legal when they
+    do not cover a miss or the zone of a sunk ship and do not touch a hit
+    with their zone unless they cover it (ships may not touch, see
+    Board.isValid).
+
+    As long as there are hits of ships which are not sunk yet the AI is in
+    target mode and only counts placements which cover such hits, weighted by
+    the number of hits they cover.
+
+    Placements are counted with sliding window sums over the whole board for
+    every ship length and orientation, so a turn costs a few array operations
+    per ship length no matter how many placements there are.
+
+    Until the first hit the shots are taken from the opening book of the
+    board and fleet if there is one (see openingBook.py)
+    """
+
+    def __init__(self, fleet=FLEET, seed=None, openings=True):
+        self.fleet = fleet
+        self.rng = np.random.default_rng(seed)
+        self.openings = openings
+        self.gridSize = None
+        self.shots = None
+        self.blocked = None
+        self.hits = None
+        self.sunk = ()
+
+    def _unpack(self, cellSet):
+        width, height = self.gridSize
+        size = width*height
+        if Geometry.get(self.gridSize).dense:
+            mask = cellSet.mask()
+            data = np.frombuffer(mask.to_bytes((size + 7)//8, 'little'),
+                                 np.uint8)
+            cells = np.unpackbits(data, bitorder='little')[:size].astype(bool)
+        else:
+            cells = np.zeros(size, dtype=bool)
+            positions = np.fromiter(cellSet, dtype=np.int64,
+                                    count=len(cellSet))
+            cells[positions] = True
+        return cells.reshape(height, width)
+
+    def update(self, observation):
+        """
+        bring the shot history up to date with the observation
+        """
+        self.gridSize = observation.gridSize
+        geometry = Geometry.get(self.gridSize)
+        sunkCells, sunkZone = [], []
+        for placement in observation.sunk:
+            cells, zone = geometry.fields(*placement[1:])
+            sunkCells.extend(cells)
+            sunkZone.extend(zone)
+        self.sunk = tuple(placement.shipId for placement in observation.sunk)
+        self.shots = self._unpack(observation.shots)
+        hits = self._unpack(observation.hits)
+        # fields no remaining ship can occupy
+        self.blocked = self.shots & ~hits
+        self.blocked.flat[sunkZone] = True
+        # hits of the ships which are still afloat
+        hits.flat[sunkCells] = False
+        self.hits = hits
+
+    def remainingShips(self):
+        """
+        returns {extent: number of ships} for the ships which are still afloat
+        """
+        remaining = {}
+        for shipId, extent in self.fleet:
+            if shipId not in self.sunk:
+                remaining[extent] = remaining.get(extent, 0) + 1
+        return remaining
+
+    def heatmap(self, targetMode=True):
+        blocked = self.blocked.astype(np.int32)
+        hits = self.hits.astype(np.int32)
+        heat = np.zeros(self.shots.shape, dtype=np.int64)
+        anyHits = hits.any()
+        target = targetMode and anyHits
+        remaining = self.remainingShips()
+        # vertical placements are horizontal placements on the transposed board
+        for transpose in (False, True):
+            b, h = (blocked.T, hits.T) if transpose else (blocked, hits)
+            rows, cols = b.shape
+            cBlocked = _cumulative(b)
+            if anyHits:
+                cHits = _cumulative(h)
+                hitsPadded = np.zeros((rows + 2, cols + 2), dtype=np.int32)
+                hitsPadded[1:-1, 1:-1] = h
+                cNeighbours = _cumulative(
+                        hitsPadded[:-2] + hitsPadded[1:-1] + hitsPadded[2:])
+            part = np.zeros((rows, cols + 1), dtype=np.int64)
+            for extent, count in remaining.items():
+                if extent > cols:
+                    continue
+                legal = _windowSum(cBlocked, extent) == 0
+                if anyHits:
+                    covered = _windowSum(cHits, extent)
+                    legal &= _windowSum(cNeighbours, extent + 2) == covered
+                if target:
+                    weight = np.where(legal, covered, 0)*count
+                else:
+                    weight = legal*count
+                # every placement adds its weight to the fields it covers:
+                # mark where the weight starts and where it ends and sum up
+                placements = weight.shape[1]
+                part[:, :placements] += weight
+                part[:, extent:extent + placements] -= weight
+            part = np.cumsum(part[:, :-1], axis=1)
+            heat += part.T if transpose else part
+        return heat
+
+    def openingShot(self, observation):
+        """
+        the shot of the opening book, None after the first hit or if the
+        book has no entry for the misses
+        """
+        if self.openings and not observation.hits:
+            book = OpeningBook.get(observation.gridSize, self.fleet)
+            moves = book.moves(observation.shots) if book else ()
+            if moves:
+                return divmod(int(self.rng.choice(moves)),
+                              observation.gridSize[0])
+        return None
+
+    def nextShot(self, observation):
+        """
+        returns the (row, column) index of the next field to fire at
+        """
+        target = self.openingShot(observation)
+        if target is not None:
+            return target
+        self.update(observation)
+        if self.shots.all():
+            raise ValueError('there is no field left to fire at')
+        heat = self.heatmap()
+        heat[self.shots] = -1
+        if heat.max() <= 0:
+            # the hits are explained without further shots (e.g. they belong
+            # to sunk ships), hunt for the next ship
+            heat = self.heatmap(targetMode=False)
+            heat[self.shots] = -1
+        if heat.max() <= 0:
+            heat = np.where(self.shots, -1, 0)
+        candidates = np.flatnonzero(heat == heat.max())
+        return divmod(int(self.rng.choice(candidates)), self.gridSize[0])
+
+
+class FleetSampler:
+    """
+    draws fleets which agree with an Observation: the remaining ships cover
+    every hit of a ship which is not sunk, no miss and no field next to a
+    sunk ship, and do not touch each other (see Board.isValid). A placement
+    may not cover hits only, the ship would be sunk.
+
+    The hits are covered first, each by a random placement through it, then
+    the other ships take random placements which do not touch the ships
+    placed so far. A draw which gets stuck is dropped. Fleets are not drawn
+    with equal probability, so every draw comes with the log of its
+    importance weight: the product of the number of options at every step,
+    divided by k! for every length of which k ships were placed in the
+    second stage, since these ships could have been placed in any order.
+    Uses the masks of the PlacementTable, so it is meant for small boards
+    only
+    """
+
+    def __init__(self, observation, fleet=FLEET, tries=50):
+        self.tries = tries
+        table = PlacementTable.get(observation.gridSize)
+        geometry = table.geometry
+        hits = observation.hits.mask()
+        sunkIds = set()
+        sunkCells = sunkZone = 0
+        for placement in observation.sunk:
+            mask, zone = geometry.footprint(*placement[1:])
+            sunkIds.add(placement.shipId)
+            sunkCells |= mask
+            sunkZone |= zone
+        self.hits = hits & ~sunkCells
+        blocked = (observation.shots.mask() & ~hits) | sunkZone
+        self.extents = sorted(
+                (extent for shipId, extent in fleet if shipId not in sunkIds),
+                reverse=True)
+        self.legal = {}
+        self.covering = {}
+        for extent in set(self.extents):
+            legal = self.legal[extent] = [
+                    (mask, zone) for _, _, mask, zone
+                    in table.placements(extent)
+                    if not mask & blocked and not zone & ~mask & self.hits
+                    and mask & ~self.hits]
+            for mask, zone in legal:
+                covered = mask & self.hits
+                while covered:
+                    low = covered & -covered
+                    self.covering.setdefault(low, []).append(
+                            (extent, mask, zone))
+                    covered ^= low
+
+    def sample(self, rng):
+        """
+        returns the mask of the fields covered by a random fleet and the log
+        of its weight, None if the draw got stuck
+        """
+        ships = list(self.extents)
+        forbidden = occupied = 0
+        weight = 0.
+        uncovered = self.hits
+        while uncovered:
+            lowest = uncovered & -uncovered
+            options = [
+                    entry for entry in self.covering.get(lowest, ())
+                    if not entry[1] & forbidden and entry[0] in ships]
+            if not options:
+                return None
+            extent, mask, zone = options[rng.randrange(len(options))]
+            weight += log(len(options))
+            ships.remove(extent)
+            forbidden |= zone
+            occupied |= mask
+            uncovered &= ~mask
+        for extent in ships:
+            options = [entry for entry in self.legal[extent]
+                       if not entry[0] & forbidden]
+            if not options:
+                return None
+            mask, zone = options[rng.randrange(len(options))]
+            weight += log(len(options))
+            forbidden |= zone
+            occupied |= mask
+        weight -= sum(lgamma(count + 1) for count in Counter(ships).values())
+        return occupied, weight
+
+
+def sampleCounts(observation, fleet, deadline, seed=None, limit=None):
+    """
+    draws fleets for the observation (see FleetSampler) until the deadline
+    (time.monotonic), or, with a limit, until limit fleets are drawn (giving
+    up after 20 attempts per fleet). Returns the number of fleets drawn and
+    the probability that a field is covered (the weighted share of the
+    fleets covering it) times that number, so the counts of several workers
+    add up. Runs in the workers of MonteCarloAI
+    """
+    sampler = FleetSampler(observation, fleet)
+    rng = Random(seed)
+    size = Geometry.get(observation.gridSize).size
+    length = (size + 7)//8
+    fleets, weights = [], []
+    attempts = 0
+    while (monotonic() < deadline if limit is None
+           else len(fleets) < limit and attempts < 20*limit):
+        attempts += 1
+        fleet = sampler.sample(rng)
+        if fleet is not None:
+            fleets.append(fleet[0].to_bytes(length, 'little'))
+            weights.append(fleet[1])
+    if not fleets:
+        return None, 0
+    data = np.frombuffer(b''.join(fleets), np.uint8).reshape(len(fleets), -1)
+    cells = np.unpackbits(data, axis=1, bitorder='little')[:, :size]
+    # normalize in the log domain, the weights themselves overflow floats
+    weights = np.array(weights)
+    weights = np.exp(weights - weights.max())
+    weights *= len(fleets)/weights.sum()
+    return weights @ cells, len(fleets)
+
+
+_pools = {}
+
+
+def _shutdownPools():
+    for pool in _pools.values():
+        pool.shutdown(wait=True, cancel_futures=True)
+    _pools.clear()
+
+
+def samplerPool(workers):
+    """
+    the process pool shared by all MonteCarloAIs with this many workers.
+    The GUI runs threads already, so workers are not forked from the calling
+    process but from a fork server which has this module imported (spawned
+    where there is none). Both import the main module (e.g. run.py) again,
+    it must only start the program under if __name__ == '__main__'.
+
+    Returns None in a worker process (e.g. of a simulation): a pool of its
+    own would compete for the cores and keep the worker from exiting
+    """
+    if multiprocessing.parent_process() is not None:
+        return None
+    if not _pools:
+        atexit.register(_shutdownPools)
+    if workers not in _pools:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload([__name__])
+        else:
+            context = multiprocessing.get_context('spawn')
+        pool = _pools[workers] = ProcessPoolExecutor(workers,
+                                                     mp_context=context)
+        # workers are started on demand, start them before the first move
+        for _ in range(workers):
+            pool.submit(int)
+    return _pools[workers]
+
+
+class MonteCarloAI(HunterAI):
+    """
+    opponent which draws as many fleets agreeing with the shots so far as it
+    can within its time budget (see FleetSampler) and fires at the field
+    covered most often. Drawing is spread over a pool of worker processes
+    (none or inside a worker process: in the calling thread), the move takes
+    the fleets drawn when the budget is used up, so it never takes much
+    longer than budget seconds.
+
+    With a sampleLimit the AI draws that many fleets per move instead, however
+    long it takes: its moves depend on the seed (and the number of workers)
+    only, not on the load of the machine. Simulations and tournaments use
+    it, see batchMode.
+
+    Until the first hit the opening book is used. On large boards or when no
+    fleet could be drawn in time the shot is taken from the heatmap of
+    HunterAI. Defaults for workers, budget and sampleLimit are the class
+    attributes
+    """
+
+    workers = cpu_count()
+    budget = .05
+    # part of the budget left for collecting the results of the workers
+    margin = .01
+    sampleLimit = None
+
+    def __init__(self, fleet=FLEET, seed=None, openings=True, workers=None,
+                 budget=None, sampleLimit=None):
+        super(MonteCarloAI, self).__init__(fleet, seed, openings)
+        if workers is not None:
+            self.workers = workers
+        if budget is not None:
+            self.budget = budget
+        if sampleLimit is not None:
+            self.sampleLimit = sampleLimit
+        self.samples = 0
+        if self.workers:
+            samplerPool(self.workers)
+
+    def counts(self, observation):
+        """
+        how often every field is covered by the fleets drawn within the
+        budget (or the sampleLimit), None if no fleet was drawn
+        """
+        begin = monotonic()
+        deadline = begin + max(self.budget - self.margin, 0)
+        limit = self.sampleLimit
+        pool = samplerPool(self.workers) if self.workers else None
+        seeds = self.rng.integers(1 << 63, size=max(self.workers, 1)).tolist()
+        if pool is None:
+            counts, self.samples = sampleCounts(
+                    observation, self.fleet, deadline, seeds[0], limit)
+            return counts
+        limits = ([limit//len(seeds) + (no < limit % len(seeds))
+                   for no in range(len(seeds))] if limit
+                  else [None]*len(seeds))
+        futures = [pool.submit(sampleCounts, observation, self.fleet,
+                               deadline, seed, workerLimit)
+                   for seed, workerLimit in zip(seeds, limits)]
+        done, late = wait(futures, timeout=None if limit else max(
+                begin + self.budget - monotonic(), 0))
+        for future in late:
+            future.cancel()
+        total, self.samples = None, 0
+        for future in done:
+            counts, samples = future.result()
+            if samples:
+                total = counts if total is None else total + counts
+                self.samples += samples
+        return total
+
+    def nextShot(self, observation):
+        """
+        returns the (row, column) index of the next field to fire at
+        """
+        target = self.openingShot(observation)
+        if target is not None:
+            return target
+        geometry = Geometry.get(observation.gridSize)
+        if len(observation.shots) >= geometry.size:
+            raise ValueError('there is no field left to fire at')
+        counts = self.counts(observation) if geometry.dense else None
+        if counts is None:
+            return super(MonteCarloAI, self).nextShot(observation)
+        counts[list(observation.shots)] = -1
+        candidates = np.flatnonzero(counts == counts.max())
+        return divmod(int(self.rng.choice(candidates)), geometry.width)
+
+
+def batchMode(sampleLimit=1000):
+    """
+    set up MonteCarloAI for the games of a simulation or a tournament, in
+    their worker processes: they use all cores already, so no pool of its
+    own, and a fixed number of fleets per move, so a game depends on its
+    seed only
+    """
+    MonteCarloAI.workers = 0
+    MonteCarloAI.sampleLimit = sampleLimit
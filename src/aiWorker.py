@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from threading import Event
+from PyQt5 import QtCore as qtc
+
+from . import metrics
+
+
+class _MoveSignals(qtc.QObject):
+
+    finished = qtc.pyqtSignal(int, object)
+    failed = qtc.pyqtSignal(int, object)
+
+
+class _MoveJob(qtc.QRunnable):
+    """
+    computes a single move on the thread pool. The result is delivered via
+    signals of an object living in the GUI thread, i.e. queued
+    """
+
+    def __init__(self, ai, observation, requestId):
+        super(_MoveJob, self).__init__()
+        self.ai = ai
+        self.observation = observation
+        self.requestId = requestId
+        self.cancelled = Event()
+        self.signals = _MoveSignals()
+
+    def run(self):
+        if self.cancelled.is_set():
+            return
+        try:
+            with metrics.timer('ai.move'):
+                target = self.ai.nextShot(self.observation)
+        except Exception as error:
+            self.signals.failed.emit(self.requestId, error)
+            return
+        if not self.cancelled.is_set():
+            self.signals.finished.emit(self.requestId, target)
+
+
+class AIWorker(qtc.QObject):
+    """
+    runs the moves of an AI (see ai.RandomAI) off the GUI thread.
+
+    requestMove hands an Observation of the board to the AI, moveReady is
+    emitted with the target once the AI is done, but not before minDelay ms
+    have passed. A pending move can be dropped with cancel
+    """
+
+    moveReady = qtc.pyqtSignal(object)
+    moveFailed = qtc.pyqtSignal(object)
+
+    def __init__(self, ai, parent=None, minDelay=0):
+        super(AIWorker, self).__init__(parent)
+        self.ai = ai
+        self.minDelay = minDelay
+        # one thread per AI, the AI object is never used concurrently
+        self.pool = qtc.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.delayTimer = qtc.QTimer(self)
+        self.delayTimer.setSingleShot(True)
+        self.delayTimer.timeout.connect(self._deliver)
+        self.clock = qtc.QElapsedTimer()
+        self._requestId = 0
+        self._job = None
+        self._target = None
+
+    def requestMove(self, observation):
+        self.cancel()
+        self._job = _MoveJob(self.ai, observation, self._requestId)
+        self._job.signals.finished.connect(self._onFinished)
+        self._job.signals.failed.connect(self._onFailed)
+        self.clock.start()
+        self.pool.start(self._job)
+
+    def cancel(self):
+        """
+        drop the pending move, its result will never be delivered
+        """
+        self._requestId += 1
+        self.delayTimer.stop()
+        self.pool.clear()
+        if self._job:
+            self._job.cancelled.set()
+            self._job = None
+            metrics.count('ai.cancelled')
+        self._target = None
+
+    def isBusy(self):
+        return self._job is not None
+
+    def _onFinished(self, requestId, target):
+        if requestId != self._requestId:
+            return
+        self._target = target
+        remaining = self.minDelay - self.clock.elapsed()
+        if remaining > 0:
+            self.delayTimer.start(remaining)
+        else:
+            self._deliver()
+
+    def _onFailed(self, requestId, error):
+        if requestId != self._requestId:
+            return
+        self._job = None
+        self.moveFailed.emit(error)
+
+    def _deliver(self):
+        target = self._target
+        self._job = None
+        self._target = None
+        self.moveReady.emit(target)
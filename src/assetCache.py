@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from math import ceil
+from PyQt5 import (
+        QtWidgets as qtw, QtCore as qtc, QtGui as qtg, QtSvg as qsvg)
+
+
+class AssetCache:
+    """
+    process wide cache of the svg assets. Every asset is parsed once into a
+    QSvgRenderer which is shared by all items showing it (see
+    QGraphicsSvgItem.setSharedRenderer). Rasterized versions of the assets are
+    kept in a LRU cache of QPixmaps limited to maxBytes
+    """
+
+    def __init__(self, maxBytes=32*1024**2):
+        self.maxBytes = maxBytes
+        self._renderers = {}
+        self._pixmaps = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def renderer(self, path):
+        path = str(path)
+        if path not in self._renderers:
+            renderer = qsvg.QSvgRenderer(path)
+            if not renderer.isValid():
+                raise ValueError(f'{path} is not a valid svg file')
+            self._renderers[path] = renderer
+        return self._renderers[path]
+
+    def pixmap(self, path, scale=1., rotation=0, devicePixelRatio=None):
+        """
+        returns the asset rendered at the given scale and rotation (degrees).
+        The pixmap has the device pixel ratio set, so it has the same logical
+        size as an svg item with the same scale and rotation
+        """
+        if devicePixelRatio is None:
+            devicePixelRatio = qtw.QApplication.instance().devicePixelRatio()
+        key = (str(path), scale, rotation, devicePixelRatio)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self.hits += 1
+            self._pixmaps.move_to_end(key)
+            return pixmap
+
+        self.misses += 1
+        pixmap = self._rasterize(
+                self.renderer(path), scale, rotation, devicePixelRatio)
+        self._pixmaps[key] = pixmap
+        self.bytes += self._size(pixmap)
+        while self.bytes > self.maxBytes and len(self._pixmaps) > 1:
+            _, dropped = self._pixmaps.popitem(last=False)
+            self.bytes -= self._size(dropped)
+        return pixmap
+
+    def _rasterize(self, renderer, scale, rotation, devicePixelRatio):
+        bounds = qtc.QRectF(qtc.QPointF(0, 0),
+                            qtc.QSizeF(renderer.defaultSize()))
+        factor = scale*devicePixelRatio
+        transform = qtg.QTransform().scale(factor, factor).rotate(rotation)
+        target = transform.mapRect(bounds)
+        pixmap = qtg.QPixmap(ceil(target.width()), ceil(target.height()))
+        pixmap.fill(qtc.Qt.transparent)
+        painter = qtg.QPainter(pixmap)
+        painter.setRenderHint(qtg.QPainter.Antialiasing)
+        painter.setRenderHint(qtg.QPainter.SmoothPixmapTransform)
+        painter.translate(-target.topLeft())
+        painter.setTransform(transform, True)
+        renderer.render(painter, bounds)
+        painter.end()
+        pixmap.setDevicePixelRatio(devicePixelRatio)
+        return pixmap
+
+    @staticmethod
+    def _size(pixmap):
+        return pixmap.width()*pixmap.height()*pixmap.depth()//8
+
+    def clear(self):
+        self._pixmaps.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+                'renderers': len(self._renderers),
+                'pixmaps': len(self._pixmaps),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes': self.bytes}
+
+    def report(self):
+        return ('asset cache: {renderers} renderers, {pixmaps} pixmaps, '
+                '{hits} hits, {misses} misses, {bytes} bytes').format(
+                        **self.stats())
+
+
+assets = AssetCache()
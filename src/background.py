@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+from collections import OrderedDict
+from threading import Lock
+from PyQt5 import (QtWidgets as qtw, QtCore as qtc, QtGui as qtg)
+
+
+class _ScaleSignals(qtc.QObject):
+
+    finished = qtc.pyqtSignal(object, object)   # key, QImage
+
+
+class _ScaleJob(qtc.QRunnable):
+    """
+    decodes the image if needed and scales it to the size of key on the
+    thread pool. QImage may be used outside of the GUI thread, QPixmap not
+    """
+
+    def __init__(self, image, key):
+        super(_ScaleJob, self).__init__()
+        self.image = image
+        self.key = key
+        self.signals = _ScaleSignals()
+
+    def run(self):
+        width, height, devicePixelRatio = self.key
+        scaled = self.image.source().scaled(
+                qtc.QSize(round(width*devicePixelRatio),
+                          round(height*devicePixelRatio)),
+                qtc.Qt.IgnoreAspectRatio, qtc.Qt.SmoothTransformation)
+        self.signals.finished.emit(self.key, scaled)
+
+
+class BackgroundImage(qtc.QObject):
+    """
+    an image file shared by all widgets showing it as background. The file is
+    decoded once, at most at the resolution of the largest screen, and kept
+    as QImage. Scaled versions are made on a thread pool and kept in a small
+    LRU cache of QPixmaps keyed by (width, height, device pixel ratio)
+    """
+
+    scaled = qtc.pyqtSignal(object)     # key
+
+    _images = {}
+
+    def __init__(self, path, maxPixmaps=3):
+        super(BackgroundImage, self).__init__(
+                qtw.QApplication.instance())
+        self.path = str(path)
+        self.maxPixmaps = maxPixmaps
+        self._source = None
+        self._sourceLock = Lock()
+        self._pixmaps = OrderedDict()
+        self._jobs = {}
+        # screens may only be asked in the GUI thread
+        self.screenSizes = [screen.size()*screen.devicePixelRatio()
+                            for screen in qtg.QGuiApplication.screens()]
+        self.pool = qtc.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        qtw.QApplication.instance().aboutToQuit.connect(self.shutDown)
+
+    @classmethod
+    def get(cls, path):
+        path = str(path)
+        if path not in cls._images:
+            cls._images[path] = cls(path)
+        return cls._images[path]
+
+    def source(self):
+        """
+        the decoded image, decoded by the first caller (any thread)
+        """
+        with self._sourceLock:
+            if self._source is None:
+                self._source = self._decode()
+            return self._source
+
+    def _decode(self):
+        reader = qtg.QImageReader(self.path)
+        size = reader.size()
+        if size.isValid() and self.screenSizes:
+            # JPEGs are decoded much faster at a reduced size
+            factor = min(1., max(max(screen.width()/size.width(),
+                                     screen.height()/size.height())
+                                 for screen in self.screenSizes))
+            if factor < 1:
+                reader.setScaledSize(qtc.QSize(
+                        round(size.width()*factor),
+                        round(size.height()*factor)))
+        image = reader.read()
+        if image.isNull():
+            # runs on the thread pool, an exception would end the process
+            print(f'can not read {self.path}: {reader.errorString()}',
+                  file=sys.stderr)
+        return image
+
+    def preload(self):
+        """
+        decode the file on the thread pool
+        """
+        if self._source is None:
+            self.pool.start(self.source)
+
+    def shutDown(self):
+        """
+        drop the queued jobs and wait for the running one, it must not
+        outlive the application
+        """
+        self.pool.clear()
+        self.pool.waitForDone()
+
+    def pixmap(self, key):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def latest(self):
+        """
+        the pixmap scaled last, to be stretched while the right one is made
+        """
+        return next(reversed(self._pixmaps.values()), None)
+
+    def request(self, key):
+        """
+        make the pixmap for key unless it is cached or being made, scaled is
+        emitted when it is ready
+        """
+        if key in self._pixmaps or key in self._jobs:
+            return
+        job = _ScaleJob(self, key)
+        job.signals.finished.connect(self.onScaled)
+        self._jobs[key] = job
+        self.pool.start(job)
+
+    def onScaled(self, key, image):
+        del self._jobs[key]
+        if image.isNull():
+            return
+        pixmap = qtg.QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(key[2])
+        self._pixmaps[key] = pixmap
+        while len(self._pixmaps) > self.maxPixmaps:
+            self._pixmaps.popitem(last=False)
+        self.scaled.emit(key)
+
+
+class Background(qtc.QObject):
+    """
+    paints a BackgroundImage stretched over a widget, below its children.
+    After a resize the image is scaled again once the size did not change for
+    debounce ms, until then the last pixmap is stretched to the widget
+    """
+
+    debounce = 150
+
+    def __init__(self, path, widget):
+        super(Background, self).__init__(widget)
+        self.widget = widget
+        self.image = BackgroundImage.get(path)
+        self.image.scaled.connect(self.onScaled)
+        self.current = None
+        self.timer = qtc.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.rescale)
+        widget.installEventFilter(self)
+
+    def key(self):
+        size = self.widget.size()
+        return (size.width(), size.height(),
+                self.widget.devicePixelRatioF())
+
+    def eventFilter(self, watched, event):
+        if watched is self.widget:
+            if event.type() == qtc.QEvent.Paint:
+                self.paint()
+            elif event.type() in (qtc.QEvent.Resize, qtc.QEvent.Show):
+                self.resized()
+        return super(Background, self).eventFilter(watched, event)
+
+    def resized(self):
+        if not self.widget.isVisible():
+            return
+        pixmap = self.image.pixmap(self.key())
+        if pixmap is not None:
+            self.timer.stop()
+            self.current = pixmap
+            return
+        self.current = self.current or self.image.latest()
+        # nothing to show yet, no need to wait for the resizing to end
+        self.timer.start(self.debounce if self.current else 0)
+
+    def rescale(self):
+        self.image.request(self.key())
+
+    def onScaled(self, key):
+        if key == self.key():
+            self.current = self.image.pixmap(key)
+            self.widget.update()
+
+    def paint(self):
+        if self.current is None:
+            return
+        painter = qtg.QPainter(self.widget)
+        painter.drawPixmap(self.widget.rect(), self.current)
+        painter.end()
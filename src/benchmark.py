@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmarks of the hot paths with regression gates, e.g.
+
+    python -m src.benchmark --save          # record a baseline
+    python -m src.benchmark                 # compare with the baseline
+
+The Qt benchmarks run on the offscreen platform unless QT_QPA_PLATFORM is set
+"""
+
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from .ai import HunterAI, RandomAI
+from .engine import Board, FLEET, makeFleet
+from .placement import PlacementTable, PlacementValidator, randomBoard
+
+BENCHMARKS = {}
+
+
+def benchmark(name, qt=False, number=1, repeat=7):
+    """
+    register a benchmark. The decorated function sets it up and returns the
+    callable to time, which is run number times per repetition
+    """
+    def register(setup):
+        BENCHMARKS[name] = {
+                'setup': setup, 'qt': qt, 'number': number, 'repeat': repeat}
+        return setup
+    return register
+
+
+def _observations(ai, count, seed=0):
+    """
+    the observations an AI sees during the first count turns of a game
+    """
+    board = randomBoard(rng=Random(seed))
+    observations = []
+    for _ in range(count):
+        observation = board.observe()
+        observations.append(observation)
+        board.shoot(ai.nextShot(observation))
+    return observations
+
+
+def _cycle(items, function):
+    position = [0]
+
+    def run():
+        function(items[position[0]])
+        position[0] = (position[0] + 1) % len(items)
+    return run
+
+
+@benchmark('placement.sample', number=100)
+def _placementSample():
+    table = PlacementTable.get((10, 10))
+    rng = Random(0)
+    return lambda: table.sample(FLEET, rng)
+
+
+@benchmark('placement.sampleUniform', number=100)
+def _placementSampleUniform():
+    table = PlacementTable.get((10, 10))
+    rng = Random(0)
+    return lambda: table.sample(FLEET, rng, uniform=True)
+
+
+@benchmark('validator.move', number=1000)
+def _validatorMove():
+    rng = Random(0)
+    validator = PlacementValidator((10, 10))
+    table = PlacementTable.get((10, 10))
+    for placement in table.sample(FLEET, rng):
+        validator.move(*placement)
+    moves = [('Carrier', 5) + rng.choice(table.placements(5))[:2]
+             for _ in range(1000)]
+
+    def move(args):
+        validator.move(*args)
+        validator.isValid()
+    return _cycle(moves, move)
+
+
+@benchmark('board.isValid', number=1000)
+def _boardIsValid():
+    board = randomBoard(rng=Random(0))
+    return board.isValid
+
+
+@benchmark('board.shootAll', number=20)
+def _boardShootAll():
+    placements = PlacementTable.get((10, 10)).sample(FLEET, Random(0))
+    cells = [(i, j) for i in range(10) for j in range(10)]
+
+    def run():
+        board = Board()
+        for placement in placements:
+            board.placeShip(*placement)
+        for cell in cells:
+            if board.shoot(cell).result == 'destroyed':
+                break
+    return run
+
+
+# training event setup: a 1000x1000 board with 500 ships
+LARGE_GRID = (1000, 1000)
+LARGE_FLEET = makeFleet({
+        'Carrier': 50, 'Battleship': 100, 'Submarine': 100, 'Cruiser': 100,
+        'Destroyer': 150})
+
+
+@benchmark('board.large', number=5)
+def _boardLarge():
+    """
+    place, validate and sink a fleet of 500 ships on a 1000x1000 board
+    """
+    rng = Random(0)
+
+    def run():
+        board = randomBoard(LARGE_GRID, LARGE_FLEET, rng)
+        board.isValid()
+        for placement in board.ships.values():
+            for n in board.geometry.fields(*placement[1:])[0]:
+                board.shoot(divmod(n, board.geometry.width))
+        assert board.isEliminated()
+    return run
+
+
+@benchmark('ai.random', number=50)
+def _aiRandom():
+    ai = RandomAI(seed=0)
+    return _cycle(_observations(RandomAI(seed=1), 50), ai.nextShot)
+
+
+@benchmark('ai.hunter', number=50)
+def _aiHunter():
+    ai = HunterAI(seed=0, openings=False)
+    return _cycle(_observations(HunterAI(seed=1), 50), ai.nextShot)
+
+
+@benchmark('ai.hunterOpening', number=50)
+def _aiHunterOpening():
+    ai = HunterAI(seed=0)
+    observations = [observation
+                    for observation in _observations(HunterAI(seed=1), 50)
+                    if not observation.hits]
+    return _cycle(observations, ai.nextShot)
+
+
+_app = None
+# views (which own their scenes) of the benchmarks set up so far
+_views = []
+
+
+def _application():
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtWidgets as qtw
+    if not qtw.QApplication.instance():
+        _app = qtw.QApplication(sys.argv[:1])
+    return qtw.QApplication.instance()
+
+
+def _grid(**kwargs):
+    from .gridWidget import BoardView, Grid
+    view = BoardView()
+    grid = Grid(view, **kwargs)
+    view.setScene(grid)
+    _views.append(view)
+    return view, grid
+
+
+@benchmark('grid.createGrid', qt=True, number=10)
+def _gridCreateGrid():
+    _application()
+
+    def run():
+        _grid()
+        _views.pop().deleteLater()
+    return run
+
+
+@benchmark('grid.randomizePlacement', qt=True, number=20)
+def _gridRandomizePlacement():
+    _application()
+    view, grid = _grid(seed=0)
+    return grid.randomizePlacement
+
+
+@benchmark('grid.markState', qt=True, number=200)
+def _gridMarkState():
+    _application()
+    view, grid = _grid(seed=0)
+    grid.randomizePlacement()
+    return grid.markState
+
+
+@benchmark('grid.checkReady', qt=True, number=1000)
+def _gridCheckReady():
+    _application()
+    view, grid = _grid(seed=0)
+    grid.randomizePlacement()
+    return grid.checkReady
+
+
+@benchmark('ship.drag', qt=True, repeat=5)
+def _shipDrag():
+    """
+    drag a ship with 1000 mouse move events sent through the view
+    """
+    from PyQt5 import (QtCore as qtc, QtGui as qtg)
+    app = _application()
+    view, grid = _grid(seed=0)
+    grid.randomizePlacement()
+    view.resize(400, 400)
+    view.show()
+    app.processEvents()
+
+    viewport = view.viewport()
+
+    def mouseEvent(kind, pos, button, buttons):
+        event = qtg.QMouseEvent(
+                kind, qtc.QPointF(pos), qtc.QPointF(viewport.mapToGlobal(pos)),
+                button, buttons, qtc.Qt.NoModifier)
+        app.sendEvent(viewport, event)
+
+    def run():
+        ship = grid.ships[0]
+        start = view.mapFromScene(ship.sceneBoundingRect().center())
+        left, none = qtc.Qt.LeftButton, qtc.Qt.NoButton
+        mouseEvent(qtc.QEvent.MouseButtonPress, start, left, left)
+        for step in range(1000):
+            offset = qtc.QPoint(step % 200 - 100, (step*7) % 200 - 100)
+            mouseEvent(qtc.QEvent.MouseMove, start + offset, none, left)
+        mouseEvent(qtc.QEvent.MouseButtonRelease, start, left, none)
+    return run
+
+
+@benchmark('grid.render', qt=True, number=5)
+def _gridRender():
+    """
+    render a board with ships and all fields shot to an image
+    """
+    from PyQt5 import (QtCore as qtc, QtGui as qtg)
+    _application()
+    view, grid = _grid(seed=0)
+    grid.randomizePlacement()
+    grid.finalizePlacement()
+    for i in range(10):
+        for j in range(10):
+            if not grid.board.isEliminated():
+                grid.fire((i, j))
+    image = qtg.QImage(1000, 1000, qtg.QImage.Format_ARGB32_Premultiplied)
+
+    def run():
+        image.fill(qtc.Qt.transparent)
+        painter = qtg.QPainter(image)
+        grid.render(painter)
+        painter.end()
+    return run
+
+
+@benchmark('grid.markShot', qt=True, number=10)
+def _gridMarkShot():
+    """
+    mark 1000 shots at a 1000x1000 board in the shot overlay
+    """
+    _application()
+    view, grid = _grid(seed=0, gridSize=LARGE_GRID, fleet=LARGE_FLEET)
+    cells = [(k, (k*7) % 1000) for k in range(1000)]
+    mark = grid.overlay.mark
+
+    def run():
+        for cell in cells:
+            mark(cell, False)
+    return run
+
+
+def _frame(width, height, **kwargs):
+    """
+    a full-screen view of a board with ships and shots, ready to repaint
+    """
+    app = _application()
+    view, grid = _grid(seed=0, **kwargs)
+    grid.randomizePlacement()
+    rows, cols = grid.gridSize[1], grid.gridSize[0]
+    for k in range(max(rows, 100)):
+        grid.overlay.mark((k % rows, (k*7) % cols), k % 3 == 0)
+    view.resize(width, height)
+    view.show()
+    app.processEvents()
+    # the grid background is rendered into a pixmap at the second paint
+    view.viewport().repaint()
+    return view
+
+
+@benchmark('grid.frame', qt=True, number=50)
+def _gridFrame():
+    """
+    repaint a full-screen view (1920x1080) showing a board fit to the view
+    """
+    return _frame(1920, 1080).viewport().repaint
+
+
+@benchmark('grid.frame4k', qt=True, number=50)
+def _gridFrame4k():
+    """
+    repaint a 4K view (3840x2160) showing a board fit to the view
+    """
+    return _frame(3840, 2160).viewport().repaint
+
+
+@benchmark('grid.frameLarge', qt=True, number=50)
+def _gridFrameLarge():
+    """
+    repaint a 4K view showing a whole 1000x1000 board with 500 ships
+    """
+    return _frame(3840, 2160, gridSize=LARGE_GRID,
+                  fleet=LARGE_FLEET).viewport().repaint
+
+
+@benchmark('grid.resize', qt=True, number=20)
+def _gridResize():
+    """
+    resize a view between 1080p and 4K and repaint it, like dragging the
+    corner of the window
+    """
+    view = _frame(1920, 1080)
+    sizes = [(1920 + 96*k, 1080 + 54*k) for k in range(21)]
+
+    def run():
+        for size in sizes:
+            view.resize(*size)
+            view.viewport().repaint()
+    return run
+
+
+@benchmark('grid.renderLarge', qt=True, number=5)
+def _gridRenderLarge():
+    """
+    render a view port of 1000x1000 pixels of a 1000x1000 board
+    """
+    from PyQt5 import (QtCore as qtc, QtGui as qtg)
+    _application()
+    view, grid = _grid(seed=0, gridSize=LARGE_GRID, fleet=LARGE_FLEET)
+    grid.randomizePlacement()
+    grid.finalizePlacement()
+    for k in range(1000):
+        grid.fire((k, (k*7) % 1000))
+    image = qtg.QImage(1000, 1000, qtg.QImage.Format_ARGB32_Premultiplied)
+    source = qtc.QRectF(15000, 15000, 1000, 1000)
+
+    def run():
+        image.fill(qtc.Qt.transparent)
+        painter = qtg.QPainter(image)
+        grid.render(painter, qtc.QRectF(image.rect()), source)
+        painter.end()
+    return run
+
+
+def runBenchmark(name):
+    """
+    returns the timings (seconds per call) and the peak of python memory
+    allocated by a call (bytes)
+    """
+    spec = BENCHMARKS[name]
+    run = spec['setup']()
+    run()
+    times = []
+    for _ in range(spec['repeat']):
+        begin = perf_counter()
+        for _ in range(spec['number']):
+            run()
+        times.append((perf_counter() - begin)/spec['number'])
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del _views[:]
+    return {'median': median(times), 'min': min(times), 'peakMemory': peak}
+
+
+def compare(results, baseline, threshold, memoryThreshold):
+    """
+    returns a list of messages for all benchmarks which got slower or use
+    more memory than allowed
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        if result['median'] > reference['median']*(1 + threshold):
+            regressions.append(
+                    f"{name}: {result['median']*1e6:.1f} us, baseline "
+                    f"{reference['median']*1e6:.1f} us")
+        memoryLimit = reference['peakMemory']*(1 + memoryThreshold)
+        if result['peakMemory'] > memoryLimit:
+            regressions.append(
+                    f"{name}: {result['peakMemory']} bytes, baseline "
+                    f"{reference['peakMemory']} bytes")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m src.benchmark',
+            description='benchmark the hot paths and compare with a baseline')
+    parser.add_argument('-b', '--baseline', default='benchmark_baseline.json',
+                        help='baseline file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as new baseline')
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--no-qt', action='store_true',
+                        help='skip the benchmarks which need Qt')
+    parser.add_argument('-t', '--threshold', type=float, default=.25,
+                        help='allowed slowdown relative to the baseline '
+                             '(default: %(default)s)')
+    parser.add_argument('-m', '--memory-threshold', type=float, default=.25,
+                        help='allowed growth of peak memory relative to the '
+                             'baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, spec in BENCHMARKS.items():
+        if args.filter not in name or (args.no_qt and spec['qt']):
+            continue
+        results[name] = result = runBenchmark(name)
+        print(f"{name:28} {result['median']*1e6:12.1f} us "
+              f"{result['peakMemory']:10d} bytes")
+
+    baseline = Path(args.baseline)
+    if args.save:
+        saved = json.loads(baseline.read_text()) if baseline.exists() else {}
+        saved.update(results)
+        baseline.write_text(json.dumps(saved, indent=4, sort_keys=True))
+        print(f'baseline saved to {baseline}')
+        return 0
+    if not baseline.exists():
+        print(f'no baseline at {baseline}, run with --save to create one')
+        return 0
+    regressions = compare(
+            results, json.loads(baseline.read_text()),
+            args.threshold, args.memory_threshold)
+    for message in regressions:
+        print(f'REGRESSION {message}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
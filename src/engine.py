@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+from . import metrics
+
+FLEET = (
+        ('Carrier',     5),
+        ('Battleship',  4),
+        ('Submarine',   3),
+        ('Cruiser',     3),
+        ('Destroyer',   2))
+
+SHIP_TYPES = dict(FLEET)
+
+ORIENTATIONS = ('h', 'v')
+
+# boards up to this number of fields are small enough to be handled as dense
+# bitmasks (one int per layer), e.g. by the placement table
+DENSE_LIMIT = 32*32
+
+Placement = namedtuple(
+        'Placement', ['shipId', 'extent', 'orientation', 'index'])
+
+# what the opponent knows about a board: CellSets of all shots and of the
+# hits and the Placements of the sunk ships. Observations are copies, so they
+# can be handed to other threads and processes as is
+Observation = namedtuple('Observation', ['gridSize', 'shots', 'hits', 'sunk'])
+
+# result of a shot, one of SHOT_RESULTS and the id of the ship hit (or None)
+ShotResult = namedtuple('ShotResult', ['result', 'shipId'])
+SHOT_RESULTS = ('miss', 'hit', 'sunk', 'destroyed')
+
+
+def shipType(shipId):
+    """
+    returns the type of a ship. Fleets with several ships of a type number
+    them, e.g. 'Destroyer#2'
+    """
+    return shipId.partition('#')[0]
+
+
+def makeFleet(composition):
+    """
+    returns a fleet for a composition like {'Carrier': 2, 'Destroyer': 4}
+    """
+    fleet = []
+    for name, count in composition.items():
+        if name not in SHIP_TYPES:
+            raise NotImplementedError(name)
+        if count == 1:
+            fleet.append((name, SHIP_TYPES[name]))
+        else:
+            fleet.extend((f'{name}#{no}', SHIP_TYPES[name])
+                         for no in range(1, count + 1))
+    return tuple(fleet)
+
+
+class Geometry:
+    """
+    layout of a board. The field in row i and column j has the position
+    i*width + j. Positions are used by CellSets and, on small boards, as bits
+    of dense masks where a whole layer of the board fits into a single int.
+
+    Geometries are immutable and shared, use Geometry.get(gridSize)
+    """
+
+    _instances = {}
+
+    @classmethod
+    def get(cls, gridSize):
+        gridSize = tuple(gridSize)
+        if gridSize not in cls._instances:
+            cls._instances[gridSize] = cls(gridSize)
+        return cls._instances[gridSize]
+
+    def __init__(self, gridSize):
+        self.gridSize = gridSize
+        self.width, self.height = gridSize
+        self.size = self.width*self.height
+        self.dense = self.size <= DENSE_LIMIT
+        self._fields = {}
+        self._footprints = {}
+        self._masks = None
+
+    def contains(self, i, j):
+        return 0 <= i < self.height and 0 <= j < self.width
+
+    def position(self, i, j):
+        if not self.contains(i, j):
+            raise ValueError(f'field {(i, j)} is not on the grid')
+        return i*self.width + j
+
+    def fields(self, extent, orientation, index):
+        """
+        returns the positions of the fields covered by a ship and of its zone
+        (the fields covered plus all neighbours, diagonals included). Raises
+        ValueError if the ship is not completely on the grid.
+
+        The index has the same meaning as Ship.index: a horizontal ship
+        extends to the right, a vertical ship extends upwards
+        """
+        key = (extent, orientation, tuple(index))
+        if key in self._fields:
+            return self._fields[key]
+        i, j = index
+        if orientation == 'h':
+            top, left, bottom, right = i, j, i, j + extent - 1
+        elif orientation == 'v':
+            top, left, bottom, right = i - extent + 1, j, i, j
+        else:
+            raise NotImplementedError(orientation)
+        if not (self.contains(top, left) and self.contains(bottom, right)):
+            raise ValueError(f'ship at {tuple(index)} is not on the grid')
+        width = self.width
+        cells = tuple(r*width + c for r in range(top, bottom + 1)
+                      for c in range(left, right + 1))
+        zone = tuple(
+                r*width + c
+                for r in range(max(top - 1, 0), min(bottom + 2, self.height))
+                for c in range(max(left - 1, 0), min(right + 2, width)))
+        if self.dense:
+            self._fields[key] = (cells, zone)
+        return cells, zone
+
+    # dense masks, only meant for small boards
+
+    def bit(self, i, j):
+        return 1 << self.position(i, j)
+
+    @property
+    def full(self):
+        return self._denseMasks()[0]
+
+    def _denseMasks(self):
+        if self._masks is None:
+            full = (1 << self.size) - 1
+            firstCol = 0
+            for i in range(self.height):
+                firstCol |= 1 << (i*self.width)
+            lastCol = firstCol << (self.width - 1)
+            self._masks = (full, full & ~firstCol, full & ~lastCol)
+        return self._masks
+
+    def footprint(self, extent, orientation, index):
+        """
+        returns the masks of the fields covered by a ship and of its zone
+        """
+        key = (extent, orientation, tuple(index))
+        if key not in self._footprints:
+            cells, _ = self.fields(extent, orientation, index)
+            mask = 0
+            for n in cells:
+                mask |= 1 << n
+            self._footprints[key] = (mask, self.dilate(mask))
+        return self._footprints[key]
+
+    def dilate(self, mask):
+        """
+        grow a mask by one field in every direction
+        """
+        full, notFirstCol, notLastCol = self._denseMasks()
+        mask |= ((mask << 1) & notFirstCol) | ((mask >> 1) & notLastCol)
+        mask |= (mask << self.width) | (mask >> self.width)
+        return mask & full
+
+    def cells(self, mask):
+        """
+        iterate over the (row, column) indices of all bits set in mask
+        """
+        while mask:
+            low = mask & -mask
+            yield divmod(low.bit_length() - 1, self.width)
+            mask ^= low
+
+
+class CellSet:
+    """
+    sparse set of fields given by their positions (see Geometry). The set is
+    stored as a dict of 64 bit chunks, so time and memory depend on the
+    number of fields in the set and not on the size of the board
+    """
+
+    __slots__ = ('chunks', 'count')
+
+    def __init__(self, positions=()):
+        self.chunks = {}
+        self.count = 0
+        for n in positions:
+            self.add(n)
+
+    @classmethod
+    def fromMask(cls, mask):
+        cellSet = cls()
+        key = 0
+        while mask:
+            chunk = mask & 0xffffffffffffffff
+            if chunk:
+                cellSet.chunks[key] = chunk
+                cellSet.count += bin(chunk).count('1')
+            mask >>= 64
+            key += 1
+        return cellSet
+
+    def add(self, n):
+        key, bit = n >> 6, 1 << (n & 63)
+        chunk = self.chunks.get(key, 0)
+        if not chunk & bit:
+            self.chunks[key] = chunk | bit
+            self.count += 1
+
+    def discard(self, n):
+        key, bit = n >> 6, 1 << (n & 63)
+        chunk = self.chunks.get(key, 0)
+        if chunk & bit:
+            chunk ^= bit
+            if chunk:
+                self.chunks[key] = chunk
+            else:
+                del self.chunks[key]
+            self.count -= 1
+
+    def __contains__(self, n):
+        return bool(self.chunks.get(n >> 6, 0) & (1 << (n & 63)))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for key in sorted(self.chunks):
+            chunk = self.chunks[key]
+            while chunk:
+                low = chunk & -chunk
+                yield (key << 6) + low.bit_length() - 1
+                chunk ^= low
+
+    def __eq__(self, other):
+        return isinstance(other, CellSet) and self.chunks == other.chunks
+
+    def __repr__(self):
+        return f'CellSet({list(self)})'
+
+    def copy(self):
+        cellSet = CellSet()
+        cellSet.chunks = dict(self.chunks)
+        cellSet.count = self.count
+        return cellSet
+
+    def mask(self):
+        """
+        returns the set as dense mask, only meant for small boards
+        """
+        mask = 0
+        for key, chunk in self.chunks.items():
+            mask |= chunk << (key << 6)
+        return mask
+
+    def span(self, start, stop):
+        """
+        returns the members in range(start, stop) as mask, bit k stands for
+        start + k. Only the chunks of the range are visited
+        """
+        mask = 0
+        for key in range(start >> 6, ((stop - 1) >> 6) + 1):
+            chunk = self.chunks.get(key)
+            if chunk:
+                shift = (key << 6) - start
+                mask |= chunk << shift if shift >= 0 else chunk >> -shift
+        return mask & ((1 << (stop - start)) - 1) if stop > start else 0
+
+
+class Board:
+    """
+    state of one player's board without any Qt dependency. Ships are stored
+    as Placements, shots and hits as CellSets, so a board costs memory and
+    time for its ships and shots only, no matter how large it is.
+
+    For shooting the board keeps the fleet state: which ship occupies which
+    field and how many unhit fields every ship has left. It is built with the
+    first shot after the ships were (re)placed
+    """
+
+    def __init__(self, gridSize=(10, 10)):
+        self.gridSize = tuple(gridSize)
+        self.geometry = Geometry.get(self.gridSize)
+        self.ships = {}
+        self.shots = CellSet()
+        self.hits = CellSet()
+        self.sunk = []
+        self._shipAt = None
+        self._health = None
+        self._afloat = 0
+
+    def placeShip(self, shipId, extent, orientation, index):
+        """
+        place (or move) a ship. Raises ValueError if the ship is not
+        completely on the grid. Rule violations are allowed here and reported
+        by isValid, so ships can be moved freely during preparation
+        """
+        self.geometry.fields(extent, orientation, index)
+        placement = Placement(shipId, extent, orientation, tuple(index))
+        self.ships[shipId] = placement
+        self._shipAt = None
+        return placement
+
+    def removeShip(self, shipId):
+        if self.ships.pop(shipId, None):
+            self._shipAt = None
+
+    def clearShips(self):
+        self.ships = {}
+        self._shipAt = None
+
+    def isValid(self):
+        """
+        ships may neither overlap nor touch each other, diagonals included
+        """
+        forbidden = set()
+        for placement in self.ships.values():
+            cells, zone = self.geometry.fields(*placement[1:])
+            if not forbidden.isdisjoint(cells):
+                return False
+            forbidden.update(zone)
+        return True
+
+    def _updateFleet(self):
+        self._shipAt = {}
+        self._health = {}
+        for placement in self.ships.values():
+            cells, _ = self.geometry.fields(*placement[1:])
+            for n in cells:
+                self._shipAt[n] = placement.shipId
+            self._health[placement.shipId] = sum(
+                    1 for n in cells if n not in self.shots)
+        self.sunk = [
+                shipId for shipId in self.sunk if not self._health.get(shipId)]
+        self._afloat = sum(1 for health in self._health.values() if health)
+
+    def shipAt(self, index):
+        """
+        returns the id of the ship occupying a field or None
+        """
+        if self._shipAt is None:
+            self._updateFleet()
+        return self._shipAt.get(self.geometry.position(*index))
+
+    def isOccupied(self, index):
+        return self.shipAt(index) is not None
+
+    def isShot(self, index):
+        return self.geometry.position(*index) in self.shots
+
+    def health(self, shipId):
+        """
+        returns the number of fields of a ship which were not hit yet
+        """
+        if self._shipAt is None:
+            self._updateFleet()
+        return self._health[shipId]
+
+    @metrics.timed('board.shoot')
+    def shoot(self, index):
+        """
+        fire at a field, returns a ShotResult
+        """
+        n = self.geometry.position(*index)
+        if n in self.shots:
+            raise ValueError(f'field {tuple(index)} was already shot')
+        if self._shipAt is None:
+            self._updateFleet()
+        self.shots.add(n)
+        shipId = self._shipAt.get(n)
+        if shipId is None:
+            return ShotResult('miss', None)
+        self.hits.add(n)
+        self._health[shipId] -= 1
+        if self._health[shipId]:
+            return ShotResult('hit', shipId)
+        self.sunk.append(shipId)
+        self._afloat -= 1
+        if self._afloat:
+            return ShotResult('sunk', shipId)
+        return ShotResult('destroyed', shipId)
+
+    def record(self, index, result, placement=None):
+        """
+        enter a shot at a board whose ships are unknown (e.g. the opponent's
+        board in a network game). The Placement of a sunk ship is stored, so
+        observations contain it
+        """
+        n = self.geometry.position(*index)
+        if n in self.shots:
+            raise ValueError(f'field {tuple(index)} was already shot')
+        self.shots.add(n)
+        if result.result != 'miss':
+            self.hits.add(n)
+        if placement is not None:
+            self.ships[placement.shipId] = placement
+            self.sunk.append(placement.shipId)
+
+    def observe(self):
+        return Observation(
+                self.gridSize, self.shots.copy(), self.hits.copy(),
+                tuple(self.ships[shipId] for shipId in self.sunk))
+
+    def isEliminated(self):
+        if self._shipAt is None:
+            self._updateFleet()
+        return not self._afloat
@@ -2,12 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import sys
+from collections import deque
 from pathlib import Path
-from random import choice, randrange
-from PyQt5 import (QtWidgets as qtw, QtCore as qtc, QtGui as qtg, QtSvg as qsvg)
-from time import sleep
+from PyQt5 import (QtWidgets as qtw, QtCore as qtc, QtGui as qtg)
 
-from .gridWidget import Grid
+from . import metrics, strategies
+from .aiWorker import AIWorker
+from .background import Background
+from .engine import FLEET
+from .gridWidget import BoardView, Grid, columnLabel
+from .replay import ReplayWriter, replayPath
+from .session import GameSession
+from .snapshot import autosavePath, restore, snapshot, writeAtomic
 
 source_dir = Path(__file__).absolute().parent.parent
 
@@ -31,11 +37,14 @@ class StatusBar(qtw.QWidget):
         self.helphint = qtw.QLabel('Press ? for help')
         self.btn_startGame = qtw.QPushButton('Start Game')
         self.btn_randomize = qtw.QPushButton('Randomize')
+        self.btn_undo = qtw.QPushButton('Undo')
+        self.btn_undo.setEnabled(False)
         self.btn_exitGame = qtw.QPushButton('Exit')
         self.layout.addWidget(self.btn_startGame, 0, 0)
         self.layout.addWidget(self.btn_randomize, 0, 1)
-        self.layout.addWidget(self.status, 0, 2)
-        self.layout.addWidget(self.helphint, 0, 3)
+        self.layout.addWidget(self.btn_undo, 0, 2)
+        self.layout.addWidget(self.status, 0, 3)
+        self.layout.addWidget(self.helphint, 0, 4)
 
         self.setSizePolicy(qtw.QSizePolicy.Maximum, qtw.QSizePolicy.Maximum)
 
@@ -53,52 +62,185 @@ class StatusBar(qtw.QWidget):
         self.btn_startGame.disconnect()
         self.layout.removeWidget(self.btn_startGame)
         self.btn_startGame.deleteLater()
+        self.btn_undo.setEnabled(False)
+        self.btn_undo.disconnect()
+        self.layout.removeWidget(self.btn_undo)
+        self.btn_undo.deleteLater()
+        self.layout.addWidget(self.btn_exitGame, 0, 0)
+
+
+class ReplayBar(qtw.QWidget):
+    """
+    controls of the replay viewer, a slider over the turns of the game
+    """
+
+    def __init__(self, turns, *args, **kwargs):
+
+        super(ReplayBar, self).__init__(*args, **kwargs)
+
+        self.layout = qtw.QGridLayout()
+        self.btn_exitGame = qtw.QPushButton('Exit')
+        self.slider = qtw.QSlider(qtc.Qt.Horizontal)
+        self.slider.setRange(0, turns)
+        self.slider.setPageStep(10)
+        self.slider.setMinimumWidth(300)
+        self.status = qtw.QLabel()
         self.layout.addWidget(self.btn_exitGame, 0, 0)
+        self.layout.addWidget(self.slider, 0, 1)
+        self.layout.addWidget(self.status, 0, 2)
+
+        self.setSizePolicy(qtw.QSizePolicy.Maximum, qtw.QSizePolicy.Maximum)
+
+        self.setLayout(self.layout)
+
+    def setStatus(self, text):
+        self.status.setText(text)
 
 
 class GameScreen(qtw.QWidget):
+    """
+    plays a GameSession between the user ('player') and the AI ('enemy').
+    With a MatchClient the enemy is an opponent on the match server, which
+    keeps the enemy's board hidden and resolves the shots.
+
+    With record, games against the AI are recorded (see replay.py). With a
+    Replay the screen is a viewer: both fleets are shown and a slider moves
+    through the turns of the recorded game.
+
+    Games against the AI are saved every autosaveInterval ms while they run
+    and when the screen is left (see snapshot.py). A started session (e.g.
+    of a saved game) is resumed. Moves of the ships before the game starts
+    can be undone
+    """
 
+    enemyDelay = 200  # minimum ms the enemy "thinks" about its answer
+    autosaveInterval = 5000
+    undoLimit = 100
 
-    def __init__(self, *args, parent=None, **kwargs):
+    def __init__(self, *args, parent=None, session=None, gridSize=(10, 10),
+                 fleet=FLEET, client=None, replay=None, record=False,
+                 strategy='expert', placement='random', **kwargs):
         super(GameScreen, self).__init__(*args, **kwargs)
         self.setObjectName('gameWindow')
+        self.background = Background(
+                source_dir / 'rsc' / 'GameWindow.jpg', self)
 
         self.parent = parent
-
-        self.player = qtw.QWidget()
-        self.enemy = qtw.QWidget()
-        self.statusBar = StatusBar()
+        self.client = client
+        if client:
+            client.setParent(self)
+        self.replay = replay
+        if client and not session:
+            gridSize, fleet = client.gridSize, client.fleet
+        if replay:
+            gridSize, fleet = replay.gridSize, replay.fleet
+        self.session = session or GameSession(gridSize, fleet)
+        resumed = self.session.currentPlayer is not None
+        if record and not (client or replay or resumed):
+            self.session.recorder = ReplayWriter(replayPath())
+        self.autosaving = not (client or replay)
+        self.changed = False
+        self.autosaveTimer = qtc.QTimer(self)
+        self.autosaveTimer.timeout.connect(self.saveGame)
+        self.undoStack = deque(maxlen=self.undoLimit)
+        self.placement = None
+        self.opponentFound = False
+        self.shotPending = False
+
+        self.playerView = BoardView()
+        self.enemyView = BoardView()
+        self.statusBar = ReplayBar(replay.turns) if replay else StatusBar()
 
         self.layout = qtw.QGridLayout()
 
-        self.layout.addWidget(self.enemy, 0, 0, 1, 2)
-        self.layout.addWidget(self.player, 0, 2, 1, 2)
+        self.layout.addWidget(self.enemyView, 0, 0, 1, 2)
+        self.layout.addWidget(self.playerView, 0, 2, 1, 2)
         self.layout.addWidget(self.statusBar, 1, 0, 1, 4)
         self.setLayout(self.layout)
 
-        self.playerView = qtw.QGraphicsView(self.player)
-        self.playerScene = Grid(self.playerView, gridType='player')
-        self.playerScene.randomizePlacement()
-        self.playerScene.enableDrag()
+        self.playerScene = Grid(self.playerView, gridType='player',
+                                session=self.session)
+        if replay:
+            self.playerScene.showFleet(replay.placements[0].values())
+        elif resumed:
+            self.playerScene.showBoard()
+        else:
+            self.playerScene.randomizePlacement()
         self.playerView.setScene(self.playerScene)
 
-        self.enemyView = qtw.QGraphicsView(self.enemy)
-        self.enemyScene = Grid(self.enemyView, gridType='enemy')
-        self.enemyScene.randomizePlacement()
-        self.enemyScene.setShipVisibility(False)
-        self.enemyScene.finalizePlacement()
+        self.enemyScene = Grid(self.enemyView, gridType='enemy',
+                               session=self.session)
+        if replay:
+            self.enemyScene.showFleet(replay.placements[1].values())
+        elif resumed:
+            self.enemyScene.showBoard(revealed=False)
+        elif not client:
+            self.enemyScene.showFleet(strategies.placement(placement)(
+                    self.session.gridSize, self.session.fleet,
+                    self.session.rng))
+            self.enemyScene.setShipVisibility(False)
+            self.enemyScene.finalizePlacement()
         self.enemyView.setScene(self.enemyScene)
+        if metrics.isEnabled():
+            from .metricsWidgets import PaintTimer
+            PaintTimer(self.playerView, 'paint.player')
+            PaintTimer(self.enemyView, 'paint.enemy')
+
+        self.enemyAI = None
+        if not (client or replay):
+            self.enemyAI = AIWorker(
+                    strategies.targeting(strategy)(
+                        fleet=self.session.fleet,
+                        seed=self.session.rng.getrandbits(64)),
+                    self, minDelay=self.enemyDelay)
+        self.gameOverBox = None
 
         self.setGeometry(300, 300, 400, 300)
         self.connect()
+        if resumed:
+            self.statusBar.enterGameMode()
+            self.changed = True
+            self.autosaveTimer.start(self.autosaveInterval)
+            qtc.QTimer.singleShot(0, self.nextTurn)
+        elif self.autosaving:
+            self.placement = snapshot(self.session)
 
     def connect(self):
+        if self.replay:
+            self.statusBar.slider.valueChanged.connect(self.showTurn)
+            self.statusBar.btn_exitGame.clicked.connect(self.exitGame)
+            self.showTurn(0)
+            return
         self.statusBar.btn_startGame.clicked.connect(
                 self.startGame)
         self.statusBar.btn_randomize.clicked.connect(
                 self.playerScene.randomizePlacement)
+        self.statusBar.btn_undo.clicked.connect(self.undo)
         self.statusBar.btn_exitGame.clicked.connect(
                 self.exitGame)
+        self.playerScene.fleetChanged.connect(self.fleetChanged)
+        self.enemyScene.fieldClicked.connect(self.playerTurn)
+        if self.enemyAI:
+            self.enemyAI.moveReady.connect(self.enemyTurn)
+            self.enemyAI.moveFailed.connect(self.enemyFailed)
+        if self.client:
+            self.connectClient()
+
+    def connectClient(self):
+        client = self.client
+        client.queued.connect(
+                lambda: self.statusBar.setStatus('Waiting for an opponent...'))
+        client.matched.connect(self.opponentMatched)
+        client.accepted.connect(
+                lambda: self.statusBar.setStatus(
+                    "Waiting for the opponent's ships..."))
+        client.started.connect(self.onlineStarted)
+        client.shotResult.connect(self.onlineShotResult)
+        client.incoming.connect(lambda i, j: self.enemyTurn((i, j)))
+        client.gameOver.connect(self.onlineGameOver)
+        client.failed.connect(self.onlineFailed)
+        self.statusBar.setStatus('Connecting...')
+        client.connectToServer()
 
     def startGame(self):
 
@@ -106,83 +248,194 @@ class GameScreen(qtw.QWidget):
             self.statusBar.setStatus(
                     'Ships are not placed according to rules!')
             return
+        if self.client and not self.opponentFound:
+            self.statusBar.setStatus('Waiting for an opponent...')
+            return
 
-        Grid.gameFinished = False
         self.playerScene.finalizePlacement()
         self.statusBar.enterGameMode()
-        self.runGameLoop()
+        if self.client:
+            self.client.place(self.playerScene.board.ships)
+            return
+        self.undoStack.clear()
+        self.session.start()
+        self.autosaveTimer.start(self.autosaveInterval)
+        self.nextTurn()
 
-    def exitGame(self):
-        Grid.gameFinished = True
-        self.parent.exitGame()
+    def fleetChanged(self):
+        """
+        remember the placement before the user's change for undo
+        """
+        if not self.autosaving or self.session.currentPlayer is not None:
+            return
+        placement = snapshot(self.session)
+        if placement != self.placement:
+            self.undoStack.append(self.placement)
+            self.placement = placement
+            self.statusBar.btn_undo.setEnabled(True)
 
-    def runGameLoop(self):
+    def undo(self):
+        """
+        put the player's ships back where they were before the last change
+        """
+        if not self.undoStack or self.session.currentPlayer is not None:
+            return
+        self.placement = self.undoStack.pop()
+        board = self.session.boards['player']
+        board.clearShips()
+        ships = restore(self.placement).boards['player'].ships
+        for placement in ships.values():
+            board.placeShip(*placement)
+        self.playerScene.showBoard()
+        self.playerScene.enableDrag()
+        self.statusBar.btn_undo.setEnabled(bool(self.undoStack))
 
-        Grid.currentPlayer = choice(('player', 'enemy'))
+    def saveGame(self):
+        """
+        write the running game to the autosave file if it changed since the
+        last save
+        """
+        if (not self.autosaving or not self.changed
+                or self.session.currentPlayer is None):
+            return
+        try:
+            writeAtomic(autosavePath(), snapshot(self.session))
+        except OSError as error:
+            print(f'autosave failed: {error}', file=sys.stderr)
+        self.changed = False
+
+    def discardSave(self):
+        self.autosaveTimer.stop()
+        if self.autosaving:
+            try:
+                autosavePath().unlink(missing_ok=True)
+            except OSError as error:
+                print(f'can not remove the autosave: {error}',
+                      file=sys.stderr)
 
-        while (not Grid.gameFinished):
-            self.statusBar.setStatus(f"{Grid.currentPlayer}'s Turn!")
-            qtw.QApplication.processEvents()
-            if not self.isAlive():
-                sys.exit()
+    def exitGame(self):
+        self.autosaveTimer.stop()
+        self.saveGame()
+        if self.enemyAI:
+            self.enemyAI.cancel()
+        if self.client:
+            self.client.leave()
+        if self.replay:
+            self.replay.close()
+        self.session.abort()
+        if self.parent:
+            self.parent.exitGame()
+        else:
+            self.close()
 
-            if Grid.currentPlayer == 'player':
-                self.playerTurn()
-            elif Grid.currentPlayer == 'enemy':
-                self.enemyTurn()
+    def nextTurn(self, news=''):
+        """
+        announce the player whose turn it is in the session. The player's
+        turn ends with a click on the enemy grid (see playerTurn), the enemy's
+        move is computed in the background (see AIWorker) and played by
+        enemyTurn
+        """
+        player = self.session.currentPlayer
+        self.changed = True
+        self.statusBar.setStatus(f"{news}{player}'s Turn!")
+        if player == 'enemy' and self.enemyAI:
+            self.enemyAI.requestMove(self.playerScene.board.observe())
 
-    def checkEliminated(self, scene):
+    def finishGame(self, text):
         """
-        checks if the game is over
+        end of the game: stop taking turns and show the result. The game
+        screen is left when the message box is closed
         """
+        if self.enemyAI:
+            self.enemyAI.cancel()
+        self.discardSave()
+        self.statusBar.setStatus(text)
+        self.showGameOverScreen(text)
 
-        for row in scene.fields:
-            for field in row:
-                if field.occupied and not field._hit:
-                    return False
+    def playerTurn(self, i, j):
+
+        if not self.session.isTurn('player') or self.shotPending: return
+        if self.enemyScene.board.isShot((i, j)):
+            return
+        if self.client:
+            # the server resolves the shot, see onlineShotResult
+            self.shotPending = True
+            self.client.fire((i, j))
+            return
+        self.playerShot(i, j, self.session.fire('player', (i, j)))
+
+    def playerShot(self, i, j, result):
+        self.enemyScene.showShot((i, j), result)
+        if result.result == 'destroyed':
+            self.finishGame('You Won!')
+        elif result.result == 'sunk':
+            self.nextTurn(f"You sunk the enemy's {result.shipId}! ")
+        else:
+            self.nextTurn()
+
+    def enemyTurn(self, target, news=''):
+        if not self.session.isTurn('enemy'): return
+        result = self.session.fire('enemy', target)
+        self.playerScene.showShot(target, result)
+        if result.result == 'destroyed':
+            self.finishGame('You Lost!')
+        elif result.result == 'sunk':
+            self.nextTurn(f'{news}The enemy sunk your {result.shipId}! ')
         else:
-            return True
+            self.nextTurn(news)
 
-    def isAlive(self):
+    def enemyFailed(self, error):
         """
-        checks if window is closed
+        the AI raised an exception: report it and fire at a random field
+        instead, so the game goes on
         """
-        if self.parent:
-            if not self.parent.isVisible(): return False
-            else: return True
-        else:
-            if not self.isVisble(): return False
-            else: return True
-
-    def playerTurn(self):
-
-        if not self.enemyScene.fieldSelected: return
-        field = self.enemyScene.fieldSelected
-        self.enemyScene.fieldSelected = None
-        if field._hit:
+        print(f'enemy move failed: {error!r}', file=sys.stderr)
+        if not self.session.isTurn('enemy'):
             return
-        field.hit()
-        if self.checkEliminated(self.enemyScene):
-            Grid.gameFinished = True
-            self.showGameOverScreen('You Won!')
-
-        Grid.currentPlayer = 'enemy'
-
-    def enemyTurn(self):
-        sleep(0.2)
-        fieldValid = False
-        while not fieldValid:
-
-            target = (randrange(0, Grid.gridSize[1]),
-                      randrange(0, Grid.gridSize[0]))
-            field = self.playerScene.fields[target[0]][target[1]]
-            if not field._hit:
-                fieldValid = True
-        field.hit()
-        if self.checkEliminated(self.playerScene):
-            Grid.gameFinished = True
-            self.showGameOverScreen('You Lost!')
-        Grid.currentPlayer = 'player'
+        ai = strategies.targeting('random')(
+                fleet=self.session.fleet,
+                seed=self.session.rng.getrandbits(64))
+        self.enemyTurn(ai.nextShot(self.playerScene.board.observe()),
+                       f'The enemy AI failed ({error}), it fired at random. ')
+
+    def showTurn(self, turn):
+        """
+        show both boards of the replay after turn shots
+        """
+        replay = self.replay.seek(turn)
+        for scene, board in ((self.playerScene, 0), (self.enemyScene, 1)):
+            scene.showShots(replay.hits[board], replay.misses[board],
+                            replay.sunk[board])
+        text = f'Turn {turn}/{replay.turns}, {replay.elapsed:.1f} s'
+        if turn:
+            shooter, (i, j), _ = replay.shot(turn - 1)
+            text += (f': {self.session.players[shooter]} fired at '
+                     f'{columnLabel(j)}{i + 1}')
+        self.statusBar.setStatus(text)
+
+    def opponentMatched(self):
+        self.opponentFound = True
+        self.statusBar.setStatus('Opponent found, place your ships!')
+
+    def onlineStarted(self, yourTurn):
+        self.session.start('player' if yourTurn else 'enemy')
+        self.nextTurn()
+
+    def onlineShotResult(self, i, j, result, placement):
+        self.shotPending = False
+        self.session.resolve('player', (i, j), result, placement)
+        self.playerShot(i, j, result)
+
+    def onlineFailed(self, message):
+        self.shotPending = False
+        self.statusBar.setStatus(message)
+
+    def onlineGameOver(self, won, reason):
+        # a regular end is already known from the last shot
+        if not self.session.finished:
+            self.session.abort()
+            text = 'You Won!' if won else 'You Lost!'
+            self.finishGame(f'{text} ({reason})' if reason else text)
 
     def showHelp(self):
         messageBox = qtw.QMessageBox()
@@ -194,19 +447,22 @@ class GameScreen(qtw.QWidget):
         messageBox.exec_()
 
     def showGameOverScreen(self, text):
-        gameOverBox = qtw.QMessageBox()
-        gameOverBox.setIcon(qtw.QMessageBox.Information)
-        gameOverBox.setStandardButtons(qtw.QMessageBox.Ok)
-        gameOverBox.setDefaultButton(qtw.QMessageBox.Ok)
-        gameOverBox.setText(text)
-        gameOverBox.exec_()
-        self.exitGame()
+        self.gameOverBox = qtw.QMessageBox(self)
+        self.gameOverBox.setIcon(qtw.QMessageBox.Information)
+        self.gameOverBox.setStandardButtons(qtw.QMessageBox.Ok)
+        self.gameOverBox.setDefaultButton(qtw.QMessageBox.Ok)
+        self.gameOverBox.setText(text)
+        self.gameOverBox.finished.connect(self.exitGame)
+        self.gameOverBox.open()
 
     def keyPressEvent(self, event):
         super(GameScreen, self).keyPressEvent(event)
         if event.key() == 63:               # ? press to open help
             self.showHelp()
+        elif event.matches(qtg.QKeySequence.Undo):
+            self.undo()
         elif event.key() == 16777216:       # exit when pressing escape
+            self.saveGame()
             sys.exit()
 
 
@@ -2,14 +2,34 @@
 # -*- coding: utf-8 -*-
 
 import sys
+from math import ceil, floor, log2
 from PyQt5 import (QtWidgets as qtw, QtCore as qtc, QtGui as qtg, QtSvg as qsvg)
-from random import choice, randint
 from pathlib import Path
 
+from . import metrics
+from .assetCache import assets
+from .engine import FLEET, SHIP_TYPES, CellSet, shipType
+from .placement import PlacementValidator, samplePlacements
+from .session import GameSession
+
 rsc = Path(__file__).absolute().parent.parent / 'rsc'
 
 
-class HitIcon(qsvg.QGraphicsSvgItem):
+class ShotOverlay(qtw.QGraphicsItem):
+    """
+    markers of all shots at a board in a single item. Hits and misses are
+    kept as two CellSets, a new shot only invalidates the rect of its marker.
+
+    paint() draws the markers inside the exposed rect from pixmaps rasterized
+    for the scale of the view (see AssetCache), or as flat squares if the
+    grid is not drawn in detail (see Grid.isDetailed). It takes the shots of
+    every exposed row as a mask (CellSet.span), so it costs time for the
+    exposed rows and the markers drawn, not for all shots at the board.
+
+    The item is not cached by the view (QGraphicsItem.setCacheMode): its
+    markers are pixmaps already, a device cache of the whole board made the
+    repaint after a shot ten times slower at 4K
+    """
 
     ids = {
             True: rsc / 'HitShot.svg',
@@ -23,12 +43,120 @@ class HitIcon(qsvg.QGraphicsSvgItem):
             True: qtc.Qt.green,
             False: qtc.Qt.red}
 
-    def __init__(self, field):
-        super(HitIcon, self).__init__(str(self.ids[field.occupied]))
-        self.setScale(self.scaling[field.occupied])
+    _markerSize = None
+
+    def __init__(self, grid):
+        super(ShotOverlay, self).__init__()
+        self.grid = grid
+        self.width = grid.gridSize[0]
+        self.hits = CellSet()
+        self.misses = CellSet()
+        self.setZValue(1)
+        self.setAcceptedMouseButtons(qtc.Qt.NoButton)
+        self.setFlag(qtw.QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    @property
+    def markerSize(self):
+        """
+        size of the largest marker, markers may be larger than a field and
+        extend right and down
+        """
+        if ShotOverlay._markerSize is None:
+            size = qtc.QSizeF()
+            for hit in self.ids:
+                size = size.expandedTo(qtc.QSizeF(
+                        assets.renderer(self.ids[hit]).defaultSize())
+                        * self.scaling[hit])
+            ShotOverlay._markerSize = size
+        return ShotOverlay._markerSize
+
+    def boundingRect(self):
+        grid = self.grid
+        width, height = grid.gridSize
+        return qtc.QRectF(
+                grid.originX, grid.originY,
+                (width - 1)*grid.cellWidth + self.markerSize.width(),
+                (height - 1)*grid.cellHeight + self.markerSize.height())
+
+    def mark(self, cell, hit):
+        """
+        show a marker at the field cell = (row, column)
+        """
+        index = cell[0]*self.width + cell[1]
+        (self.hits if hit else self.misses).add(index)
+        self.update(qtc.QRectF(self.grid.cellRect(*cell).topLeft(),
+                               self.markerSize))
+
+    def clear(self):
+        self.setShots(CellSet(), CellSet())
+
+    def setShots(self, hits, misses):
+        """
+        show the shots of two CellSets, they are used as they are, not copied
+        """
+        self.hits = hits
+        self.misses = misses
+        self.update()
+
+    def pixmaps(self, painter):
+        """
+        returns the markers rasterized for the scale of the painter, scales
+        are rounded to quarter octaves to keep the number of pixmaps small
+        while zooming
+        """
+        transform = painter.deviceTransform()
+        scale = max((transform.m11()**2 + transform.m12()**2)**.5, 1/64)
+        scale = 2**(round(4*log2(scale))/4)
+        return {hit: assets.pixmap(self.ids[hit], self.scaling[hit],
+                                   devicePixelRatio=scale)
+                for hit in self.ids}
+
+    def paint(self, painter, option, widget=None):
+        if not (self.hits or self.misses):
+            return
+        grid = self.grid
+        x0, y0 = grid.originX, grid.originY
+        w, h = grid.cellWidth, grid.cellHeight
+        exposed = option.exposedRect
+        if painter.hasClipping():
+            # QGraphicsScene.render exposes the whole item, but clips
+            exposed = exposed.intersected(painter.clipBoundingRect())
+        # markers of fields above and left of the exposed rect reach into it
+        exposed = exposed.adjusted(
+                w - self.markerSize.width(), h - self.markerSize.height(),
+                0, 0)
+        rows, cols = grid.visibleCells(exposed)
+        if not cols:
+            return
+        pixmaps = self.pixmaps(painter) if grid.isDetailed(painter) else {}
+        flat = qtc.QRectF(w/4, h/4, w/2, h/2)
+        width = self.width
+        point = qtc.QPointF()
+        for cells, hit in ((self.hits, True), (self.misses, False)):
+            if not cells:
+                continue
+            pixmap = pixmaps.get(hit)
+            color = self.color[hit]
+            for i in rows:
+                start = i*width + cols.start
+                mask = cells.span(start, start + len(cols))
+                point.setY(y0 + i*h)
+                while mask:
+                    low = mask & -mask
+                    point.setX(x0 + (cols.start + low.bit_length() - 1)*w)
+                    if pixmap is None:
+                        painter.fillRect(flat.translated(point), color)
+                    else:
+                        painter.drawPixmap(point, pixmap)
+                    mask ^= low
 
 
 class Ship(qsvg.QGraphicsSvgItem):
+    """
+    a ship of the fleet, rendered from its svg into a pixmap cache in device
+    coordinates. If the grid is not drawn in detail (see Grid.isDetailed)
+    the ship is a flat bar instead
+    """
 
     ids = {
             'Carrier':      rsc / 'Carrier.svg',
@@ -44,24 +172,21 @@ class Ship(qsvg.QGraphicsSvgItem):
             'Cruiser':      .9,
             'Destroyer':    .6 }
 
-    _extent = {
-            'Carrier':      5,
-            'Battleship':   4,
-            'Submarine':    3,
-            'Cruiser':      3,
-            'Destroyer':    2 }
-
     _orientation_angle = {
             'h':            0,
             'v':            -90}
 
+    validColor = qtg.QColor(0, 255, 0, 60)
+    invalidColor = qtg.QColor(255, 0, 0, 90)
+    flatColor = qtg.QColor(20, 20, 20)
+
     @property
     def extent(self):
-        return self._extent[self.id]
+        return self._extent
 
     @property
     def scaling(self):
-        return self._scaling[self.id]
+        return self._scaling[self.type]
 
     @property
     def index(self):
@@ -79,26 +204,33 @@ class Ship(qsvg.QGraphicsSvgItem):
     def orientation(self, value):
         self._orientation = value
 
-    def __init__(self, ship_id, parent, orientation='h'):
+    def __init__(self, ship_id, parent, orientation='h', extent=None):
         """
         This class provides the basic functionality to place ships at the
         beginning of the game.
 
-        ship_id can be one of the following:
+        ship_id is one of the following types, numbered if a fleet has
+        several ships of a type (e.g. 'Destroyer#2'):
             [Carrier, Battleship, Cruiser, Submarine, Destroyer]
         """
 
-        if ship_id not in self.ids.keys():
+        self.type = shipType(ship_id)
+        if self.type not in self.ids.keys():
             raise NotImplementedError(ship_id)
 
         self.id = ship_id
+        self._extent = extent or SHIP_TYPES[self.type]
         self.parent = parent
         self._index = None
-        super(Ship, self).__init__(str(self.ids[ship_id]))
+        self.valid = True
+        self.dragging = False
+        super(Ship, self).__init__()
+        self.setSharedRenderer(assets.renderer(self.ids[self.type]))
         self.orientation = orientation
         self.setRotation(self._orientation_angle[orientation])
         self.setToolTip(ship_id)
         self.setScale(self.scaling*parent.rectSize/30)
+        self.setCacheMode(qtw.QGraphicsItem.DeviceCoordinateCache)
 
     def enableDrag(self):
         """
@@ -121,74 +253,65 @@ class Ship(qsvg.QGraphicsSvgItem):
         self.setFlag(qtw.QGraphicsItem.ItemSendsScenePositionChanges, False)
 
     def positionAt(self, i, j):
-        self.setPos((1 + j)*self.parent.rectSize, (1 + i)*self.parent.rectSize)
+        grid = self.parent
+        self.setPos(grid.originX + j*grid.cellWidth,
+                    grid.originY + i*grid.cellHeight)
+
+    def setValid(self, valid):
+        """
+        mark the ship as (not) placed according to the rules
+        """
+        if valid != self.valid:
+            self.valid = valid
+            self.update()
+
+    def paint(self, painter, option, widget=None):
+        if self.parent.isDetailed(painter, self.scale()):
+            super(Ship, self).paint(painter, option, widget)
+        else:
+            bounds = self.boundingRect()
+            painter.fillRect(bounds.adjusted(0, .3*bounds.height(),
+                                             0, -.3*bounds.height()),
+                             self.flatColor)
+        if not self.valid:
+            painter.fillRect(self.boundingRect(), self.invalidColor)
+        elif self.dragging:
+            painter.fillRect(self.boundingRect(), self.validColor)
 
     def mousePressEvent(self, event):
         super(Ship, self).mousePressEvent(event)
+        self.dragging = True
+        self.update()
 
     def mouseReleaseEvent(self, event):
         super(Ship, self).mouseReleaseEvent(event)
-        self.parent.markState()
+        self.dragging = False
+        self.update()
+        self.parent.dropShip(self)
 
     def mouseMoveEvent(self, event):
         super(Ship, self).mouseMoveEvent(event)
         self.snapToGrid()
+        self.parent.moveShip(self)
 
     def keyPressEvent(self, event):
         if event.key() == 32:  # space
             self.rotateShip()
-            self.parent.markState()
+            self.parent.dropShip(self)
 
+    @metrics.timed('ship.snapToGrid')
     def snapToGrid(self):
         """
-        find the grid field which contains the upper left corner of the
-        ship and quantize the position to
+        quantize the position of the ship to the nearest grid field, keeping
+        the whole ship inside the grid
         """
-        for i, row in enumerate(self.parent.fields):
-            contain_check = [x.contains(self.pos()) for x in row]
-            if not any(contain_check):
-                continue
-            i, j, field = self.getValidField(i, row, contain_check)
-            if self.orientation == 'h':
-                pos = qtc.QPointF(field.x(), field.y())
-            elif self.orientation == 'v':
-                pos = qtc.QPointF(field.x(), field.y() + self.parent.rectSize)
-            self.setPos(pos)
-            self.index = (i, j)
-            break
-        else:
-            """
-            this will be executed when the current position is not inside one
-            of the grid fields. The position is then set to the the upper left
-            corner (origin) of the whole grid
-            """
-            self.index = (0, 0)
-            if self.orientation == 'h':
-                origin = self.parent.fields[0][0]
-                self.setPos(origin.x(), origin.y())
-            if self.orientation == 'v':
-                origin = self.parent.fields[self.extent][0]
-                self.setPos(origin.x(), origin.y())
-
-    def getValidField(self, i, row, contain_check):
-        """
-        returns the grid field which the ship should be positioned at
-        """
-        j, field = [(j, x) for j, x in enumerate(row)
-                    if contain_check[j]][0]
-        # check if ship is out of bounds in x-direction
-        if (
-                self.orientation == 'h' and
-                j + self.extent >= self.parent.gridSize[0]):
-            j = self.parent.gridSize[0] - self.extent
-            field = row[j]
-        # check if ship is out of bounds in y-direction
-        if (
-                self.orientation == 'v' and
-                i - self.extent < 0):
-            i = self.extent - 1
-            field = self.parent.fields[i][j]
-        return i, j, field
+        i, j = self.parent.shipIndexAt(
+                self.x(), self.y(), self.extent, self.orientation)
+        if self.orientation == 'h':
+            self.positionAt(i, j)
+        elif self.orientation == 'v':
+            self.positionAt(i + 1, j)
+        self.index = (i, j)
 
     def rotateShip(self):
         """
@@ -211,136 +334,259 @@ class Ship(qsvg.QGraphicsSvgItem):
         self.index = (i, j)
 
 
-class CenteredTextItem(qtw.QGraphicsTextItem):
-    """
-    subclass of text item where positioning is done at the center and not the
-    upper left corner of the bounding box
-    """
-    def centerAt(self, pos):
-        self.setPos(pos - self.boundingRect().center())
-
-
-class GridField(qtc.QRectF):
+def columnLabel(j):
     """
-    single field on the grid. Is needed because we want to mark if the field is
-    occupied -> GridField.occupied
-
-    also a simple getter setter implementation is shown examplary
+    spreadsheet style label of column j: A..Z, AA..AZ, BA..
     """
-
-    def __init__(self, parent, index, size, *args, **kwargs):
-
-        self.parent = parent
-
-        super(GridField, self).__init__(
-                size*index[0], size*index[1], size, size)
-        self._occupied = False
-        self._index = (index[0] - 1, index[1] - 1)
-        self._hit = False
-        self.status = None
-
-    @property
-    def index(self):
-        return self._index
-
-    @property
-    def occupied(self):
-        return self._occupied
-
-    @occupied.setter
-    def occupied(self, value):
-        self._occupied = value
-
-    def setOccupied(self, val):
-        if val not in [True, False]:
-            raise ValueError
-        self._occupied = val
-
-    def hit(self):
-        self._hit = True
-        self.status = HitIcon(self)
-        self.parent.addItem(self.status)
-        self.status.setPos(self.topLeft())
+    label = ''
+    j += 1
+    while j:
+        j, rest = divmod(j - 1, 26)
+        label = chr(65 + rest) + label
+    return label
 
 
 class Grid(qtw.QGraphicsScene):
     """
-    contains the game data
+    view of one board of a GameSession, the game data itself lives in
+    self.board. The board shown is the one of the player named like the
+    gridType. Without a session the grid creates a game of its own.
+
+    The scene only holds items for ships and one ShotOverlay for all shots.
+    Lines and labels of the grid are painted in drawBackground: into a pixmap
+    which is kept until the scale changes, or, if that pixmap would be too
+    large, directly for the exposed region only.
+
+    Small fields are drawn with less detail: ships and shots as flat shapes
+    instead of svg images below minDetailPixels, and only every n-th line
+    and label so they are minLinePixels and minDetailPixels apart. In draft
+    mode (while a BoardView is resized) items are flat at any size
     """
     gridSize = (10, 10)
     rectSize = 30
     gridTypes = ('player', 'enemy')
-    currentPlayer = None
-    gameFinished = False
-
-    def __init__(self, parent, *args, gridType='player', **kwargs):
+    maxBackgroundPixels = 4096*4096
+    minDetailPixels = 12    # smallest field (screen pixels) drawn in detail
+    minLinePixels = 8       # smallest distance of grid lines (pixels)
+    # up to this number of ships the items are not indexed, a linear search
+    # is cheaper than keeping an index up to date while ships are dragged
+    maxUnindexedShips = 32
+
+    fieldClicked = qtc.pyqtSignal(int, int)         # row, column
+    shotFired = qtc.pyqtSignal(int, int, object)    # row, column, ShotResult
+    shipSunk = qtc.pyqtSignal(str)                  # ship id
+    fleetDestroyed = qtc.pyqtSignal()
+    fleetChanged = qtc.pyqtSignal()     # the user moved or replaced ships
+
+    def __init__(self, parent, *args, gridType='player', session=None,
+                 seed=None, gridSize=None, fleet=FLEET, **kwargs):
 
         if gridType not in self.gridTypes: raise NotImplementedError
         super(Grid, self).__init__(parent)
+        if session is None:
+            session = GameSession(gridSize or self.gridSize, fleet, seed)
+        self.session = session
         self.ships = []
         self.gridType = gridType
-        self.fieldSelected = None
-        self.setSceneRect(0, 0,
-                *[self.rectSize*(x + 2) for x in self.gridSize])
+        self.gridSize = session.gridSize
+        self.fleet = session.fleet
+        self.rng = session.rng
+        self.board = session.boards[gridType]
+        self.validator = PlacementValidator(self.gridSize)
+        self.draft = False
+        self.originX = self.originY = self.rectSize
+        self.cellWidth = self.cellHeight = self.rectSize
         self.createGrid(*self.gridSize)
 
     def createGrid(self, width, height):
+        """
+        size the scene for a grid of width x height fields with a row of
+        labels on top and a column of labels on the left
+        """
+        self.gridPen = qtg.QPen(qtc.Qt.black)
+        self.labelFont = qtg.QFont()
+        self.backgroundCache = None
+        self.backgroundKey = None
+        self.backgroundPending = None
+        self.setSceneRect(0, 0,
+                self.originX + self.cellWidth*(width + 1),
+                self.originY + self.cellHeight*(height + 1))
+        if len(self.fleet) <= self.maxUnindexedShips:
+            self.setItemIndexMethod(qtw.QGraphicsScene.NoIndex)
+        self.overlay = ShotOverlay(self)
+        self.addItem(self.overlay)
+
+    def visibleCells(self, rect):
+        """
+        returns the ranges of rows and columns intersecting the scene rect
+        """
+        width, height = self.gridSize
+        top = max(floor((rect.top() - self.originY)/self.cellHeight), 0)
+        left = max(floor((rect.left() - self.originX)/self.cellWidth), 0)
+        bottom = min(floor((rect.bottom() - self.originY)/self.cellHeight) + 1,
+                     height)
+        right = min(floor((rect.right() - self.originX)/self.cellWidth) + 1,
+                    width)
+        return range(top, max(bottom, top)), range(left, max(right, left))
+
+    def setDraft(self, draft):
+        """
+        draw everything in low detail (e.g. while the view is resized), the
+        items are rendered in detail again when the draft mode ends
+        """
+        if draft == self.draft:
+            return
+        self.draft = draft
+        self.overlay.update()
+        if not draft:
+            # the caches of the ships hold the draft
+            for ship in self.ships:
+                ship.update()
+
+    def isDetailed(self, painter, scale=1.):
+        """
+        whether an item of the given scale paints in detail with painter: not
+        in draft mode and not if fields are smaller than minDetailPixels
+        """
+        if self.draft:
+            return False
+        return (self.fieldPixels(painter.worldTransform())/scale
+                >= self.minDetailPixels)
 
-        rectSize = self.rectSize
-        self.column_ids = []
-        self.row_ids = []
-        self.fields = []
-        for y in range(height):
-            row = []
-            for x in range(width):
-                rect = GridField(self, (1 + x, 1 + y), rectSize)
-                self.addRect(rect)
-                row.append(rect)
-            self.fields.append(row)
-
-        for i in range(width):
-            letter = chr(65+i)
-            pos = qtc.QPointF(rectSize*(1.5 + i), rectSize*.5)
-            item = CenteredTextItem(letter)
-            self.addItem(item)
-            item.centerAt(pos)
-            self.column_ids.append(item)
-
-        for i in range(height):
-            pos = qtc.QPointF(rectSize*.5, rectSize*(1.5 + i))
-            item = CenteredTextItem(str(1 + i))
-            self.addItem(item)
-            item.centerAt(pos)
-            self.row_ids.append(item)
+    def fieldPixels(self, transform):
+        """
+        the size of the smaller side of a field mapped by transform
+        """
+        return (qtw.QStyleOptionGraphicsItem.levelOfDetailFromTransform(
+                transform) * min(self.cellWidth, self.cellHeight))
 
+    def detailStep(self, transform, pixels):
+        """
+        the smallest power of two of fields which is at least pixels long
+        when mapped by transform
+        """
+        size = self.fieldPixels(transform)
+        step = 1
+        while size*step < pixels and step < max(self.gridSize):
+            step *= 2
+        return step
+
+    def drawBackground(self, painter, rect):
+        super(Grid, self).drawBackground(painter, rect)
+        transform = painter.worldTransform()
+        devicePixelRatio = painter.device().devicePixelRatioF()
+        pixmap = None
+        if (transform.type() <= qtg.QTransform.TxScale
+                and transform.m11() > 0 and transform.m22() > 0):
+            pixmap = self.backgroundPixmap(
+                    transform.m11(), transform.m22(), devicePixelRatio)
+        if pixmap is None:
+            self.paintGrid(painter, rect)
+            return
+        # copy the exposed part 1:1 in device coordinates
+        origin = transform.map(self.sceneRect().topLeft())
+        target = transform.mapRect(rect)
+        painter.save()
+        painter.resetTransform()
+        painter.drawPixmap(target, pixmap, qtc.QRectF(
+                (target.x() - origin.x())*devicePixelRatio,
+                (target.y() - origin.y())*devicePixelRatio,
+                target.width()*devicePixelRatio,
+                target.height()*devicePixelRatio))
+        painter.restore()
+
+    def backgroundPixmap(self, scaleX, scaleY, devicePixelRatio):
+        """
+        returns the whole grid rendered at the given scale, rendered again
+        only when the scale changes. Returns None if the pixmap would be
+        larger than maxBackgroundPixels and while the scale keeps changing
+        (zooming): the pixmap is rendered when a scale is used a second time
+        """
+        key = (round(scaleX, 6), round(scaleY, 6), devicePixelRatio)
+        if key == self.backgroundKey:
+            return self.backgroundCache
+        if key != self.backgroundPending:
+            self.backgroundPending = key
+            return None
+        scene = self.sceneRect()
+        factorX = scaleX*devicePixelRatio
+        factorY = scaleY*devicePixelRatio
+        width = ceil(scene.width()*factorX)
+        height = ceil(scene.height()*factorY)
+        self.backgroundKey = key
+        self.backgroundCache = None
+        if 0 < width*height <= self.maxBackgroundPixels:
+            pixmap = qtg.QPixmap(width, height)
+            pixmap.fill(qtc.Qt.transparent)
+            painter = qtg.QPainter(pixmap)
+            # rendered once per scale, so antialiasing comes for free
+            painter.setRenderHint(qtg.QPainter.Antialiasing)
+            painter.scale(factorX, factorY)
+            painter.translate(-scene.topLeft())
+            self.paintGrid(painter, scene)
+            painter.end()
+            self.backgroundCache = pixmap
+        return self.backgroundCache
+
+    def paintGrid(self, painter, rect):
+        """
+        paint the lines and labels of the grid inside rect
+        """
+        rows, cols = self.visibleCells(rect)
+        x0, y0 = self.originX, self.originY
+        w, h = self.cellWidth, self.cellHeight
+        width, height = self.gridSize
+        transform = painter.worldTransform()
+        lineStep = self.detailStep(transform, self.minLinePixels)
+        labelStep = self.detailStep(transform, self.minDetailPixels)
+        painter.setPen(self.gridPen)
+        painter.setFont(self.labelFont)
+        if rows and cols:
+            left, right = x0 + cols.start*w, x0 + cols.stop*w
+            top, bottom = y0 + rows.start*h, y0 + rows.stop*h
+            painter.drawLines(
+                    [qtc.QLineF(left, y0 + i*h, right, y0 + i*h)
+                     for i in range(rows.start, rows.stop + 1)
+                     if not i % lineStep or i == height]
+                    + [qtc.QLineF(x0 + j*w, top, x0 + j*w, bottom)
+                       for j in range(cols.start, cols.stop + 1)
+                       if not j % lineStep or j == width])
+        if rect.top() < y0:
+            for j in cols[-cols.start % labelStep::labelStep]:
+                painter.drawText(qtc.QRectF(x0 + j*w, 0, w, y0),
+                                 qtc.Qt.AlignCenter, columnLabel(j))
+        if rect.left() < x0:
+            for i in rows[-rows.start % labelStep::labelStep]:
+                painter.drawText(qtc.QRectF(0, y0 + i*h, x0, h),
+                                 qtc.Qt.AlignCenter, str(1 + i))
+
+    def cellRect(self, i, j):
+        return qtc.QRectF(self.originX + j*self.cellWidth,
+                          self.originY + i*self.cellHeight,
+                          self.cellWidth, self.cellHeight)
+
+    @metrics.timed('grid.randomizePlacement')
     def randomizePlacement(self):
+        """
+        replace the ships by a random legal fleet. The fleet is drawn first
+        (see samplePlacements), so every Ship item is only created once
+        """
+        self.showFleet(samplePlacements(self.gridSize, self.fleet, self.rng))
+        self.enableDrag()
+        self.fleetChanged.emit()
 
+    def showFleet(self, placements):
+        """
+        replace the ships by Ship items for the Placements
+        """
         if self.ships:
             [self.removeShip(ship) for ship in self.ships]
 
-        no = 0
-        finished = False
-        shipIds = [x for x in Ship.ids.keys()]
-        while not finished:
-            shipId = shipIds[no]
-            extent = Ship._extent[shipId]
-            orientation = choice(('v', 'h'))
-            if orientation == 'h':
-                index = (randint(0, self.gridSize[0] - 1),
-                         randint(0, self.gridSize[1] - 1 - extent))
-            elif orientation == 'v':
-                index = (randint(extent - 1, self.gridSize[0] - 1),
-                         randint(0, self.gridSize[1] - 1))
-            ship = Ship(shipId, self, orientation)
-            self.addShip(ship, index)
-            ship.enableDrag()
+        for placement in placements:
+            ship = Ship(placement.shipId, self, placement.orientation,
+                        placement.extent)
+            self.addShip(ship, placement.index)
             self.ships.append(ship)
-            if not self.checkReady():
-                self.removeShip(ship)
-            else:
-                no += 1
-                if no == len(shipIds):
-                    finished = True
 
     def addShip(self, ship, index, visible=True):
         if ship.orientation == 'h':
@@ -348,6 +594,8 @@ class Grid(qtw.QGraphicsScene):
         elif ship.orientation == 'v':
             ship.positionAt(index[0] + 1, index[1])
         ship.index = index
+        self.board.placeShip(ship.id, ship.extent, ship.orientation, index)
+        self.validator.move(ship.id, ship.extent, ship.orientation, index)
         self.addItem(ship)
 
     def enableDrag(self):
@@ -361,114 +609,246 @@ class Grid(qtw.QGraphicsScene):
 
     def removeShip(self, shipToRemove):
         self.ships = [ship for ship in self.ships if not ship == shipToRemove]
+        self.board.removeShip(shipToRemove.id)
+        self.validator.remove(shipToRemove.id)
         self.removeItem(shipToRemove)
 
-    def markState(self):
+    def moveShip(self, ship):
+        """
+        update the validator while ship is dragged. Only the fields of this
+        ship are touched, so this is cheap enough for every mouse move
+        """
+        self.validator.move(ship.id, ship.extent, ship.orientation, ship.index)
+        ship.setValid(self.validator.isShipValid(ship.id))
 
+    def dropShip(self, ship):
+        """
+        ship was dropped or rotated: update the board and the highlighting of
+        all ships, the move may have resolved conflicts of other ships
+        """
+        self.moveShip(ship)
+        self.board.placeShip(ship.id, ship.extent, ship.orientation,
+                             ship.index)
+        for other in self.ships:
+            other.setValid(self.validator.isShipValid(other.id))
+        self.fleetChanged.emit()
+
+    @metrics.timed('grid.markState')
+    def markState(self):
+        """
+        transfer all ship positions to the board and the validator. Raises
+        ValueError if a ship is not completely on the grid
+        """
         self.resetState()
 
         for ship in self.ships:
-            index = ship.index
-            for offset in range(ship.extent):
-                if ship.orientation == 'h':
-                    self.fields[index[0]][index[1] + offset].occupied = True
-                elif ship.orientation == 'v':
-                    self.fields[index[0] - offset][index[1]].occupied = True
+            self.board.placeShip(
+                    ship.id, ship.extent, ship.orientation, ship.index)
+            self.validator.move(
+                    ship.id, ship.extent, ship.orientation, ship.index)
         # self.printOccupied()  # for debug
 
     def resetState(self):
-        for row in self.fields:
-            [field.setOccupied(False) for field in row]
+        self.board.clearShips()
+        self.validator = PlacementValidator(self.gridSize)
 
     def finalizePlacement(self):
         self.markState()
         for ship in self.ships: ship.disableDrag()
 
+    @metrics.timed('grid.checkReady')
     def checkReady(self):
         """
         check if the ships are placed according to the rules before game start
         """
-        check = [[0 for _1 in range(self.gridSize[0])]
-                 for _2 in range(self.gridSize[1])]
+        return self.validator.isValid()
+
+    def fire(self, cell):
+        """
+        fire at the field cell = (row, column) regardless of the turn,
+        returns the engine's ShotResult
+        """
+        result = self.board.shoot(cell)
+        self.showShot(cell, result)
+        return result
+
+    def showShot(self, cell, result):
+        """
+        mark a shot which was fired at the board (e.g. by the session)
+        """
+        self.overlay.mark(cell, result.result != 'miss')
+        metrics.count(f'shots.{self.gridType}.{result.result}')
+        self.shotResolved(cell, result)
 
+    def showBoard(self, revealed=True):
+        """
+        rebuild the items from the board in one pass (e.g. of a restored
+        session): ships, shots and sunk ships. Ships which are not sunk are
+        hidden unless revealed
+        """
+        board = self.board
+        self.showFleet(list(board.ships.values()))
         for ship in self.ships:
-            j, i = ship.index
-            extent = ship.extent
-            orientation = ship.orientation
-
-            if orientation == 'h':
-                indices = [
-                        (i - 1, j, 1), (i - 1, j - 1, 1), (i - 1, j + 1, 1),
-                        (i + extent, j - 1, 1), (i + extent, j + 1, 1),
-                        (i + extent, j, 1)]
-
-                for offset in range(extent):
-                    indices.extend([
-                        (i+offset, j, 2),
-                        (i + offset, j - 1, 1),
-                        (i + offset, j + 1, 1)])
-
-            elif orientation == 'v':
-                indices = [
-                        (i, j + 1, 1), (i - 1, j + 1, 1), (i + 1, j + 1, 1),
-                        (i, j - extent, 1), (i - 1, j - extent, 1),
-                        (i + 1, j - extent, 1)]
-
-                for offset in range(extent):
-                    indices.extend([
-                            (i, j - offset, 2),
-                            (i - 1, j - offset, 1),
-                            (i + 1, j - offset, 1)])
-
-            for i_, j_, val in indices:
-                if (i_ < 0 or i_ >= self.gridSize[0] or
-                        j_ < 0 or j_ >= self.gridSize[1]): continue
-                check[j_][i_] += val
-
-        # for row in check:
-        #     print([i for i in row])
-
-        for row in check:
-            if any([x > 2 for x in row]):
-                return False
-        else:
-            return True
+            ship.setValid(self.validator.isShipValid(ship.id))
+            ship.setVisible(revealed or ship.id in board.sunk)
+        self.showShots(board.hits.copy(),
+                       CellSet(n for n in board.shots if n not in board.hits),
+                       board.sunk)
+
+    def showShots(self, hits, misses, sunk=()):
+        """
+        show a state of the board at once (e.g. of a Replay): the shots of
+        the CellSets hits and misses, the ships with ids in sunk are dimmed
+        """
+        self.overlay.setShots(hits, misses)
+        for ship in self.ships:
+            ship.setOpacity(.6 if ship.id in sunk else 1.)
+
+    def shotResolved(self, cell, result):
+        """
+        announce the result of a shot. Sunk ships are revealed and dimmed
+        """
+        self.shotFired.emit(cell[0], cell[1], result)
+        if result.result in ('sunk', 'destroyed'):
+            ships = [ship for ship in self.ships if ship.id == result.shipId]
+            if not ships and result.shipId in self.board.ships:
+                # the ships of a network opponent become known when sunk
+                placement = self.board.ships[result.shipId]
+                ship = Ship(placement.shipId, self, placement.orientation,
+                            placement.extent)
+                self.addShip(ship, placement.index)
+                self.ships.append(ship)
+                ships.append(ship)
+            for ship in ships:
+                ship.setVisible(True)
+                ship.setOpacity(.6)
+            self.shipSunk.emit(result.shipId)
+        if result.result == 'destroyed':
+            self.fleetDestroyed.emit()
 
     def printOccupied(self):
-        for row in self.fields:
-            print([field.occupied for field in row])
+        for placement in self.board.ships.values():
+            print(placement)
         print('\n')
 
+    def cellAt(self, x, y):
+        """
+        returns the (row, column) index of the field containing the scene
+        position (x, y) or None if the position is outside of the grid.
+
+        The index is calculated from the grid origin and the field size, which
+        may differ in x and y. Views can be zoomed freely since all lookups
+        are done in scene coordinates
+        """
+        i = floor((y - self.originY)/self.cellHeight)
+        j = floor((x - self.originX)/self.cellWidth)
+        if 0 <= i < self.gridSize[1] and 0 <= j < self.gridSize[0]:
+            return i, j
+        return None
+
+    def shipIndexAt(self, x, y, extent, orientation):
+        """
+        returns the index of the ship position closest to the scene position
+        (x, y) of the ship's origin. The index is clamped so the ship stays
+        on the grid. The origin of a vertical ship (rotated by -90 degrees) is
+        the lower left corner of its last field
+        """
+        width, height = self.gridSize
+        i = floor((y - self.originY)/self.cellHeight + .5)
+        j = floor((x - self.originX)/self.cellWidth + .5)
+        if orientation == 'h':
+            i = min(max(i, 0), height - 1)
+            j = min(max(j, 0), width - extent)
+        elif orientation == 'v':
+            i = min(max(i - 1, extent - 1), height - 1)
+            j = min(max(j, 0), width - 1)
+        return i, j
+
     def getClickedField(self, event):
-        for row in self.fields:
-            contain_check = [x.contains(event.pos()) for x in row]
-            if not any(contain_check): continue
-            return [x for j, x in enumerate(row) if contain_check[j]][0]
+        """
+        returns the (row, column) index of the field under the mouse or None
+        """
+        pos = event.scenePos()
+        return self.cellAt(pos.x(), pos.y())
 
     def mousePressEvent(self, event):
         super(Grid, self).mousePressEvent(event)
         if self.gridType == 'enemy':
-            field = self.getClickedField(event)
-            if not field or Grid.currentPlayer == 'enemy': return
-            self.fieldSelected = field
+            cell = self.getClickedField(event)
+            shooter = self.session.opponent(self.gridType)
+            if not cell or not self.session.isTurn(shooter): return
+            self.fieldClicked.emit(*cell)
+
+
+class BoardView(qtw.QGraphicsView):
+    """
+    view of a Grid which scales the whole board to the size of the view.
+
+    A repaint mostly copies pixmaps: the grid keeps its background in a
+    pixmap (so the view does not cache it a second time), ships cache
+    themselves in device coordinates and the shot markers are pixmaps. While
+    the view is resized continuously every size would render all of them
+    again, so the grid is drawn in draft mode until the size did not change
+    for settleDelay ms
+    """
+
+    settleDelay = 150
+
+    def __init__(self, *args, **kwargs):
+        super(BoardView, self).__init__(*args, **kwargs)
+        self.setCacheMode(qtw.QGraphicsView.CacheNone)
+        self.setViewportUpdateMode(qtw.QGraphicsView.SmartViewportUpdate)
+        self.setOptimizationFlag(qtw.QGraphicsView.DontAdjustForAntialiasing)
+        self.setHorizontalScrollBarPolicy(qtc.Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(qtc.Qt.ScrollBarAlwaysOff)
+        self.setSizePolicy(qtw.QSizePolicy.Expanding,
+                           qtw.QSizePolicy.Expanding)
+        self.setMinimumSize(120, 120)
+        self.settleTimer = qtc.QTimer(self)
+        self.settleTimer.setSingleShot(True)
+        self.settleTimer.setInterval(self.settleDelay)
+        self.settleTimer.timeout.connect(self.settle)
+
+    def setScene(self, scene):
+        super(BoardView, self).setScene(scene)
+        self.fitScene()
+
+    def fitScene(self):
+        if self.scene() is not None:
+            self.fitInView(self.scene().sceneRect(), qtc.Qt.KeepAspectRatio)
+
+    def resizeEvent(self, event):
+        super(BoardView, self).resizeEvent(event)
+        if self.scene() is None:
+            return
+        # a single resize is drawn in detail right away, the draft starts
+        # with the second one in a row
+        if self.settleTimer.isActive():
+            self.scene().setDraft(True)
+        self.settleTimer.start()
+        self.fitScene()
+
+    def settle(self):
+        if self.scene() is None:
+            return
+        self.scene().setDraft(False)
+        self.viewport().update()
 
 
 if __name__ == '__main__':
     app = qtw.QApplication(sys.argv)
 
     widget = qtw.QWidget()
-    player = qtw.QWidget()
-    enemy = qtw.QWidget()
     layout = qtw.QGridLayout()
-    layout.addWidget(enemy, 0, 0, 5, 1)
-    layout.addWidget(player, 5, 0, 5, 1)
     widget.setLayout(layout)
 
-    playerView = qtw.QGraphicsView(player)
+    playerView = BoardView()
     playerView.setScene(Grid(playerView, gridType='player'))
+    layout.addWidget(playerView, 0, 0)
 
-    enemyView = qtw.QGraphicsView(enemy)
+    enemyView = BoardView()
     enemyView.setScene(Grid(enemyView, gridType='enemy'))
+    layout.addWidget(enemyView, 1, 0)
 
     widget.setGeometry(300, 300, 400, 300)
     widget.show()
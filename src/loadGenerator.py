@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+load generator for the match server, plays concurrent matches between bots
+over loopback, e.g.
+
+    python -m src.loadGenerator --matches 10000
+
+Without --port a server is started in a separate process. Bots place random
+fleets and fire at random fields, the report contains the throughput, the
+latency of shots (FIRE until RESULT) and the memory of the server
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+from pathlib import Path
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from .engine import Board, FLEET
+from .placement import samplePlacements
+from .protocol import (
+        ERROR, GAME_OVER, INCOMING, MATCHED, RESULT, START, FIRE,
+        FrameBuffer, decodeCell, decodeFlag, encodeCell, encodeJoin,
+        encodePlace)
+from .simulate import parseFleet, parseSize
+
+
+class Bot(asyncio.Protocol):
+    """
+    client playing a number of games in a row on one connection
+    """
+
+    def __init__(self, generator, seed):
+        self.generator = generator
+        self.rng = Random(seed)
+        self.transport = None
+        self.buffer = FrameBuffer()
+        self.board = None
+        self.targets = None
+        self.firedAt = None
+        self.gamesLeft = generator.games
+        self.done = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.join()
+
+    def connection_lost(self, exc):
+        if not self.done.done():
+            self.generator.lost += 1
+            self.done.set_result(False)
+
+    def join(self):
+        generator = self.generator
+        self.transport.write(encodeJoin(generator.gridSize, generator.fleet))
+
+    def data_received(self, data):
+        for opcode, body in self.buffer.feed(data):
+            handler = self.handlers.get(opcode)
+            if handler:
+                handler(self, body)
+
+    def matched(self, body):
+        generator = self.generator
+        placements = {placement.shipId: placement for placement in
+                      samplePlacements(generator.gridSize, generator.fleet,
+                                       self.rng)}
+        self.board = Board(generator.gridSize)
+        for placement in placements.values():
+            self.board.placeShip(*placement)
+        self.targets = list(range(self.board.geometry.size))
+        self.rng.shuffle(self.targets)
+        self.transport.write(encodePlace(
+                [(placements[shipId].orientation, placements[shipId].index)
+                 for shipId, _ in generator.fleet]))
+
+    def start(self, body):
+        if decodeFlag(body):
+            self.fire()
+
+    def fire(self):
+        cell = divmod(self.targets.pop(), self.generator.gridSize[0])
+        self.firedAt = perf_counter()
+        self.transport.write(encodeCell(FIRE, cell))
+
+    def result(self, body):
+        self.generator.shot(perf_counter() - self.firedAt)
+
+    def incoming(self, body):
+        # the own board tells if the game is lost, no need to wait for it
+        if self.board.shoot(decodeCell(body)).result != 'destroyed':
+            self.fire()
+
+    def gameOver(self, body):
+        self.generator.gameEnds += 1
+        self.gamesLeft -= 1
+        if self.gamesLeft:
+            self.join()
+        else:
+            self.done.set_result(True)
+            self.transport.close()
+
+    def error(self, body):
+        self.generator.errors += 1
+
+    handlers = {
+            MATCHED:    matched,
+            START:      start,
+            RESULT:     result,
+            INCOMING:   incoming,
+            GAME_OVER:  gameOver,
+            ERROR:      error}
+
+
+class LoadGenerator:
+
+    def __init__(self, host, port, matches, games=1, gridSize=(10, 10),
+                 fleet=FLEET, seed=0, maxSamples=100000):
+        self.host = host
+        self.port = port
+        self.matches = matches
+        self.games = games
+        self.gridSize = gridSize
+        self.fleet = fleet
+        self.seed = seed
+        self.maxSamples = maxSamples
+        self.rng = Random(seed)
+        self.shots = 0
+        # both bots of a match see its end
+        self.gameEnds = 0
+        self.errors = 0
+        self.lost = 0
+        self.latencies = []
+
+    def shot(self, latency):
+        """
+        record the latency of a shot, a uniform sample of maxSamples
+        latencies is kept (reservoir sampling)
+        """
+        self.shots += 1
+        if len(self.latencies) < self.maxSamples:
+            self.latencies.append(latency)
+        else:
+            k = self.rng.randrange(self.shots)
+            if k < self.maxSamples:
+                self.latencies[k] = latency
+
+    async def connect(self, seed, attempts=20):
+        loop = asyncio.get_running_loop()
+        for attempt in range(attempts):
+            try:
+                _, bot = await loop.create_connection(
+                        lambda: Bot(self, seed), self.host, self.port)
+                return bot
+            except OSError:
+                await asyncio.sleep(.05*(attempt + 1))
+        raise ConnectionError(f'can not connect to {self.host}:{self.port}')
+
+    async def run(self, batch=500):
+        """
+        open 2*matches connections in batches and wait until all bots are
+        done. Returns the wall time needed
+        """
+        begin = perf_counter()
+        bots = []
+        for start in range(0, 2*self.matches, batch):
+            stop = min(start + batch, 2*self.matches)
+            bots.extend(await asyncio.gather(*(
+                    self.connect(f'{self.seed}:{no}')
+                    for no in range(start, stop))))
+        await asyncio.gather(*(bot.done for bot in bots))
+        return perf_counter() - begin
+
+    def report(self, seconds):
+        latencies = sorted(self.latencies)
+
+        def quantile(q):
+            if not latencies:
+                return None
+            return latencies[min(int(q*len(latencies)), len(latencies) - 1)]
+        return {
+                'matches': self.matches*self.games,
+                'finished': self.gameEnds//2,
+                'errors': self.errors,
+                'lostConnections': self.lost,
+                'seconds': seconds,
+                'matchesPerSecond': self.gameEnds/2/seconds,
+                'shotsPerSecond': self.shots/seconds,
+                'latencyMs': {
+                    'median': median(latencies)*1e3 if latencies else None,
+                    'p99': quantile(.99)*1e3 if latencies else None,
+                    'max': latencies[-1]*1e3 if latencies else None}}
+
+
+def raiseFileLimit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed and soft != hard:
+        target = (needed if hard == resource.RLIM_INFINITY
+                  else min(needed, hard))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def startServer(host):
+    """
+    start a server process on a free port, returns the process and the port
+    """
+    process = subprocess.Popen(
+            [sys.executable, '-m', 'src.server', '--host', host,
+             '--port', '0'],
+            stderr=subprocess.PIPE, text=True,
+            cwd=Path(__file__).absolute().parent.parent)
+    line = process.stderr.readline()
+    if not line.startswith('serving on'):
+        process.kill()
+        raise RuntimeError(f'server did not start: {line}')
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def residentMemory(pid):
+    """
+    resident memory of a process in bytes (linux only, else None)
+    """
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])*1024
+    except OSError:
+        return None
+
+
+async def monitor(pid, peak, interval=.2):
+    while True:
+        memory = residentMemory(pid)
+        if memory:
+            peak[0] = max(peak[0], memory)
+        await asyncio.sleep(interval)
+
+
+async def generate(generator, serverPid=None):
+    peak = [0]
+    watcher = None
+    if serverPid:
+        idle = residentMemory(serverPid)
+        watcher = asyncio.ensure_future(monitor(serverPid, peak))
+    seconds = await generator.run()
+    report = generator.report(seconds)
+    if watcher:
+        watcher.cancel()
+        report['serverMemory'] = {
+                'idle': idle, 'peak': peak[0],
+                'perConnection': (peak[0] - idle)/(2*generator.matches)
+                if idle and peak[0] else None}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m src.loadGenerator',
+            description='play concurrent matches against the match server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int,
+                        help='port of a running server, by default a server '
+                             'is started')
+    parser.add_argument('-m', '--matches', type=int, default=1000,
+                        help='concurrent matches')
+    parser.add_argument('-g', '--games', type=int, default=1,
+                        help='games played on every connection')
+    parser.add_argument('-s', '--seed', default='0')
+    parser.add_argument('--size', type=parseSize, default=(10, 10))
+    parser.add_argument('--fleet', type=parseFleet, default=FLEET)
+    args = parser.parse_args(argv)
+
+    # every match needs two sockets here and two in the server
+    limit = raiseFileLimit(4*args.matches + 100)
+    if limit < 2*args.matches + 100:
+        parser.error(f'the limit of open files ({limit}) is too low')
+
+    process = None
+    port = args.port
+    if port is None:
+        process, port = startServer(args.host)
+    try:
+        generator = LoadGenerator(
+                args.host, port, args.matches, args.games, args.size,
+                args.fleet, args.seed)
+        report = asyncio.run(
+                generate(generator, process.pid if process else None))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=4))
+    return 0 if report['finished'] == report['matches'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
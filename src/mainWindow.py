@@ -3,37 +3,96 @@
 
 
 import sys
-from PyQt5 import (QtWidgets as qtw, QtCore as qtc, QtGui as qtg)
+from pathlib import Path
+from PyQt5 import (QtWidgets as qtw, QtCore as qtc)
 
-from .gameScreen import GameScreen
+from .background import Background, BackgroundImage
+from .engine import FLEET
 
+rsc = Path(__file__).absolute().parent.parent / 'rsc'
 
-class MainWindow(qtw.QMainWindow):
 
-    style = """
-    #mainButtons{
-    border-image: url(rsc/MainWindow.jpg) 0 0 0 0 stretch stretch;
-    }
-    #gameWindow{
-    border-image: url(rsc/GameWindow.jpg) 0 0 0 0 stretch stretch;
-    }
+class MainWindow(qtw.QMainWindow):
+    """
+    The main menu is shown before anything else is loaded. After its first
+    paint the user is asked for a name while the game screen (numpy, QtSvg)
+    and the svg assets are loaded step by step from the event loop, see
+    warmUp. The background images are decoded on a thread pool
     """
 
     username = None
 
-    def __init__(self, parent=None, *args, **kwargs):
+    firstPaint = qtc.pyqtSignal()
+    warmedUp = qtc.pyqtSignal()
+
+    def __init__(self, parent=None, *args, server=None, strategy='expert',
+                 record=False, gridSize=None, fleet=None, **kwargs):
+        """
+        server is the (host, port) of a match server to play against other
+        players, by default the game is played against the AI strategy (see
+        strategies.py). With record the games against the AI are recorded
+        as replays. New games are played on a board of gridSize (default
+        10x10) with the fleet (default FLEET)
+        """
 
         super(MainWindow, self).__init__(parent)
         self.parent = parent
+        self.server = server
+        self.strategy = strategy
+        self.record = record
+        self.gridSize = tuple(gridSize or (10, 10))
+        self.fleet = tuple(fleet or FLEET)
 
         self.setWindowTitle('battleship V0.1')
         self.setObjectName("mainwindow")
-        self.getUserName()
+        self.painted = False
+        self.warmUpSteps = None
         self.createButtons()
         self.initUI()
         self.showFullScreen()
         self.setMinimumSize(800, 400)
 
+    def eventFilter(self, watched, event):
+        if (watched is self.mainMenu and event.type() == qtc.QEvent.Paint
+                and not self.painted):
+            self.painted = True
+            self.firstPaint.emit()
+            qtc.QTimer.singleShot(0, self.afterFirstPaint)
+        return super(MainWindow, self).eventFilter(watched, event)
+
+    def afterFirstPaint(self):
+        self.mainMenu.removeEventFilter(self)
+        self.warmUp()
+        self.getUserName()
+
+    def warmUp(self):
+        """
+        load what the menu does not need, one step per pass of the event loop
+        """
+        if self.warmUpSteps is None:
+            self.warmUpSteps = self.loadDeferred()
+        if next(self.warmUpSteps, None) is None:
+            self.warmUpSteps = iter(())
+            self.warmedUp.emit()
+        else:
+            qtc.QTimer.singleShot(0, self.warmUp)
+
+    def loadDeferred(self):
+        BackgroundImage.get(rsc / 'GameWindow.jpg').preload()
+        yield 'background'
+        self.updateResume()
+        yield 'saved game'
+        from .gameScreen import GameScreen
+        yield 'game screen'
+        from .openingBook import OpeningBook
+        OpeningBook.get(self.gridSize, self.fleet)
+        yield 'opening book'
+        from .assetCache import assets
+        from .gridWidget import Ship, ShotOverlay
+        for path in (*Ship.ids.values(), *ShotOverlay.ids.values()):
+            assets.renderer(path)
+            yield path
+
     def getUserName(self):
         """
         open a QDialog to get the username and save it as self.username. Close
@@ -51,14 +110,15 @@ class MainWindow(qtw.QMainWindow):
     def initUI(self):
 
         self.stackWidget = qtw.QStackedWidget(objectName='centralWidget')
-        self.stackWidget.setStyleSheet(self.style)
         self.stackWidget.addWidget(self.mainMenu)
+        self.mainMenu.installEventFilter(self)
         self.setCentralWidget(self.stackWidget)
         self.connect()
 
     def createButtons(self):
 
         self.mainMenu = qtw.QWidget(objectName='mainButtons')
+        self.background = Background(rsc / 'MainWindow.jpg', self.mainMenu)
         self.mainButtons = qtw.QWidget()
         buttonBox = qtw.QGridLayout()
         buttonBox.addWidget(self.mainButtons, 1, 1)
@@ -68,6 +128,9 @@ class MainWindow(qtw.QMainWindow):
 
         self.mainButtons.setSizePolicy(sizePolicy, sizePolicy)
 
+        self.btn_resume = qtw.QPushButton(
+                "Resume Game", objectName='button:resume game')
+        self.btn_resume.hide()
         self.btn_newGame = qtw.QPushButton(
                 "New Game", objectName='button:new game')
         self.btn_options = qtw.QPushButton(
@@ -75,35 +138,83 @@ class MainWindow(qtw.QMainWindow):
         self.btn_exit = qtw.QPushButton(
                 "Exit", objectName='button:exit')
 
+        self.btn_resume.setSizePolicy(sizePolicy, sizePolicy)
         self.btn_newGame.setSizePolicy(sizePolicy, sizePolicy)
         self.btn_options.setSizePolicy(sizePolicy, sizePolicy)
         self.btn_exit.setSizePolicy(sizePolicy, sizePolicy)
 
         buttonLayout = qtw.QVBoxLayout()
+        buttonLayout.addWidget(self.btn_resume)
         buttonLayout.addWidget(self.btn_newGame)
         buttonLayout.addWidget(self.btn_options)
         buttonLayout.addWidget(self.btn_exit)
         self.mainButtons.setLayout(buttonLayout)
 
-    def showGameScreen(self):
-        self.gameScreen = GameScreen(parent=self)
+    def showGameScreen(self, replay=None, session=None):
+        from .gameScreen import GameScreen
+        from .matchClient import MatchClient
+        client = None
+        if self.server and not (replay or session):
+            client = MatchClient(*self.server, self.gridSize, self.fleet)
+        self.gameScreen = GameScreen(parent=self, client=client, replay=replay,
+                                     session=session, gridSize=self.gridSize,
+                                     fleet=self.fleet, strategy=self.strategy,
+                                     record=self.record)
         self.stackWidget.addWidget(self.gameScreen)
         self.stackWidget.setCurrentWidget(self.gameScreen)
 
+    def showReplay(self, path):
+        """
+        open the replay viewer for a replay file. Raises ReplayError (a
+        ValueError) or OSError if the file can not be read
+        """
+        from .replay import Replay
+        self.showGameScreen(Replay(path))
+
+    def updateResume(self):
+        """
+        offer to resume the game saved last (see GameScreen.saveGame)
+        """
+        from .snapshot import autosavePath
+        self.btn_resume.setVisible(autosavePath().exists())
+
+    def resumeGame(self):
+        from .snapshot import SnapshotError, autosavePath, load
+        path = autosavePath()
+        try:
+            session = load(path)
+            if session.currentPlayer is None:
+                raise SnapshotError('the game is over')
+        except (OSError, SnapshotError) as error:
+            qtw.QMessageBox.warning(
+                    self, 'Resume Game',
+                    f'The saved game can not be resumed: {error}')
+            path.unlink(missing_ok=True)
+            self.updateResume()
+            return
+        self.showGameScreen(session=session)
+
     def connect(self):
-        self.btn_newGame.clicked.connect(self.showGameScreen)
+        self.btn_resume.clicked.connect(self.resumeGame)
+        self.btn_newGame.clicked.connect(lambda: self.showGameScreen())
 
     def exitGame(self):
         self.stackWidget.removeWidget(self.gameScreen)
         self.gameScreen.deleteLater()
         self.gameScreen = None
         self.stackWidget.setCurrentWidget(self.mainMenu)
+        self.updateResume()
+
+    def closeEvent(self, event):
+        if getattr(self, 'gameScreen', None):
+            self.gameScreen.saveGame()
+        super(MainWindow, self).closeEvent(event)
 
 
 def start():
+    from .style import loadStylesheet
     app = qtw.QApplication(sys.argv)
-    style = qdarkstyle.load_stylesheet_pyqt5()
-    app.setStyleSheet(style)
+    loadStylesheet(app)
     window = MainWindow()
     sys.exit(app.exec_())
 
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from PyQt5 import (QtCore as qtc, QtNetwork as qtn)
+
+from .protocol import (
+        ACCEPTED, ERROR, ERRORS, FIRE, GAME_OVER, INCOMING, LEAVE, MATCHED,
+        OPPONENT_LEFT, QUEUED, RESULT, START,
+        FrameBuffer, ProtocolError, decodeCell, decodeFlag, decodeGameOver,
+        decodeResult, encodeCell, encodeJoin, encodePlace, frame)
+
+
+class MatchClient(qtc.QObject):
+    """
+    connection to the match server. The socket is served by the Qt event
+    loop, nothing blocks: requests are written when they are made and the
+    answers of the server arrive as signals
+    """
+
+    queued = qtc.pyqtSignal()
+    matched = qtc.pyqtSignal()
+    accepted = qtc.pyqtSignal()
+    started = qtc.pyqtSignal(bool)                          # your turn
+    shotResult = qtc.pyqtSignal(int, int, object, object)   # row, column,
+                                                            # ShotResult,
+                                                            # sunk Placement
+    incoming = qtc.pyqtSignal(int, int)                     # row, column
+    gameOver = qtc.pyqtSignal(bool, str)                    # won, reason
+    failed = qtc.pyqtSignal(str)
+
+    def __init__(self, host, port, gridSize, fleet, parent=None):
+        super(MatchClient, self).__init__(parent)
+        self.host = host
+        self.port = port
+        self.gridSize = tuple(gridSize)
+        self.fleet = tuple(fleet)
+        self.buffer = FrameBuffer()
+        self.socket = qtn.QTcpSocket(self)
+        self.socket.connected.connect(self.onConnected)
+        self.socket.readyRead.connect(self.onReadyRead)
+        self.socket.errorOccurred.connect(self.onError)
+        self.handlers = {
+                QUEUED:     lambda body: self.queued.emit(),
+                MATCHED:    lambda body: self.matched.emit(),
+                ACCEPTED:   lambda body: self.accepted.emit(),
+                START:      self.onStart,
+                RESULT:     self.onResult,
+                INCOMING:   self.onIncoming,
+                GAME_OVER:  self.onGameOver,
+                ERROR:      self.onServerError}
+
+    def connectToServer(self):
+        self.socket.connectToHost(self.host, self.port)
+
+    def onConnected(self):
+        self.socket.write(encodeJoin(self.gridSize, self.fleet))
+
+    def place(self, ships):
+        """
+        send the fleet, ships maps ship ids to Placements
+        """
+        self.socket.write(encodePlace(
+                [(ships[shipId].orientation, ships[shipId].index)
+                 for shipId, _ in self.fleet]))
+
+    def fire(self, cell):
+        self.socket.write(encodeCell(FIRE, cell))
+
+    def leave(self):
+        if self.socket.state() == qtn.QAbstractSocket.ConnectedState:
+            self.socket.write(frame(LEAVE))
+            self.socket.disconnectFromHost()
+
+    def onReadyRead(self):
+        try:
+            for opcode, body in self.buffer.feed(bytes(self.socket.readAll())):
+                handler = self.handlers.get(opcode)
+                if handler:
+                    handler(body)
+        except ProtocolError as error:
+            self.socket.abort()
+            self.failed.emit(f'bad message from server: {error}')
+
+    def onStart(self, body):
+        self.started.emit(bool(decodeFlag(body)))
+
+    def onResult(self, body):
+        cell, result, placement = decodeResult(body, self.fleet)
+        self.shotResult.emit(cell[0], cell[1], result, placement)
+
+    def onIncoming(self, body):
+        self.incoming.emit(*decodeCell(body))
+
+    def onGameOver(self, body):
+        won, reason = decodeGameOver(body)
+        self.gameOver.emit(
+                won, 'opponent left' if reason == OPPONENT_LEFT else '')
+
+    def onServerError(self, body):
+        code = decodeFlag(body)
+        self.failed.emit(ERRORS.get(code, f'error {code}'))
+
+    def onError(self, error):
+        self.failed.emit(self.socket.errorString())
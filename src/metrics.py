@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+instrumentation of the hot paths. Disabled by default, enabled by the
+environment variable BATTLESHIP_METRICS (a file name, or 1 for
+metrics.jsonl) or by enable(), e.g. run.py --metrics.
+
+Every measurement is written as a JSON line {"t", "metric", "value"},
+timings are in ms. At exit a summary with count, p50, p95, p99 and max of
+every metric and the counters is appended and printed.
+
+timed() decides when a function is decorated: disabled it returns the
+function itself, so metrics have to be enabled before the instrumented
+modules are imported. record(), count() and timer() cost a function call
+and a test when disabled.
+
+Worker processes (e.g. of a process pool) exit without running atexit
+hooks, so they do not write: their measurements are kept in memory until
+collect() returns them, the parent process adds them with merge()
+"""
+
+import atexit
+import json
+import os
+import sys
+from array import array
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+ENV = 'BATTLESHIP_METRICS'
+DEFAULT_PATH = 'metrics.jsonl'
+
+_disabled = nullcontext()
+
+
+class Recorder:
+    """
+    collects the measurements of a process. Records are buffered and
+    written in batches, all values are kept for the summary
+    """
+
+    def __init__(self, path=None, flushEvery=1000):
+        self.path = path
+        self.flushEvery = flushEvery
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+        self.begin = perf_counter()
+        self.samples = {}
+        self.counters = {}
+        self.buffer = []
+        self.lock = Lock()
+        self.closed = False
+
+    def record(self, name, value):
+        with self.lock:
+            values = self.samples.get(name)
+            if values is None:
+                values = self.samples[name] = array('d')
+            values.append(value)
+            if self.file:
+                self.buffer.append(json.dumps({
+                        't': round(perf_counter() - self.begin, 6),
+                        'metric': name, 'value': value}))
+                if len(self.buffer) >= self.flushEvery:
+                    self._flush()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def detach(self):
+        """
+        stop writing and forget the measurements, e.g. in a forked process
+        which inherited the recorder of its parent
+        """
+        self.file = None
+        self.buffer = []
+        self.samples = {}
+        self.counters = {}
+        self.closed = True
+
+    def drain(self):
+        """
+        returns ({name: values}, counters) recorded since the last drain and
+        forgets them
+        """
+        with self.lock:
+            samples, self.samples = self.samples, {}
+            counters, self.counters = self.counters, {}
+        return ({name: values.tolist() for name, values in samples.items()},
+                counters)
+
+    def merge(self, samples, counters):
+        """
+        add measurements of another process, see drain
+        """
+        for name, values in samples.items():
+            for value in values:
+                self.record(name, value)
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def names(self):
+        with self.lock:
+            return sorted(self.samples)
+
+    def recent(self, name, n=100):
+        """
+        the last n values of a metric
+        """
+        with self.lock:
+            return list(self.samples.get(name, ())[-n:])
+
+    def _flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.file.flush()
+            self.buffer = []
+
+    def summary(self):
+        with self.lock:
+            metrics = {name: percentiles(values)
+                       for name, values in sorted(self.samples.items())}
+            return {'metrics': metrics, 'counters': dict(self.counters)}
+
+    def report(self):
+        summary = self.summary()
+        lines = [f"{'metric':<28}{'count':>8}{'p50':>10}{'p95':>10}"
+                 f"{'p99':>10}{'max':>10}"]
+        for name, stats in summary['metrics'].items():
+            lines.append(f"{name:<28}{stats['count']:>8}{stats['p50']:>10.3f}"
+                         f"{stats['p95']:>10.3f}{stats['p99']:>10.3f}"
+                         f"{stats['max']:>10.3f}")
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f'{name:<28}{value:>8}')
+        return '\n'.join(lines)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.file:
+            summary = self.summary()
+            with self.lock:
+                self.buffer.append(json.dumps({
+                        't': round(perf_counter() - self.begin, 6),
+                        'summary': summary}))
+                self._flush()
+                self.file.close()
+        print(self.report(), file=sys.stderr)
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    n = len(ordered)
+
+    def rank(q):
+        return ordered[min(max(int(q*n + .5) - 1, 0), n - 1)]
+    return {'count': n, 'p50': rank(.5), 'p95': rank(.95), 'p99': rank(.99),
+            'max': ordered[-1]}
+
+
+recorder = None
+
+
+def _inWorker():
+    # a spawned worker process has multiprocessing imported already. The
+    # fork server of a pool (see ai.samplerPool) is started by python -c
+    # and imports the instrumented modules, but records nothing itself
+    multiprocessing = sys.modules.get('multiprocessing')
+    if multiprocessing is None:
+        return False
+    return (multiprocessing.parent_process() is not None
+            or (sys.argv == ['-c']
+                and 'multiprocessing.forkserver' in sys.modules))
+
+
+def enable(path=DEFAULT_PATH):
+    """
+    start recording to path (None: keep the values in memory only), the
+    summary is written at exit. In a worker process the values are kept in
+    memory for collect()
+    """
+    global recorder
+    if recorder is None:
+        if _inWorker():
+            recorder = Recorder(None)
+            recorder.closed = True
+        else:
+            recorder = Recorder(path)
+            atexit.register(recorder.close)
+    return recorder
+
+
+def _afterFork():
+    if recorder is not None:
+        recorder.detach()
+
+
+os.register_at_fork(after_in_child=_afterFork)
+
+
+def collect():
+    """
+    the measurements of this (worker) process since the last collect(), to
+    be handed to merge() in the parent process. None if disabled
+    """
+    return recorder.drain() if recorder is not None else None
+
+
+def merge(collected):
+    """
+    add the measurements collect() returned in another process
+    """
+    if recorder is not None and collected:
+        recorder.merge(*collected)
+
+
+def isEnabled():
+    return recorder is not None
+
+
+def record(name, value):
+    if recorder is not None:
+        recorder.record(name, value)
+
+
+def count(name, n=1):
+    if recorder is not None:
+        recorder.count(name, n)
+
+
+@contextmanager
+def _timer(name):
+    begin = perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record(name, (perf_counter() - begin)*1e3)
+
+
+def timer(name):
+    """
+    context manager timing its block as metric name
+    """
+    return _timer(name) if recorder is not None else _disabled
+
+
+def timed(name):
+    """
+    decorator timing every call as metric name, see the module docstring
+    """
+    def decorate(function):
+        if recorder is None:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            begin = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.record(name, (perf_counter() - begin)*1e3)
+        return wrapper
+    return decorate
+
+
+if os.environ.get(ENV):
+    enable(DEFAULT_PATH if os.environ[ENV] == '1' else os.environ[ENV])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from statistics import median
+from time import perf_counter
+from PyQt5 import (QtWidgets as qtw, QtCore as qtc)
+
+from . import metrics
+
+
+class PaintTimer(qtc.QObject):
+    """
+    times every paint of a QGraphicsView as metric name. The paint event of
+    the viewport is handed to the view from this event filter, so the time
+    covers the whole scene rendering
+    """
+
+    def __init__(self, view, name):
+        super(PaintTimer, self).__init__(view)
+        self.view = view
+        self.name = name
+        view.viewport().installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() != qtc.QEvent.Paint:
+            return False
+        begin = perf_counter()
+        self.view.viewportEvent(event)
+        metrics.record(self.name, (perf_counter() - begin)*1e3)
+        return True
+
+
+class MetricsOverlay(qtw.QLabel):
+    """
+    live view of the latest paint and AI timings in the corner of a window
+    """
+
+    prefixes = ('paint.', 'ai.')
+    window = 100
+
+    def __init__(self, parent, interval=500):
+        super(MetricsOverlay, self).__init__(parent)
+        self.setObjectName('metricsOverlay')
+        self.setAttribute(qtc.Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet('#metricsOverlay {background: rgba(0, 0, 0, 160);'
+                           'color: white; font-family: monospace;'
+                           'padding: 4px;}')
+        self.move(8, 8)
+        self.timer = qtc.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(interval)
+        self.refresh()
+
+    def refresh(self):
+        recorder = metrics.recorder
+        lines = []
+        if recorder is not None:
+            for name in recorder.names():
+                if not name.startswith(self.prefixes):
+                    continue
+                values = recorder.recent(name, self.window)
+                lines.append(f'{name:<16} last {values[-1]:7.2f} ms  '
+                             f'median {median(values):7.2f} ms')
+        self.setText('\n'.join(lines) or 'no measurements yet')
+        self.adjustSize()
+        self.raise_()
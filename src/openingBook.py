@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+opening books: the best shots of the first turns of a game, computed offline.
+
+Until the first hit the only thing known about the enemy fleet is where it is
+not, so the best shot depends on the misses only. The book is built from a
+large sample of fleets placed like samplePlacements (Grid.randomizePlacement)
+places them: for a pattern of misses, the best shots are the fields occupied
+in the most sampled fleets without a ship on a missed field. Patterns are
+stored once for all symmetries of the board (mirror images and, on square
+boards, rotations), the counts are summed over all of them.
+
+The book holds the patterns reached by following its own shots, up to depth
+misses, with the candidates for the next shot, all fields within tolerance
+of the best one. All numbers are little endian, the file is
+
+    header      magic 'BSOB', version, width, height, number of ship types,
+                depth, number of candidates, number of entries, samples
+    fleet       (ship type, count) for every type, like replay files
+    entries     sorted by pattern: the positions of the misses in ascending
+                order, then the positions of the candidates, best first,
+                depth and candidates times 2 bytes, padded with 0xffff
+
+e.g.
+
+    python -m src.openingBook --samples 200000 --depth 12
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+from pathlib import Path
+from random import Random
+from time import perf_counter
+import numpy as np
+
+from .engine import FLEET, Geometry
+from .placement import samplePlacements
+from .replay import ReplayError, decodeFleet, encodeFleet
+
+MAGIC = b'BSOB'
+VERSION = 1
+EMPTY = 0xffff
+
+_HEADER = struct.Struct('<4sBHHBBBII')
+
+bookDir = Path(__file__).resolve().parent.parent / 'rsc'
+
+
+class BookError(ValueError):
+    pass
+
+
+def bookPath(gridSize, directory=None):
+    width, height = gridSize
+    return Path(directory or bookDir) / f'openings-{width}x{height}.book'
+
+
+def symmetries(gridSize):
+    """
+    returns (forward, backward) position maps for every symmetry of the
+    board, the identity first: the field at position n is at forward[n] in
+    the transformed board, backward undoes forward
+    """
+    width, height = gridSize
+    grid = np.arange(width*height).reshape(height, width)
+    views = [grid, grid[::-1], grid[:, ::-1], grid[::-1, ::-1]]
+    if width == height:
+        views += [view.T for view in views]
+    maps = []
+    for view in views:
+        backward = np.ascontiguousarray(view).ravel()
+        maps.append((np.argsort(backward), backward))
+    return maps
+
+
+def canonical(misses, maps):
+    """
+    returns the smallest of the patterns of misses under all symmetries (a
+    sorted tuple of positions) and the index of its symmetry in maps
+    """
+    return min((tuple(sorted(int(forward[n]) for n in misses)), index)
+               for index, (forward, _) in enumerate(maps))
+
+
+def sampleFleets(samples, gridSize=(10, 10), fleet=FLEET, seed=None):
+    """
+    the fields occupied by random fleets, one row per fleet
+    """
+    geometry = Geometry.get(gridSize)
+    rng = Random(seed)
+    occupied = np.zeros((samples, geometry.size), dtype=bool)
+    for row in occupied:
+        for placement in samplePlacements(gridSize, fleet, rng):
+            row[list(geometry.fields(*placement[1:])[0])] = True
+    return occupied
+
+
+def buildBook(occupied, gridSize, depth=10, candidates=3, tolerance=.01):
+    """
+    returns {pattern: candidates} for the patterns of up to depth - 1 misses
+    reached by shooting at the candidates, see the module docstring.
+
+    Every pattern keeps one view of the sampled fleets per symmetry: a map
+    from the fields of the pattern to the fields of the samples and the
+    samples without a ship on the missed fields. A further miss filters the
+    samples of every view, so the cost of a pattern shrinks with its depth
+    """
+    maps = symmetries(gridSize)
+    samples = np.arange(len(occupied), dtype=np.int32)
+    book = {}
+
+    def expand(pattern, views):
+        counts = sum(occupied[rows].sum(axis=0, dtype=np.int64)[backward]
+                     for backward, rows in views)
+        counts[list(pattern)] = -1
+        best = counts.max()
+        if best <= 0:
+            return
+        order = np.argsort(-counts, kind='stable')[:candidates]
+        chosen = [int(n) for n in order if counts[n] >= best*(1 - tolerance)]
+        book[pattern] = chosen
+        if len(pattern) + 1 >= depth:
+            return
+        for n in chosen:
+            child, index = canonical(pattern + (n,), maps)
+            if child in book:
+                continue
+            _, backward = maps[index]
+            expand(child, [(mapping[backward],
+                            rows[~occupied[rows, mapping[n]]])
+                           for mapping, rows in views])
+
+    expand((), [(backward, samples) for _, backward in maps])
+    return book
+
+
+def writeBook(path, book, gridSize, fleet, samples):
+    types, fleetData = encodeFleet(fleet)
+    if gridSize[0]*gridSize[1] >= EMPTY:
+        raise BookError('the board is too large for an opening book')
+    depth = max(len(pattern) for pattern in book) + 1
+    candidates = max(len(chosen) for chosen in book.values())
+    record = struct.Struct(f'<{depth + candidates}H')
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, *gridSize, types, depth,
+                                candidates, len(book), samples))
+        file.write(fleetData)
+        entries = sorted((pattern + (EMPTY,)*(depth - len(pattern)), chosen)
+                         for pattern, chosen in book.items())
+        for key, chosen in entries:
+            file.write(record.pack(
+                    *key, *chosen, *(EMPTY,)*(candidates - len(chosen))))
+
+
+class OpeningBook:
+    """
+    an opening book file mapped into memory. Entries are found by binary
+    search, a lookup costs a few struct unpacks
+    """
+
+    _books = {}
+
+    @classmethod
+    def get(cls, gridSize, fleet=FLEET):
+        """
+        the book in bookDir for the board and the fleet, None if there is
+        none. Books are opened once per process
+        """
+        key = (tuple(gridSize), tuple(fleet))
+        if key not in cls._books:
+            book = None
+            path = bookPath(gridSize)
+            if path.exists():
+                try:
+                    book = cls(path)
+                except (OSError, BookError) as error:
+                    print(f'no opening book: {error}', file=sys.stderr)
+                else:
+                    if book.fleet != key[1]:
+                        book.close()
+                        book = None
+            cls._books[key] = book
+        return cls._books[key]
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as file:
+            try:
+                self.data = mmap.mmap(file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise BookError(f'{path} is empty') from None
+        try:
+            self._readHeader()
+        except (struct.error, ValueError):
+            self.data.close()
+            raise BookError(f'{path} is not an opening book') from None
+
+    def _readHeader(self):
+        (magic, version, width, height, types, self.depth, self.candidates,
+         self.entries, self.samples) = _HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise BookError('bad header')
+        self.gridSize = (width, height)
+        self.fleet, self.entriesAt = decodeFleet(self.data, _HEADER.size,
+                                                 types)
+        self.record = struct.Struct(f'<{self.depth + self.candidates}H')
+        if self.entriesAt + self.entries*self.record.size > len(self.data):
+            raise BookError('truncated')
+        self.maps = [(forward.tolist(), backward.tolist())
+                     for forward, backward in symmetries(self.gridSize)]
+
+    def _find(self, key):
+        low, high = 0, self.entries
+        record, data, start = self.record, self.data, self.entriesAt
+        while low < high:
+            middle = (low + high)//2
+            entry = record.unpack_from(data, start + middle*record.size)
+            if entry[:self.depth] < key:
+                low = middle + 1
+            elif entry[:self.depth] > key:
+                high = middle
+            else:
+                return entry[self.depth:]
+        return None
+
+    def moves(self, misses):
+        """
+        the candidates (positions) for the next shot after the misses
+        (positions), empty if the pattern is not in the book
+        """
+        if len(misses) >= self.depth:
+            return ()
+        pattern, index = canonical(misses, self.maps)
+        chosen = self._find(pattern + (EMPTY,)*(self.depth - len(pattern)))
+        if chosen is None:
+            return ()
+        _, backward = self.maps[index]
+        return tuple(backward[n] for n in chosen if n != EMPTY)
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    from .simulate import parseFleet, parseSize
+    parser = argparse.ArgumentParser(
+            prog='python -m src.openingBook',
+            description='build the opening book of the hunter AI')
+    parser.add_argument('--size', type=parseSize, default=(10, 10),
+                        help='width x height of the grid (default: 10x10)')
+    parser.add_argument('--fleet', type=parseFleet, default=FLEET,
+                        help='ships per type, e.g. Carrier=2,Destroyer=4 '
+                             '(default: one of each)')
+    parser.add_argument('-n', '--samples', type=int, default=200000,
+                        help='random fleets to count')
+    parser.add_argument('-d', '--depth', type=int, default=12,
+                        help='book shots up to this many misses')
+    parser.add_argument('-c', '--candidates', type=int, default=3,
+                        help='shots to choose from per pattern')
+    parser.add_argument('-t', '--tolerance', type=float, default=.02,
+                        help='candidates may be this much worse than the '
+                             'best shot (fraction of its count)')
+    parser.add_argument('-s', '--seed', default='0')
+    parser.add_argument('-o', '--output',
+                        help='book file (default: the one the AI loads)')
+    args = parser.parse_args(argv)
+
+    begin = perf_counter()
+    occupied = sampleFleets(args.samples, args.size, args.fleet, args.seed)
+    sampled = perf_counter()
+    book = buildBook(occupied, args.size, args.depth, args.candidates,
+                     args.tolerance)
+    path = args.output or bookPath(args.size)
+    try:
+        writeBook(path, book, args.size, args.fleet, args.samples)
+    except (ReplayError, BookError) as error:
+        parser.error(str(error))
+    print(f'{path}: {len(book)} patterns, {Path(path).stat().st_size} bytes, '
+          f'sampled in {sampled - begin:.1f} s, '
+          f'built in {perf_counter() - sampled:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from random import Random
+
+from . import metrics
+from .engine import Board, Geometry, FLEET, ORIENTATIONS, Placement
+
+
+class PlacementTable:
+    """
+    every possible placement of every ship length on a grid, together with
+    the footprint and zone masks (see Geometry.footprint). Random fleets are
+    drawn from the table without ever building an illegal fleet.
+
+    Tables are shared, use PlacementTable.get(gridSize)
+    """
+
+    _instances = {}
+
+    @classmethod
+    def get(cls, gridSize=(10, 10)):
+        gridSize = tuple(gridSize)
+        if gridSize not in cls._instances:
+            cls._instances[gridSize] = cls(gridSize)
+        return cls._instances[gridSize]
+
+    def __init__(self, gridSize):
+        self.gridSize = gridSize
+        self.geometry = Geometry.get(gridSize)
+        self._placements = {}
+        self._fits = {}
+
+    def placements(self, extent):
+        """
+        returns all placements of a ship with the given extent as tuples of
+        (orientation, index, mask, zone)
+        """
+        if extent not in self._placements:
+            width, height = self.gridSize
+            entries = []
+            for orientation in ORIENTATIONS:
+                if orientation == 'h':
+                    rows, cols = range(height), range(width - extent + 1)
+                elif orientation == 'v':
+                    rows, cols = range(extent - 1, height), range(width)
+                for i in rows:
+                    for j in cols:
+                        mask, zone = self.geometry.footprint(
+                                extent, orientation, (i, j))
+                        entries.append((orientation, (i, j), mask, zone))
+            self._placements[extent] = tuple(entries)
+        return self._placements[extent]
+
+    def sample(self, fleet=FLEET, rng=None, uniform=False):
+        """
+        returns a random legal fleet as a list of Placements.
+
+        By default the ships are placed one after the other by backtracking:
+        every ship picks a random placement which does not touch the ships
+        placed so far, and a choice is undone as soon as one of the remaining
+        ships has no placement left. This never builds an illegal fleet but
+        favours layouts with few alternatives.
+
+        With uniform=True every legal fleet is equally likely. Exact uniform
+        sampling needs independent draws, so every ship draws from its whole
+        table and the draw starts over at the first ship which touches an
+        earlier one. A draw costs a few integer operations.
+
+        Raises ValueError if the fleet does not fit on the grid
+        """
+        rng = rng or Random()
+        ships = sorted(fleet, key=lambda ship: -ship[1])
+        # the tables are shared, the placements tried are counted per call
+        if uniform:
+            chosen, attempts = self._sampleUniform(ships, rng)
+        else:
+            chosen, attempts = self._sampleBacktracking(ships, rng, 0, [])
+        if chosen is None:
+            raise ValueError('the fleet does not fit on the grid')
+        metrics.record('placement.attempts', attempts)
+        return [
+                Placement(shipId, extent, orientation, index)
+                for (shipId, extent), (orientation, index, _, _)
+                in zip(ships, chosen)]
+
+    def _sampleBacktracking(self, ships, rng, forbidden, chosen):
+        """
+        returns the entries of the fleet (None if there is none) and the
+        number of placements tried
+        """
+        if len(chosen) == len(ships):
+            return chosen, 0
+        _, extent = ships[len(chosen)]
+        candidates = [
+                entry for entry in self.placements(extent)
+                if not entry[2] & forbidden]
+        rng.shuffle(candidates)
+        attempts = 0
+        for entry in candidates:
+            attempts += 1
+            blocked = forbidden | entry[3]
+            if not all(
+                    any(not other[2] & blocked
+                        for other in self.placements(otherExtent))
+                    for _, otherExtent in ships[len(chosen) + 1:]):
+                continue
+            result, tried = self._sampleBacktracking(
+                    ships, rng, blocked, chosen + [entry])
+            attempts += tried
+            if result is not None:
+                return result, attempts
+        return None, attempts
+
+    def _sampleUniform(self, ships, rng):
+        """
+        returns the entries of the fleet (None if there is none) and the
+        number of placements drawn
+        """
+        extents = tuple(extent for _, extent in ships)
+        if extents not in self._fits:
+            self._fits[extents] = self._sampleBacktracking(
+                    ships, Random(0), 0, [])[0] is not None
+        if not self._fits[extents]:
+            return None, 0
+        tables = [self.placements(extent) for _, extent in ships]
+        attempts = 0
+        while True:
+            chosen = []
+            forbidden = 0
+            for table in tables:
+                attempts += 1
+                entry = table[rng.randrange(len(table))]
+                if entry[2] & forbidden:
+                    break
+                forbidden |= entry[3]
+                chosen.append(entry)
+            else:
+                return chosen, attempts
+
+
+def _sampleSparse(geometry, ships, rng, attempts=100):
+    """
+    random legal fleet for large boards where tables of all placements would
+    be too big. Every ship draws random placements until it finds one which
+    does not touch the ships placed so far, the draw starts over when a ship
+    finds none. Costs O(number of ships) on boards with a lot of free space.
+    Returns the Placements (None if no fleet was found) and the number of
+    placements drawn
+    """
+    width, height = geometry.gridSize
+    draws = 0
+    for _ in range(attempts):
+        forbidden = set()
+        chosen = []
+        for shipId, extent in ships:
+            horizontal = height*max(width - extent + 1, 0)
+            vertical = width*max(height - extent + 1, 0)
+            if not horizontal + vertical:
+                return None, draws
+            for _ in range(attempts):
+                draws += 1
+                n = rng.randrange(horizontal + vertical)
+                if n < horizontal:
+                    i, j = divmod(n, width - extent + 1)
+                    orientation = 'h'
+                else:
+                    i, j = divmod(n - horizontal, width)
+                    i += extent - 1
+                    orientation = 'v'
+                cells, zone = geometry.fields(extent, orientation, (i, j))
+                if forbidden.isdisjoint(cells):
+                    forbidden.update(zone)
+                    chosen.append(
+                            Placement(shipId, extent, orientation, (i, j)))
+                    break
+            else:
+                break
+        else:
+            return chosen, draws
+    return None, draws
+
+
+def samplePlacements(gridSize=(10, 10), fleet=FLEET, rng=None, uniform=False):
+    """
+    returns a random legal fleet as a list of Placements. Small boards are
+    sampled with the PlacementTable, large boards ship by ship (uniform is
+    ignored there). Raises ValueError if no legal fleet is found
+    """
+    geometry = Geometry.get(gridSize)
+    if geometry.dense:
+        return PlacementTable.get(gridSize).sample(fleet, rng, uniform)
+    ships = sorted(fleet, key=lambda ship: -ship[1])
+    chosen, draws = _sampleSparse(geometry, ships, rng or Random())
+    if chosen is None:
+        raise ValueError('the fleet does not fit on the grid')
+    metrics.record('placement.attempts', draws)
+    return chosen
+
+
+def sampleUniform(gridSize=(10, 10), fleet=FLEET, rng=None):
+    """
+    samplePlacements with every legal fleet equally likely
+    """
+    return samplePlacements(gridSize, fleet, rng, uniform=True)
+
+
+def randomBoard(gridSize=(10, 10), fleet=FLEET, rng=None, uniform=False):
+    """
+    returns a Board with a random legal fleet
+    """
+    board = Board(gridSize)
+    for placement in samplePlacements(gridSize, fleet, rng, uniform):
+        board.placeShip(*placement)
+    return board
+
+
+def randomBoards(count, gridSize=(10, 10), fleet=FLEET, seed=None,
+                 uniform=False):
+    """
+    generate count random boards, reproducible for a given seed
+    """
+    rng = Random(seed)
+    for _ in range(count):
+        yield randomBoard(gridSize, fleet, rng, uniform)
+
+
+class PlacementValidator:
+    """
+    incremental version of Board.isValid for the preparation phase.
+
+    For every field covered by a ship the validator counts how many ship
+    bodies and how many ship zones cover it (fields without ships are not
+    stored). A field is in conflict if it is covered by a body and by the zone
+    of another ship, i.e. by at least two zones. Moving a ship only updates
+    the counts of its own fields, the number of fields in conflict is kept as
+    a running total
+    """
+
+    def __init__(self, gridSize=(10, 10)):
+        self.geometry = Geometry.get(gridSize)
+        self.bodies = {}
+        self.zones = {}
+        self.conflicts = 0
+        self.ships = {}
+
+    def _fieldsOf(self, key):
+        """
+        returns the positions of body and zone of a placement
+        """
+        return self.geometry.fields(*key)
+
+    def _update(self, key, delta):
+        body, zone = self._fieldsOf(key)
+        bodies, zones = self.bodies, self.zones
+        # the body is part of the zone, so checking the zone fields suffices
+        before = sum(1 for n in zone if bodies.get(n) and zones[n] > 1)
+        for n in body:
+            count = bodies.get(n, 0) + delta
+            if count:
+                bodies[n] = count
+            else:
+                del bodies[n]
+        for n in zone:
+            count = zones.get(n, 0) + delta
+            if count:
+                zones[n] = count
+            else:
+                del zones[n]
+        after = sum(1 for n in zone if bodies.get(n) and zones.get(n, 0) > 1)
+        self.conflicts += after - before
+
+    def move(self, shipId, extent, orientation, index):
+        """
+        place or move a ship, costs O(extent). Raises ValueError if the ship
+        is not completely on the grid
+        """
+        key = (extent, orientation, tuple(index))
+        old = self.ships.get(shipId)
+        if old == key:
+            return
+        self._fieldsOf(key)
+        if old:
+            self._update(old, -1)
+        self._update(key, 1)
+        self.ships[shipId] = key
+
+    def remove(self, shipId):
+        old = self.ships.pop(shipId, None)
+        if old:
+            self._update(old, -1)
+
+    def isValid(self):
+        return not self.conflicts
+
+    def isShipValid(self, shipId):
+        """
+        check if a single ship is in conflict with another one
+        """
+        body, _ = self._fieldsOf(self.ships[shipId])
+        return not any(self.zones[n] > 1 for n in body)
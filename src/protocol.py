@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+binary protocol between match server and clients.
+
+Every message is a frame of a 2 byte length (network byte order) followed by
+a payload of that length: a 1 byte opcode and the packed body. Cells are sent
+as (row, column) pairs of unsigned shorts, so a shot takes 7 bytes on the
+wire. Ships are numbered by their position in the fleet.
+
+    client -> server
+        JOIN        width, height, (ship type, count) for every type
+        PLACE       number of ships, (row, column, orientation) for every ship
+        FIRE        row, column
+        LEAVE       -
+
+    server -> client
+        QUEUED      -                   waiting for an opponent
+        MATCHED     -                   opponent found, place the ships
+        ACCEPTED    -                   the placement is valid
+        START       your turn (0/1)     both players placed their ships
+        RESULT      row, column, result, ship number (NO_SHIP for misses) and
+                    for sunk ships row, column and orientation of the ship
+        INCOMING    row, column         the opponent fired at you
+        GAME_OVER   won (0/1), reason
+        ERROR       error code
+"""
+
+import struct
+
+from .engine import (
+        ORIENTATIONS, SHIP_TYPES, SHOT_RESULTS, Placement, ShotResult,
+        makeFleet, shipType)
+
+JOIN, PLACE, FIRE, LEAVE = 0x01, 0x02, 0x03, 0x04
+QUEUED, MATCHED, ACCEPTED, START, RESULT, INCOMING, GAME_OVER, ERROR = range(
+        0x81, 0x89)
+
+# error codes
+BAD_MESSAGE = 1
+UNSUPPORTED_GAME = 2
+INVALID_PLACEMENT = 3
+NOT_YOUR_TURN = 4
+INVALID_SHOT = 5
+
+ERRORS = {
+        BAD_MESSAGE:        'bad message',
+        UNSUPPORTED_GAME:   'unsupported grid size or fleet',
+        INVALID_PLACEMENT:  'ships are not placed according to rules',
+        NOT_YOUR_TURN:      'it is not your turn',
+        INVALID_SHOT:       'invalid shot'}
+
+# reasons for the end of a game
+FLEET_DESTROYED = 0
+OPPONENT_LEFT = 1
+
+NO_SHIP = 0xffff
+
+# largest payload accepted, enough for a fleet of 1000 ships
+MAX_PAYLOAD = 8192
+
+HEADER = struct.Struct('!H')
+_CELL = struct.Struct('!HH')
+_SIZE = struct.Struct('!HH')
+_COUNT = struct.Struct('!H')
+_TYPE_COUNT = struct.Struct('!BH')
+_SHIP = struct.Struct('!HHB')
+_FLAG = struct.Struct('!B')
+_RESULT = struct.Struct('!HHBH')
+_GAME_OVER = struct.Struct('!BB')
+
+_SHIP_CODES = {name: code for code, name in enumerate(SHIP_TYPES)}
+_SHIP_NAMES = tuple(SHIP_TYPES)
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def frame(opcode, body=b''):
+    return HEADER.pack(len(body) + 1) + bytes((opcode,)) + body
+
+
+class FrameBuffer:
+    """
+    splits a byte stream into (opcode, body) messages. Raises ProtocolError
+    for frames larger than MAX_PAYLOAD, so the buffer never holds more than
+    one frame and a partial header
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def feed(self, data):
+        self.data += data
+        messages = []
+        while len(self.data) >= HEADER.size:
+            length, = HEADER.unpack_from(self.data)
+            if not 0 < length <= MAX_PAYLOAD:
+                raise ProtocolError(f'frame of {length} bytes')
+            end = HEADER.size + length
+            if len(self.data) < end:
+                break
+            messages.append(
+                    (self.data[HEADER.size], bytes(self.data[3:end])))
+            del self.data[:end]
+        return messages
+
+
+def composition(fleet):
+    """
+    returns {ship type: count} of a fleet built by makeFleet. Raises
+    ProtocolError for other fleets, their ship numbering can not be sent
+    """
+    counts = {}
+    for shipId, _ in fleet:
+        counts[shipType(shipId)] = counts.get(shipType(shipId), 0) + 1
+    if makeFleet(counts) != tuple(fleet):
+        raise ProtocolError('the fleet can not be sent')
+    return counts
+
+
+def encodeJoin(gridSize, fleet):
+    return frame(JOIN, _SIZE.pack(*gridSize) + b''.join(
+            _TYPE_COUNT.pack(_SHIP_CODES[name], count)
+            for name, count in composition(fleet).items()))
+
+
+def decodeJoin(body):
+    """
+    returns gridSize and the composition of the fleet, {ship type: count}.
+    The fleet is left to the caller (see makeFleet), which checks its size
+    first
+    """
+    if len(body) < _SIZE.size or (len(body) - _SIZE.size) % _TYPE_COUNT.size:
+        raise ProtocolError('bad JOIN')
+    gridSize = _SIZE.unpack_from(body)
+    counts = {}
+    for code, count in _TYPE_COUNT.iter_unpack(body[_SIZE.size:]):
+        if code >= len(_SHIP_NAMES) or not count:
+            raise ProtocolError('bad JOIN')
+        counts[_SHIP_NAMES[code]] = count
+    return gridSize, counts
+
+
+def encodePlace(placements):
+    """
+    placements are (orientation, index) tuples in the order of the fleet
+    """
+    return frame(PLACE, _COUNT.pack(len(placements)) + b''.join(
+            _SHIP.pack(i, j, ORIENTATIONS.index(orientation))
+            for orientation, (i, j) in placements))
+
+
+def decodePlace(body):
+    if len(body) < _COUNT.size:
+        raise ProtocolError('bad PLACE')
+    count, = _COUNT.unpack_from(body)
+    if len(body) != _COUNT.size + count*_SHIP.size:
+        raise ProtocolError('bad PLACE')
+    placements = []
+    for i, j, orientation in _SHIP.iter_unpack(body[_COUNT.size:]):
+        if orientation >= len(ORIENTATIONS):
+            raise ProtocolError('bad PLACE')
+        placements.append((ORIENTATIONS[orientation], (i, j)))
+    return placements
+
+
+def encodeCell(opcode, cell):
+    return frame(opcode, _CELL.pack(*cell))
+
+
+def decodeCell(body):
+    if len(body) != _CELL.size:
+        raise ProtocolError('bad cell')
+    return _CELL.unpack(body)
+
+
+def encodeResult(cell, result, shipNo=NO_SHIP, placement=None):
+    """
+    shipNo is the position of the ship hit in the fleet, placement is sent
+    for sunk ships
+    """
+    body = _RESULT.pack(*cell, SHOT_RESULTS.index(result.result), shipNo)
+    if placement is not None:
+        body += _SHIP.pack(*placement.index,
+                           ORIENTATIONS.index(placement.orientation))
+    return frame(RESULT, body)
+
+
+def decodeResult(body, fleet):
+    """
+    returns cell, ShotResult and the Placement of a sunk ship (or None)
+    """
+    if len(body) not in (_RESULT.size, _RESULT.size + _SHIP.size):
+        raise ProtocolError('bad RESULT')
+    i, j, code, shipNo = _RESULT.unpack_from(body)
+    if code >= len(SHOT_RESULTS) or (
+            shipNo != NO_SHIP and shipNo >= len(fleet)):
+        raise ProtocolError('bad RESULT')
+    shipId = fleet[shipNo][0] if shipNo != NO_SHIP else None
+    placement = None
+    if len(body) > _RESULT.size:
+        row, col, orientation = _SHIP.unpack_from(body, _RESULT.size)
+        if shipId is None or orientation >= len(ORIENTATIONS):
+            raise ProtocolError('bad RESULT')
+        placement = Placement(shipId, fleet[shipNo][1],
+                              ORIENTATIONS[orientation], (row, col))
+    return (i, j), ShotResult(SHOT_RESULTS[code], shipId), placement
+
+
+def encodeStart(yourTurn):
+    return frame(START, _FLAG.pack(yourTurn))
+
+
+def encodeGameOver(won, reason):
+    return frame(GAME_OVER, _GAME_OVER.pack(won, reason))
+
+
+def encodeError(code):
+    return frame(ERROR, _FLAG.pack(code))
+
+
+def decodeFlag(body):
+    if len(body) != _FLAG.size:
+        raise ProtocolError('bad message')
+    return body[0]
+
+
+def decodeGameOver(body):
+    if len(body) != _GAME_OVER.size:
+        raise ProtocolError('bad GAME_OVER')
+    won, reason = _GAME_OVER.unpack(body)
+    return bool(won), reason
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+binary replay files of games. All numbers are little endian, the file is
+
+    header      magic 'BSRP', version, index size, width, height,
+                number of ship types, first player, flags, seed
+    fleet       (ship type, count) for every type, like the JOIN message
+    placements  (row, column, orientation) for every ship of player 0, then
+                for every ship of player 1
+    shots       one record per shot: the position of the field (1, 2 or 4
+                bytes, depending on the size of the board) and the time since
+                the previous shot in 10 ms (2 bytes)
+
+Turns alternate, so the shooter of a record follows from the first player,
+and the results follow from the placements. A game on a 10x10 board takes
+85 bytes plus 3 bytes per shot.
+
+Replay maps a file into memory and moves between turns by applying the shots
+in between to the shot sets of both boards
+"""
+
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime
+from pathlib import Path
+from time import monotonic
+
+from .engine import (
+        ORIENTATIONS, SHIP_TYPES, CellSet, Geometry, Placement, makeFleet,
+        shipType)
+
+MAGIC = b'BSRP'
+VERSION = 1
+SEED_KNOWN = 1
+TICK = .01      # seconds per unit of the shot times
+
+_HEADER = struct.Struct('<4sBBHHHBBQ')
+_TYPE_COUNT = struct.Struct('<BH')
+_SHIP = struct.Struct('<HHB')
+_RECORDS = {
+        1: struct.Struct('<BH'),
+        2: struct.Struct('<HH'),
+        4: struct.Struct('<IH')}
+
+_SHIP_CODES = {name: code for code, name in enumerate(SHIP_TYPES)}
+_SHIP_NAMES = tuple(SHIP_TYPES)
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def indexSize(gridSize):
+    width, height = gridSize
+    return next(size for size in (1, 2, 4) if width*height <= 1 << 8*size)
+
+
+def dataDir():
+    base = os.environ.get('XDG_DATA_HOME') or Path.home() / '.local' / 'share'
+    return Path(base) / 'battleship'
+
+
+def replayDir():
+    return dataDir() / 'replays'
+
+
+def replayPath(directory=None):
+    """
+    a new file name for a replay, named by the current time
+    """
+    directory = Path(directory) if directory else replayDir()
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    return directory / f'{stamp}.bsr'
+
+
+def encodeFleet(fleet):
+    """
+    returns the number of ship types and the (ship type, count) entries of a
+    fleet made by makeFleet. Also used by the opening books
+    """
+    counts = {}
+    for shipId, _ in fleet:
+        counts[shipType(shipId)] = counts.get(shipType(shipId), 0) + 1
+    if makeFleet(counts) != tuple(fleet):
+        raise ReplayError('the fleet can not be stored')
+    return len(counts), b''.join(
+            _TYPE_COUNT.pack(_SHIP_CODES[name], count)
+            for name, count in counts.items())
+
+
+def decodeFleet(data, offset, types):
+    """
+    returns the fleet of types entries at offset and the offset behind them
+    """
+    counts = {}
+    for _ in range(types):
+        code, count = _TYPE_COUNT.unpack_from(data, offset)
+        offset += _TYPE_COUNT.size
+        if code >= len(_SHIP_NAMES) or not count:
+            raise ReplayError('bad fleet')
+        counts[_SHIP_NAMES[code]] = count
+    return makeFleet(counts), offset
+
+
+def encodeHeader(gridSize, fleet, placements, first, seed=None):
+    """
+    placements are two dicts {ship id: Placement}, one per player
+    """
+    types, fleetData = encodeFleet(fleet)
+    flags = 0
+    if isinstance(seed, int) and 0 <= seed < 1 << 64:
+        flags |= SEED_KNOWN
+    else:
+        seed = 0
+    header = [_HEADER.pack(MAGIC, VERSION, indexSize(gridSize), *gridSize,
+                           types, first, flags, seed), fleetData]
+    for ships in placements:
+        for shipId, _ in fleet:
+            placement = ships[shipId]
+            header.append(_SHIP.pack(
+                    *placement.index,
+                    ORIENTATIONS.index(placement.orientation)))
+    return b''.join(header)
+
+
+class ReplayWriter:
+    """
+    records the game of a GameSession (see GameSession.recorder). The file
+    is written when the game starts and a record is appended for every shot.
+    A replay which can not be written is reported and skipped, the game goes
+    on
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = None
+        self.record = None
+        self.width = None
+        self.last = None
+
+    def started(self, session):
+        self.close()
+        self.width = session.gridSize[0]
+        self.record = _RECORDS[indexSize(session.gridSize)]
+        try:
+            header = encodeHeader(
+                    session.gridSize, session.fleet,
+                    [session.boards[player].ships
+                     for player in session.players],
+                    session.players.index(session.currentPlayer),
+                    session.seed)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, 'wb')
+            self.file.write(header)
+        except (OSError, ReplayError) as error:
+            print(f'no replay: {error}', file=sys.stderr)
+            self.close()
+        self.last = monotonic()
+
+    def shot(self, cell):
+        if self.file is None:
+            return
+        now = monotonic()
+        ticks = min(round((now - self.last)/TICK), 0xffff)
+        self.last = now
+        self.file.write(self.record.pack(cell[0]*self.width + cell[1], ticks))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Replay:
+    """
+    a replay file mapped into memory. seek(turn) shows the boards after the
+    first turn shots: hits, misses and sunk ships of the board of every
+    player (indexed like the players, board 1 is shot by player 0)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as file:
+            try:
+                self.data = mmap.mmap(file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ReplayError(f'{path} is empty') from None
+        try:
+            self._readHeader()
+        except (struct.error, ValueError):
+            self.data.close()
+            raise ReplayError(f'{path} is not a replay') from None
+
+    def _readHeader(self):
+        data = self.data
+        (magic, version, size, width, height, types, first, flags,
+         seed) = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or size not in _RECORDS:
+            raise ReplayError('bad header')
+        self.gridSize = (width, height)
+        self.fleet, offset = decodeFleet(data, _HEADER.size, types)
+        self.first = first
+        self.seed = seed if flags & SEED_KNOWN else None
+        geometry = Geometry.get(self.gridSize)
+        self.placements = []
+        self._shipAt = []
+        for player in range(2):
+            ships = {}
+            shipAt = {}
+            for shipId, extent in self.fleet:
+                i, j, orientation = _SHIP.unpack_from(data, offset)
+                offset += _SHIP.size
+                if orientation >= len(ORIENTATIONS):
+                    raise ReplayError('bad placement')
+                placement = Placement(shipId, extent,
+                                      ORIENTATIONS[orientation], (i, j))
+                cells, _ = geometry.fields(*placement[1:])
+                ships[shipId] = placement
+                shipAt.update(dict.fromkeys(cells, shipId))
+            self.placements.append(ships)
+            self._shipAt.append(shipAt)
+        self.record = _RECORDS[size]
+        self.recordsAt = offset
+        self.turns = (len(data) - offset)//self.record.size
+        self.reset()
+
+    def reset(self):
+        self.turn = 0
+        self.ticks = 0
+        self.hits = [CellSet(), CellSet()]
+        self.misses = [CellSet(), CellSet()]
+        self.health = [{shipId: extent for shipId, extent in self.fleet}
+                       for _ in range(2)]
+        self.sunk = [set(), set()]
+
+    @property
+    def elapsed(self):
+        """
+        seconds from the start of the game to the current turn
+        """
+        return self.ticks*TICK
+
+    def shooter(self, turn):
+        return (self.first + turn) % 2
+
+    def shot(self, turn):
+        """
+        returns the shooter, the field (row, column) and the time since the
+        previous shot (seconds) of a turn (0 is the first shot)
+        """
+        if not 0 <= turn < self.turns:
+            raise IndexError(turn)
+        n, ticks = self.record.unpack_from(
+                self.data, self.recordsAt + turn*self.record.size)
+        return self.shooter(turn), divmod(n, self.gridSize[0]), ticks*TICK
+
+    def seek(self, turn):
+        """
+        show the boards after turn shots, costs the number of shots between
+        the current and the new turn
+        """
+        turn = max(0, min(turn, self.turns))
+        record, data, start = self.record, self.data, self.recordsAt
+        while self.turn < turn:
+            n, ticks = record.unpack_from(
+                    data, start + self.turn*record.size)
+            self._apply(1 - self.shooter(self.turn), n, 1)
+            self.ticks += ticks
+            self.turn += 1
+        while self.turn > turn:
+            self.turn -= 1
+            n, ticks = record.unpack_from(
+                    data, start + self.turn*record.size)
+            self._apply(1 - self.shooter(self.turn), n, -1)
+            self.ticks -= ticks
+        return self
+
+    def _apply(self, board, n, step):
+        shipId = self._shipAt[board].get(n)
+        if shipId is None:
+            if step > 0:
+                self.misses[board].add(n)
+            else:
+                self.misses[board].discard(n)
+            return
+        health = self.health[board]
+        if step > 0:
+            self.hits[board].add(n)
+            health[shipId] -= 1
+            if not health[shipId]:
+                self.sunk[board].add(shipId)
+        else:
+            self.hits[board].discard(n)
+            health[shipId] += 1
+            self.sunk[board].discard(shipId)
+
+    def winner(self):
+        """
+        the player who sunk the whole fleet of the other one, or None
+        """
+        self.seek(self.turns)
+        for board in range(2):
+            if len(self.sunk[board]) == len(self.fleet):
+                return 1 - board
+        return None
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    """
+    print the header and the result of replay files
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    for path in argv:
+        with Replay(path) as replay:
+            print(f'{path}: {replay.gridSize[0]}x{replay.gridSize[1]}, '
+                  f'{len(replay.fleet)} ships, {replay.turns} shots, '
+                  f'winner {replay.winner()}, {replay.elapsed:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
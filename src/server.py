@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+match server for network games, e.g.
+
+    python -m src.server --port 7654
+
+Players which join with the same grid size and fleet are matched in the order
+they arrive. The server keeps both boards hidden, checks the placements with
+the same rules as the game (see PlacementValidator), enforces the turns and
+resolves the shots. See protocol.py for the messages
+"""
+
+import argparse
+import asyncio
+import sys
+
+from .engine import makeFleet
+from .placement import PlacementValidator
+from .protocol import (
+        ACCEPTED, FIRE, INCOMING, JOIN, LEAVE, MATCHED, NO_SHIP, PLACE, QUEUED,
+        BAD_MESSAGE, INVALID_PLACEMENT, INVALID_SHOT, NOT_YOUR_TURN,
+        UNSUPPORTED_GAME, FLEET_DESTROYED, OPPONENT_LEFT,
+        FrameBuffer, ProtocolError, decodeCell, decodeJoin, decodePlace,
+        encodeCell, encodeError, encodeGameOver, encodeResult, encodeStart,
+        frame)
+from .session import GameSession
+
+
+class Connection(asyncio.Protocol):
+    """
+    one client. Messages are handled as soon as they are complete, so a
+    connection buffers at most one incoming frame. Clients which do not read
+    their messages are dropped when the write buffer exceeds the limit of the
+    server
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = FrameBuffer()
+        self.match = None
+        self.no = None
+        self.queue = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def data_received(self, data):
+        try:
+            for opcode, body in self.buffer.feed(data):
+                if self.transport.is_closing():
+                    return
+                self.server.dispatch(self, opcode, body)
+        except ProtocolError:
+            self.send(encodeError(BAD_MESSAGE))
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.server.connections -= 1
+        self.server.leave(self)
+
+    def send(self, data):
+        if self.transport.is_closing():
+            return
+        self.transport.write(data)
+        if self.transport.get_write_buffer_size() > self.server.maxWriteBuffer:
+            self.transport.abort()
+
+
+class Match:
+
+    __slots__ = ('session', 'players', 'placed', 'shipNumbers')
+
+    def __init__(self, session, players, shipNumbers):
+        self.session = session
+        self.players = players
+        self.placed = [False, False]
+        self.shipNumbers = shipNumbers
+
+
+class MatchServer:
+    """
+    matchmaking and game logic of the server, one instance per process
+    """
+
+    def __init__(self, maxGridSize=(1000, 1000), maxShips=1000,
+                 maxWriteBuffer=64*1024):
+        self.maxGridSize = maxGridSize
+        self.maxShips = maxShips
+        self.maxWriteBuffer = maxWriteBuffer
+        self.waiting = {}
+        self.connections = 0
+        self.activeMatches = 0
+        self.finishedMatches = 0
+        self.handlers = {
+                JOIN:   self.join,
+                PLACE:  self.place,
+                FIRE:   self.fire,
+                LEAVE:  self.leave}
+
+    def dispatch(self, connection, opcode, body):
+        handler = self.handlers.get(opcode)
+        if handler is None:
+            raise ProtocolError(f'unknown opcode {opcode}')
+        handler(connection, body)
+
+    def join(self, connection, body):
+        if connection.match or connection.queue:
+            raise ProtocolError('already joined')
+        gridSize, counts = decodeJoin(body)
+        width, height = gridSize
+        maxWidth, maxHeight = self.maxGridSize
+        if not (0 < width <= maxWidth and 0 < height <= maxHeight
+                and 0 < sum(counts.values()) <= self.maxShips):
+            connection.send(encodeError(UNSUPPORTED_GAME))
+            return
+        fleet = makeFleet(counts)
+        key = (gridSize, fleet)
+        opponent = self.waiting.pop(key, None)
+        if opponent is None:
+            self.waiting[key] = connection
+            connection.queue = key
+            connection.send(frame(QUEUED))
+            return
+
+        shipNumbers = {shipId: no for no, (shipId, _) in enumerate(fleet)}
+        match = Match(GameSession(gridSize, fleet, players=(0, 1)),
+                      (opponent, connection), shipNumbers)
+        for no, player in enumerate(match.players):
+            player.match = match
+            player.no = no
+            player.queue = None
+            player.send(frame(MATCHED))
+        self.activeMatches += 1
+
+    def place(self, connection, body):
+        match = connection.match
+        if not match or match.session.currentPlayer is not None:
+            raise ProtocolError('no match to place ships for')
+        placements = decodePlace(body)
+        session = match.session
+        if len(placements) != len(session.fleet):
+            connection.send(encodeError(INVALID_PLACEMENT))
+            return
+        validator = PlacementValidator(session.gridSize)
+        try:
+            for (shipId, extent), (orientation, index) in zip(
+                    session.fleet, placements):
+                validator.move(shipId, extent, orientation, index)
+        except ValueError:
+            connection.send(encodeError(INVALID_PLACEMENT))
+            return
+        if not validator.isValid():
+            connection.send(encodeError(INVALID_PLACEMENT))
+            return
+
+        board = session.boards[connection.no]
+        board.clearShips()
+        for (shipId, extent), (orientation, index) in zip(
+                session.fleet, placements):
+            board.placeShip(shipId, extent, orientation, index)
+        match.placed[connection.no] = True
+        connection.send(frame(ACCEPTED))
+        if all(match.placed):
+            first = session.start()
+            for no, player in enumerate(match.players):
+                player.send(encodeStart(no == first))
+
+    def fire(self, connection, body):
+        match = connection.match
+        if not match:
+            raise ProtocolError('no match to fire in')
+        cell = decodeCell(body)
+        session = match.session
+        if not session.isTurn(connection.no):
+            connection.send(encodeError(NOT_YOUR_TURN))
+            return
+        board = session.boards[1 - connection.no]
+        if not board.geometry.contains(*cell) or board.isShot(cell):
+            connection.send(encodeError(INVALID_SHOT))
+            return
+
+        result = session.fire(connection.no, cell)
+        shipNo, placement = NO_SHIP, None
+        if result.shipId is not None:
+            shipNo = match.shipNumbers[result.shipId]
+            if result.result in ('sunk', 'destroyed'):
+                placement = board.ships[result.shipId]
+        connection.send(encodeResult(cell, result, shipNo, placement))
+        opponent = match.players[1 - connection.no]
+        opponent.send(encodeCell(INCOMING, cell))
+        if session.finished:
+            connection.send(encodeGameOver(True, FLEET_DESTROYED))
+            opponent.send(encodeGameOver(False, FLEET_DESTROYED))
+            self.endMatch(match)
+
+    def leave(self, connection, body=b''):
+        """
+        the connection leaves the queue or its match. The opponent wins a
+        running match
+        """
+        if connection.queue:
+            if self.waiting.get(connection.queue) is connection:
+                del self.waiting[connection.queue]
+            connection.queue = None
+        match = connection.match
+        if match:
+            match.session.abort()
+            opponent = match.players[1 - connection.no]
+            opponent.send(encodeGameOver(True, OPPONENT_LEFT))
+            self.endMatch(match)
+
+    def endMatch(self, match):
+        for player in match.players:
+            player.match = None
+            player.no = None
+        self.activeMatches -= 1
+        self.finishedMatches += 1
+
+    def stats(self):
+        return {
+                'connections': self.connections,
+                'waiting': len(self.waiting),
+                'activeMatches': self.activeMatches,
+                'finishedMatches': self.finishedMatches}
+
+    async def start(self, host='127.0.0.1', port=7654, backlog=4096):
+        loop = asyncio.get_running_loop()
+        return await loop.create_server(
+                lambda: Connection(self), host, port, backlog=backlog)
+
+
+async def serve(host, port, statsInterval=0):
+    server = MatchServer()
+    listener = await server.start(host, port)
+    address = listener.sockets[0].getsockname()
+    print(f'serving on {address[0]}:{address[1]}', file=sys.stderr)
+    async with listener:
+        if not statsInterval:
+            await listener.serve_forever()
+        while True:
+            await asyncio.sleep(statsInterval)
+            print(server.stats(), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m src.server',
+            description='match server for network games')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=7654)
+    parser.add_argument('--stats', type=float, default=0,
+                        help='print statistics every STATS seconds')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from random import Random
+
+from .engine import Board, FLEET
+from .placement import samplePlacements
+
+
+class GameSession:
+    """
+    state of one game between two players: both boards, whose turn it is,
+    whether the game is over and the random generator of the game.
+
+    Sessions do not depend on Qt and share no state, so a process can host
+    any number of games at once (GUI tabs, server, simulation workers).
+
+    A recorder (e.g. replay.ReplayWriter) is told when the game starts and
+    about every shot
+    """
+
+    def __init__(self, gridSize=(10, 10), fleet=FLEET, seed=None,
+                 players=('player', 'enemy')):
+        if len(players) != 2:
+            raise ValueError('a game needs two players')
+        self.gridSize = tuple(gridSize)
+        self.fleet = tuple(fleet)
+        self.players = tuple(players)
+        self.seed = seed
+        self.rng = Random(seed)
+        self.boards = {player: Board(self.gridSize) for player in players}
+        self.currentPlayer = None
+        self.finished = False
+        self.winner = None
+        self.recorder = None
+
+    def opponent(self, player):
+        first, second = self.players
+        return second if player == first else first
+
+    def place(self, player, placements):
+        """
+        replace the fleet of a player by the Placements. Raises ValueError
+        if they are not a legal fleet of the session
+        """
+        board = self.boards[player]
+        board.clearShips()
+        for placement in placements:
+            board.placeShip(*placement)
+        if (sorted(board.ships) != sorted(shipId for shipId, _ in self.fleet)
+                or any(board.ships[shipId].extent != extent
+                       for shipId, extent in self.fleet)
+                or not board.isValid()):
+            board.clearShips()
+            raise ValueError(f'illegal fleet for {player}')
+        return board
+
+    def placeRandom(self, player):
+        """
+        replace the fleet of a player by a random legal fleet
+        """
+        return self.place(player, samplePlacements(
+                self.gridSize, self.fleet, self.rng))
+
+    def start(self, first=None):
+        """
+        start the game, the first player is chosen at random by default
+        """
+        if first is None:
+            first = self.players[self.rng.randrange(2)]
+        self.currentPlayer = first
+        self.finished = False
+        self.winner = None
+        if self.recorder:
+            self.recorder.started(self)
+        return first
+
+    def isTurn(self, player):
+        return not self.finished and self.currentPlayer == player
+
+    def fire(self, player, cell):
+        """
+        player fires at the field cell = (row, column) of the opponent's
+        board. Returns the ShotResult, the turn passes to the opponent unless
+        the game is won. Raises ValueError if it is not the player's turn or
+        the field was already shot
+        """
+        if not self.isTurn(player):
+            raise ValueError(f"it is not {player}'s turn")
+        result = self.boards[self.opponent(player)].shoot(cell)
+        self._advance(player, cell, result)
+        return result
+
+    def resolve(self, player, cell, result, placement=None):
+        """
+        enter a shot of player which was resolved elsewhere (e.g. by the
+        match server) because the opponent's ships are unknown here
+        """
+        if not self.isTurn(player):
+            raise ValueError(f"it is not {player}'s turn")
+        self.boards[self.opponent(player)].record(cell, result, placement)
+        self._advance(player, cell, result)
+
+    def _advance(self, player, cell, result):
+        if self.recorder:
+            self.recorder.shot(cell)
+        if result.result == 'destroyed':
+            if self.recorder:
+                self.recorder.close()
+            self.finished = True
+            self.winner = player
+            self.currentPlayer = None
+        else:
+            self.currentPlayer = self.opponent(player)
+
+    def abort(self):
+        self.finished = True
+        self.currentPlayer = None
+        if self.recorder:
+            self.recorder.close()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+play games between two AIs without a GUI, e.g.
+
+    python -m src.simulate hunter random --games 100000 --workers 8
+"""
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import cpu_count
+from pathlib import Path
+from statistics import mean, median
+from time import perf_counter
+
+from . import metrics, strategies
+from .engine import FLEET, SHIP_TYPES, makeFleet
+from .replay import ReplayWriter
+from .session import GameSession
+
+
+def gameSeed(seed, gameNo):
+    """
+    every game has its own random stream derived from the seed and its
+    number, so results do not depend on how games are spread over workers
+    """
+    return f'{seed}:{gameNo}'
+
+
+def playGame(players, seed, gridSize=(10, 10), fleet=FLEET, replay=None):
+    """
+    play one game between two targeting strategies (see strategies.py). Both
+    fleets are placed at random, the game is recorded to the file replay if
+    given. Returns the index of the winner and the number of shots fired by
+    each player
+    """
+    session = GameSession(gridSize, fleet, seed, players=(0, 1))
+    for turn in session.players:
+        session.placeRandom(turn)
+    if replay:
+        session.recorder = ReplayWriter(replay)
+    ais = [strategies.targeting(name)(fleet=fleet,
+                                      seed=session.rng.getrandbits(64))
+           for name in players]
+    shots = [0, 0]
+    session.start()
+    while not session.finished:
+        turn = session.currentPlayer
+        target = ais[turn].nextShot(session.boards[1 - turn].observe())
+        session.fire(turn, target)
+        shots[turn] += 1
+    return session.winner, shots
+
+
+def _initWorker(sampleLimit):
+    from .ai import batchMode
+    batchMode(sampleLimit)
+
+
+def playGames(players, seed, start, stop, gridSize=(10, 10), fleet=FLEET,
+              replays=None):
+    """
+    play the games start to stop-1 of a simulation, runs in the workers.
+    With a directory replays every game is recorded to <gameNo>.bsr there
+    """
+    return [(gameNo,) + playGame(
+                    players, gameSeed(seed, gameNo), gridSize, fleet,
+                    Path(replays) / f'{gameNo:08d}.bsr' if replays else None)
+            for gameNo in range(start, stop)]
+
+
+def _playChunk(*args):
+    # the measurements of the worker go to the parent with the results
+    return playGames(*args), metrics.collect()
+
+
+class Statistics:
+    """
+    accumulates game results, the order in which results arrive does not
+    matter
+    """
+
+    def __init__(self, players):
+        self.players = players
+        self.games = 0
+        self.wins = [0, 0]
+        self.shotsToWin = [{}, {}]
+
+    def add(self, winner, shots):
+        self.games += 1
+        self.wins[winner] += 1
+        histogram = self.shotsToWin[winner]
+        histogram[shots[winner]] = histogram.get(shots[winner], 0) + 1
+
+    def summary(self):
+        result = {'games': self.games, 'players': []}
+        for no, name in enumerate(self.players):
+            histogram = self.shotsToWin[no]
+            shots = [n for n, count in sorted(histogram.items())
+                     for _ in range(count)]
+            result['players'].append({
+                    'strategy': name,
+                    'wins': self.wins[no],
+                    'winRate': self.wins[no]/self.games if self.games else 0,
+                    'shotsToWin': {
+                        'mean': mean(shots) if shots else None,
+                        'median': median(shots) if shots else None,
+                        'min': shots[0] if shots else None,
+                        'max': shots[-1] if shots else None,
+                        'histogram': dict(sorted(histogram.items()))}})
+        return result
+
+
+def simulate(players, games, seed=0, workers=None, chunkSize=500,
+             onChunk=None, gridSize=(10, 10), fleet=FLEET, replays=None,
+             sampleLimit=1000):
+    """
+    play games between two strategies on a process pool. onChunk is called
+    with the list of (gameNo, winner, shots) of every finished chunk as soon
+    as it arrives. The expert AI draws sampleLimit fleets per move (see
+    ai.batchMode). Returns the Statistics
+    """
+    statistics = Statistics(players)
+    chunks = [(start, min(start + chunkSize, games))
+              for start in range(0, games, chunkSize)]
+    with ProcessPoolExecutor(workers, initializer=_initWorker,
+                             initargs=(sampleLimit,)) as executor:
+        futures = [executor.submit(_playChunk, players, seed, start, stop,
+                                   gridSize, fleet, replays)
+                   for start, stop in chunks]
+        for future in as_completed(futures):
+            results, measured = future.result()
+            metrics.merge(measured)
+            for _, winner, shots in results:
+                statistics.add(winner, shots)
+            if onChunk:
+                onChunk(results)
+    return statistics
+
+
+def parseSize(text):
+    """
+    grid size from the command line, e.g. '10x10'
+    """
+    width, _, height = text.partition('x')
+    return int(width), int(height or width)
+
+
+def parseFleet(text):
+    """
+    fleet composition from the command line, e.g. 'Carrier=2,Destroyer=4'
+    """
+    composition = {}
+    for entry in text.split(','):
+        name, _, count = entry.partition('=')
+        if name not in SHIP_TYPES:
+            raise argparse.ArgumentTypeError(f'unknown ship {name}')
+        composition[name] = int(count or 1)
+    return makeFleet(composition)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m src.simulate',
+            description='play games between two AIs without a GUI')
+    parser.add_argument('players', nargs=2, choices=strategies.names(),
+                        help='the two strategies')
+    parser.add_argument('-n', '--games', type=int, default=10000)
+    parser.add_argument('-s', '--seed', default='0')
+    parser.add_argument('-w', '--workers', type=int, default=cpu_count())
+    parser.add_argument('-c', '--chunk-size', type=int, default=500,
+                        help='games per task handed to a worker')
+    parser.add_argument('--size', type=parseSize, default=(10, 10),
+                        help='width x height of the grid (default: 10x10)')
+    parser.add_argument('--fleet', type=parseFleet, default=FLEET,
+                        help='ships per type, e.g. Carrier=2,Destroyer=4 '
+                             '(default: one of each)')
+    parser.add_argument('-o', '--output',
+                        help='write the result of every game to this file '
+                             '(json lines) as it arrives')
+    parser.add_argument('--replays', metavar='DIR',
+                        help='record every game to a replay file in DIR')
+    parser.add_argument('--ai-samples', type=int, default=1000, metavar='N',
+                        help='fleets drawn per move by the expert AI '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'w') if args.output else None
+    begin = perf_counter()
+    done = 0
+
+    def onChunk(results):
+        nonlocal done
+        done += len(results)
+        elapsed = perf_counter() - begin
+        print(f'{done}/{args.games} games, {done/elapsed:.0f} games/s',
+              file=sys.stderr)
+        if output:
+            for gameNo, winner, shots in results:
+                output.write(json.dumps(
+                        {'game': gameNo, 'winner': winner, 'shots': shots}))
+                output.write('\n')
+
+    try:
+        statistics = simulate(
+                args.players, args.games, args.seed, args.workers,
+                args.chunk_size, onChunk, args.size, args.fleet,
+                args.replays, args.ai_samples)
+    finally:
+        if output:
+            output.close()
+    summary = statistics.summary()
+    summary['seconds'] = perf_counter() - begin
+    summary['gamesPerSecond'] = args.games/summary['seconds']
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+from time import perf_counter
+
+
+class StartupProfile:
+    """
+    timings of the startup phases for run.py --profile-startup. Every mark
+    records the time since the previous one and the packages imported in
+    the meantime (python -X importtime gives the timing of every module)
+    """
+
+    def __init__(self, begin=None, enabled=True, topModules=3):
+        self.begin = perf_counter() if begin is None else begin
+        self.enabled = enabled
+        self.topModules = topModules
+        self.last = self.begin
+        self.modules = set(sys.modules)
+        self.marks = []
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        now = perf_counter()
+        modules = set(sys.modules) - self.modules
+        self.modules.update(modules)
+        self.marks.append((name, now - self.last, now - self.begin,
+                           len(modules), self._roots(modules)))
+        self.last = now
+
+    def _roots(self, modules):
+        roots = sorted({name.partition('.')[0] for name in modules})
+        return roots[:self.topModules] + (
+                ['...'] if len(roots) > self.topModules else [])
+
+    def report(self):
+        lines = [f"{'phase':<24}{'ms':>8}{'total':>8}  modules"]
+        for name, seconds, total, count, roots in self.marks:
+            lines.append(f'{name:<24}{seconds*1e3:8.1f}{total*1e3:8.1f}  '
+                         + (f"{count} ({', '.join(roots)})" if count else ''))
+        return '\n'.join(lines)
+
+    def printReport(self, file=sys.stderr):
+        if self.enabled:
+            print(self.report(), file=file)
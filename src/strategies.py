@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+strategies of the players by name. A targeting strategy picks the shots, a
+placement strategy places the fleet.
+
+A targeting strategy is a class (or any callable) taking the keyword
+arguments fleet and seed, the object it returns has a method
+nextShot(observation) returning the (row, column) of the next shot, see
+ai.RandomAI. A placement strategy is a function place(gridSize, fleet, rng)
+returning the Placements of a legal fleet, see placement.samplePlacements.
+
+Other packages add strategies by entry point name in the groups
+battleship.targeting and battleship.placement, e.g. in their pyproject.toml
+
+    [project.entry-points."battleship.targeting"]
+    sniper = "mypackage.sniper:SniperAI"
+
+Built in strategies are references like entry points and imported on first
+use only, so asking for the names is cheap
+"""
+
+from importlib import import_module
+from importlib.metadata import entry_points
+
+TARGETING = 'battleship.targeting'
+PLACEMENT = 'battleship.placement'
+
+_BUILTIN = {
+        TARGETING: {
+            'random':   f'{__package__}.ai:RandomAI',
+            'hunter':   f'{__package__}.ai:HunterAI',
+            'expert':   f'{__package__}.ai:MonteCarloAI'},
+        PLACEMENT: {
+            'random':   f'{__package__}.placement:samplePlacements',
+            'uniform':  f'{__package__}.placement:sampleUniform'}}
+
+_registered = {TARGETING: {}, PLACEMENT: {}}
+_loaded = {}
+
+
+def _entryPoints(group):
+    try:
+        found = entry_points(group=group)
+    except TypeError:
+        # before Python 3.10
+        found = entry_points().get(group, ())
+    return {entryPoint.name: entryPoint for entryPoint in found}
+
+
+def register(group, name, strategy):
+    """
+    add a strategy of this process, e.g. of a script. Registered strategies
+    take precedence over entry points and built in ones
+    """
+    _registered[group][name] = strategy
+
+
+def names(group=TARGETING):
+    return sorted({*_BUILTIN[group], *_entryPoints(group),
+                   *_registered[group]})
+
+
+def load(group, name):
+    """
+    the strategy with the name. Raises KeyError for unknown names
+    """
+    if name in _registered[group]:
+        return _registered[group][name]
+    key = (group, name)
+    if key not in _loaded:
+        entryPoint = _entryPoints(group).get(name)
+        if entryPoint is not None:
+            _loaded[key] = entryPoint.load()
+        elif name in _BUILTIN[group]:
+            module, _, attribute = _BUILTIN[group][name].partition(':')
+            _loaded[key] = getattr(import_module(module), attribute)
+        else:
+            raise KeyError(f'unknown strategy {name}, known are '
+                           f"{', '.join(names(group))}")
+    return _loaded[key]
+
+
+def targeting(name):
+    return load(TARGETING, name)
+
+
+def placement(name):
+    return load(PLACEMENT, name)
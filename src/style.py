@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+dark stylesheet of the application (qdarkstyle). Building it imports qtpy
+and registers a resource module of 600 kB, so the stylesheet is compiled
+once and kept in the user's cache directory. The cached copy refers to the
+icons in the qdarkstyle package directory instead of the resources and is
+built again when qdarkstyle changes
+"""
+
+import json
+import os
+from importlib.util import find_spec
+from pathlib import Path
+
+from PyQt5 import QtGui as qtg
+
+RESOURCE_PREFIX = ':/qss_icons/dark/rc/'
+
+
+def cacheDir():
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'battleship'
+
+
+def packageKey():
+    """
+    returns the directory of the installed qdarkstyle package and a key which
+    changes when the package is replaced. Raises ImportError without it
+    """
+    spec = find_spec('qdarkstyle')
+    if spec is None or spec.origin is None:
+        raise ImportError('the dark style needs qdarkstyle')
+    path = Path(spec.origin).parent
+    stat = (path / 'dark' / 'darkstyle.qss').stat()
+    return path, f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def buildStylesheet(path, key):
+    import qdarkstyle
+    from qdarkstyle.dark.palette import DarkPalette
+    stylesheet = qdarkstyle.load_stylesheet_pyqt5().replace(
+            RESOURCE_PREFIX, (path / 'dark' / 'rc').as_posix() + '/')
+    return {
+            'key': key,
+            'stylesheet': stylesheet,
+            'linkColor': DarkPalette.COLOR_ACCENT_3}
+
+
+def loadStylesheet(app, cache=None):
+    """
+    apply the dark stylesheet to app, returns True if it was read from the
+    cache
+    """
+    cache = Path(cache) if cache else cacheDir() / 'darkstyle.json'
+    path, key = packageKey()
+    try:
+        with open(cache, encoding='utf-8') as file:
+            style = json.load(file)
+        cached = style['key'] == key
+    except (OSError, ValueError, KeyError, TypeError):
+        cached = False
+    if not cached:
+        style = buildStylesheet(path, key)
+        try:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+            temporary = cache.with_suffix('.tmp')
+            with open(temporary, 'w', encoding='utf-8') as file:
+                json.dump(style, file)
+            os.replace(temporary, cache)
+        except OSError:
+            pass
+
+    # the palette fix of qdarkstyle (links in the accent color)
+    palette = app.palette()
+    palette.setColor(qtg.QPalette.Normal, qtg.QPalette.Link,
+                     qtg.QColor(style['linkColor']))
+    app.setPalette(palette)
+    app.setStyleSheet(style['stylesheet'])
+    return cached
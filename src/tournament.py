@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+round robin tournaments between strategies, e.g.
+
+    python -m src.tournament random hunter expert expert/uniform --games 200
+
+A player is a targeting strategy, optionally with a placement strategy after
+a slash (default: random), see strategies.py. Every pair of players plays
+games on a process pool, both sides place their own fleets and the first
+move alternates. Every game is appended to the results file as soon as its
+chunk is done. Running the same tournament again with the same results file
+plays only the games which are missing. The first line of the file holds the
+settings (seed, grid size, fleet, fleets per move of the expert AI), a file
+of a tournament with other settings is refused.
+
+Ratings are Elo ratings fitted to all games (Bradley-Terry maximum
+likelihood, the mean rating is 1500) with 95% confidence intervals from
+resampling the games (a parametric bootstrap from the win rates smoothed
+like the fit). The CPU time per move is the process time of the
+strategy's nextShot calls
+"""
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from os import cpu_count
+from pathlib import Path
+from random import Random
+from time import perf_counter, process_time
+import numpy as np
+
+from . import metrics, strategies
+from .engine import FLEET
+from .session import GameSession
+
+
+class ResultsError(ValueError):
+    pass
+
+
+def parsePlayer(text):
+    """
+    (targeting, placement) of a player name like 'expert/uniform'
+    """
+    targeting, _, placement = text.partition('/')
+    return targeting, placement or 'random'
+
+
+def matchSeed(seed, players, gameNo):
+    """
+    the seed of a game depends on the players and its number only, so games
+    can be played in any order and resumed
+    """
+    return f'{seed}:{players[0]}:{players[1]}:{gameNo}'
+
+
+def playMatch(players, seed, gridSize=(10, 10), fleet=FLEET):
+    """
+    play one game between two players (names, see parsePlayer), the first
+    one starts. Returns the index of the winner, the shots fired and the CPU
+    seconds spent choosing them by each player
+    """
+    session = GameSession(gridSize, fleet, seed, players=(0, 1))
+    ais = []
+    for turn, name in enumerate(players):
+        targeting, placement = parsePlayer(name)
+        rng = Random(session.rng.getrandbits(64))
+        session.place(turn, strategies.placement(placement)(
+                gridSize, fleet, rng))
+        ais.append(strategies.targeting(targeting)(
+                fleet=fleet, seed=session.rng.getrandbits(64)))
+    shots = [0, 0]
+    cpu = [0., 0.]
+    session.start(first=0)
+    while not session.finished:
+        turn = session.currentPlayer
+        begin = process_time()
+        target = ais[turn].nextShot(session.boards[1 - turn].observe())
+        cpu[turn] += process_time() - begin
+        session.fire(turn, target)
+        shots[turn] += 1
+    return session.winner, shots, cpu
+
+
+def playMatches(pair, seed, gameNos, gridSize=(10, 10), fleet=FLEET):
+    """
+    play games of a pair of players, runs in the workers. The first move
+    alternates: in odd games the second player of the pair starts. Returns
+    a result dict per game with the shots and CPU times in pair order
+    """
+    results = []
+    for gameNo in gameNos:
+        first = gameNo % 2
+        players = pair if not first else pair[::-1]
+        winner, shots, cpu = playMatch(
+                players, matchSeed(seed, pair, gameNo), gridSize, fleet)
+        if first:
+            winner, shots, cpu = 1 - winner, shots[::-1], cpu[::-1]
+        results.append({'pair': list(pair), 'game': gameNo, 'first': first,
+                        'winner': winner, 'shots': shots, 'cpu': cpu})
+    return results
+
+
+def _playChunk(*args):
+    # the measurements of the worker go to the parent with the results
+    return playMatches(*args), metrics.collect()
+
+
+def _initWorker(sampleLimit):
+    # without a pool of the expert AI per worker its CPU time is not hidden
+    # in other processes either
+    from .ai import batchMode
+    batchMode(sampleLimit)
+
+
+def loadResults(path):
+    """
+    the settings (None if there are none) and the games of a results file,
+    a line cut short by an interruption is skipped
+    """
+    settings = None
+    results = []
+    if path and Path(path).exists():
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'settings' in record:
+                    settings = record['settings']
+                else:
+                    results.append(record)
+    return settings, results
+
+
+def tournament(players, games, seed=0, workers=None, chunkSize=50,
+               results=None, onChunk=None, gridSize=(10, 10), fleet=FLEET,
+               sampleLimit=1000):
+    """
+    play games games between every pair of players on a process pool,
+    appending every game to the file results. Games already in the file are
+    not played again. onChunk is called with the results of every finished
+    chunk. The expert AI draws sampleLimit fleets per move (see
+    ai.batchMode). Returns all results. Raises ResultsError if the file
+    holds games played with other settings
+    """
+    settings = {'seed': str(seed), 'size': list(gridSize),
+                'fleet': [list(ship) for ship in fleet],
+                'aiSamples': sampleLimit}
+    found, done = loadResults(results)
+    if (found is not None or done) and found != settings:
+        raise ResultsError(
+                f'{results} holds games with other settings ({found}), '
+                f'use another results file')
+    played = {(tuple(result['pair']), result['game']) for result in done}
+    tasks = []
+    for pair in combinations(sorted(players), 2):
+        missing = [gameNo for gameNo in range(games)
+                   if (pair, gameNo) not in played]
+        tasks.extend((pair, missing[start:start + chunkSize])
+                     for start in range(0, len(missing), chunkSize))
+    output = open(results, 'a', encoding='utf-8') if results else None
+    if output and found is None:
+        output.write(json.dumps({'settings': settings}) + '\n')
+    try:
+        with ProcessPoolExecutor(workers, initializer=_initWorker,
+                                 initargs=(sampleLimit,)) as executor:
+            futures = [executor.submit(_playChunk, pair, seed, gameNos,
+                                       gridSize, fleet)
+                       for pair, gameNos in tasks]
+            for future in as_completed(futures):
+                chunk, measured = future.result()
+                metrics.merge(measured)
+                done.extend(chunk)
+                if output:
+                    output.write(''.join(json.dumps(result) + '\n'
+                                         for result in chunk))
+                    output.flush()
+                if onChunk:
+                    onChunk(chunk)
+    finally:
+        if output:
+            output.close()
+    return done
+
+
+def fitRatings(wins, iterations=1000, prior=.5):
+    """
+    Elo ratings of the players for wins[i, j] (games i won against j).
+    Bradley-Terry strengths are fitted with the MM algorithm, prior wins are
+    added in both directions of every pair, so players without a win or a
+    loss get finite ratings
+    """
+    wins = wins + prior*(1 - np.eye(len(wins)))
+    games = wins + wins.T
+    total = wins.sum(axis=1)
+    strength = np.ones(len(wins))
+    for _ in range(iterations):
+        pairs = games/(strength[:, None] + strength[None, :])
+        updated = total/pairs.sum(axis=1)
+        updated /= np.exp(np.log(updated).mean())
+        if np.allclose(updated, strength, rtol=1e-10, atol=0):
+            break
+        strength = updated
+    return 1500 + 400*np.log10(strength)
+
+
+def ratings(players, results, resamples=200, seed=0, prior=.5):
+    """
+    returns {player: statistics} with the rating, its 95% confidence
+    interval, games, win rate, mean shots per won game and CPU ms per move.
+    The games of every pair are resampled with the win rate smoothed by the
+    prior wins of fitRatings, so a pair with one winner only still varies
+    """
+    index = {name: no for no, name in enumerate(players)}
+    wins = np.zeros((len(players), len(players)))
+    stats = {name: {'games': 0, 'wins': 0, 'shotsToWin': 0, 'moves': 0,
+                    'cpu': 0.} for name in players}
+    for result in results:
+        pair = result['pair']
+        if not all(name in index for name in pair):
+            continue
+        winner = result['winner']
+        wins[index[pair[winner]], index[pair[1 - winner]]] += 1
+        for side, name in enumerate(pair):
+            stat = stats[name]
+            stat['games'] += 1
+            stat['moves'] += result['shots'][side]
+            stat['cpu'] += result['cpu'][side]
+        stats[pair[winner]]['wins'] += 1
+        stats[pair[winner]]['shotsToWin'] += result['shots'][winner]
+    elo = fitRatings(wins, prior=prior)
+    rng = np.random.default_rng(seed)
+    games = (wins + wins.T).astype(np.int64)
+    rate = (wins + prior)/(games + 2*prior)
+    upper = np.triu(np.ones_like(wins, dtype=bool), 1)
+    samples = []
+    for _ in range(resamples):
+        resampled = np.where(upper, rng.binomial(games, rate), 0)
+        resampled = resampled + np.where(upper.T, (games - resampled).T, 0)
+        samples.append(fitRatings(resampled, prior=prior))
+    low, high = (np.percentile(samples, (2.5, 97.5), axis=0) if samples
+                 else (elo, elo))
+    summary = {}
+    for no, name in enumerate(players):
+        stat = stats[name]
+        summary[name] = {
+                'elo': float(elo[no]),
+                'low': float(low[no]),
+                'high': float(high[no]),
+                'games': stat['games'],
+                'winRate': stat['wins']/stat['games'] if stat['games'] else 0,
+                'shotsToWin': (stat['shotsToWin']/stat['wins']
+                               if stat['wins'] else None),
+                'cpuPerMove': (1e3*stat['cpu']/stat['moves']
+                               if stat['moves'] else None)}
+    return summary
+
+
+def report(summary):
+    lines = [f"{'player':<24}{'elo':>7}{'95% interval':>16}{'games':>8}"
+             f"{'win %':>8}{'shots':>8}{'ms/move':>10}"]
+    for name, stat in sorted(summary.items(),
+                             key=lambda item: -item[1]['elo']):
+        shots = stat['shotsToWin']
+        cpu = stat['cpuPerMove']
+        lines.append(
+                f"{name:<24}{stat['elo']:>7.0f}"
+                f"{stat['low']:>8.0f} - {stat['high']:<5.0f}"
+                f"{stat['games']:>8}{100*stat['winRate']:>8.1f}"
+                f"{'-' if shots is None else format(shots, '.1f'):>8}"
+                f"{'-' if cpu is None else format(cpu, '.3f'):>10}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    from .simulate import parseFleet, parseSize
+    parser = argparse.ArgumentParser(
+            prog='python -m src.tournament',
+            description='play a round robin tournament between strategies')
+    names = ', '.join(strategies.names())
+    parser.add_argument('players', nargs='*',
+                        help='targeting[/placement] strategies (default: all '
+                             f'targeting strategies: {names})')
+    parser.add_argument('-n', '--games', type=int, default=100,
+                        help='games per pair of players')
+    parser.add_argument('-s', '--seed', default='0')
+    parser.add_argument('-w', '--workers', type=int, default=cpu_count())
+    parser.add_argument('-c', '--chunk-size', type=int, default=50,
+                        help='games per task handed to a worker')
+    parser.add_argument('--size', type=parseSize, default=(10, 10),
+                        help='width x height of the grid (default: 10x10)')
+    parser.add_argument('--fleet', type=parseFleet, default=FLEET,
+                        help='ships per type, e.g. Carrier=2,Destroyer=4 '
+                             '(default: one of each)')
+    parser.add_argument('-r', '--results', default='tournament.jsonl',
+                        help='file of the games played, the tournament '
+                             'resumes from it (default: %(default)s)')
+    parser.add_argument('--resamples', type=int, default=200,
+                        help='resamples for the confidence intervals')
+    parser.add_argument('--ai-samples', type=int, default=1000, metavar='N',
+                        help='fleets drawn per move by the expert AI '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    players = args.players or strategies.names()
+    if len(set(players)) < 2:
+        parser.error('a tournament needs two different players')
+    for name in players:
+        targeting, placement = parsePlayer(name)
+        if targeting not in strategies.names(strategies.TARGETING):
+            parser.error(f'unknown targeting strategy {targeting}')
+        if placement not in strategies.names(strategies.PLACEMENT):
+            parser.error(f'unknown placement strategy {placement}')
+    players = list(dict.fromkeys(players))
+
+    begin = perf_counter()
+    total = args.games*len(players)*(len(players) - 1)//2
+    done = 0
+
+    def onChunk(results):
+        nonlocal done
+        done += len(results)
+        elapsed = perf_counter() - begin
+        print(f'{done} games played ({total} in the tournament), '
+              f'{done/elapsed:.0f} games/s', file=sys.stderr)
+
+    try:
+        results = tournament(
+                players, args.games, args.seed, args.workers,
+                args.chunk_size, args.results, onChunk, args.size, args.fleet,
+                args.ai_samples)
+    except ResultsError as error:
+        parser.error(str(error))
+    print(report(ratings(players, results, args.resamples)))
+
+
+if __name__ == '__main__':
+    main()
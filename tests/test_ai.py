@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+from math import lgamma, log
+from random import Random
+
+import numpy as np
+import pytest
+
+from src.ai import (
+        FleetSampler, HunterAI, MonteCarloAI, RandomAI, sampleCounts)
+from src.engine import Board, FLEET, Geometry, ORIENTATIONS, makeFleet
+from src.placement import randomBoard
+
+
+def playToEnd(ai, gridSize=(10, 10), fleet=FLEET, seed=0):
+    """
+    the AI fires at a random board until the fleet is destroyed, every shot
+    must be a field of the board which was not shot yet. Returns the shots
+    """
+    board = randomBoard(gridSize, fleet, Random(seed))
+    geometry = Geometry.get(gridSize)
+    shots = []
+    while not board.isEliminated():
+        assert len(shots) < geometry.size
+        i, j = ai.nextShot(board.observe())
+        assert geometry.contains(i, j)
+        board.shoot((i, j))
+        shots.append((i, j))
+    return shots
+
+
+def legalPlacements(geometry, extent, observation):
+    """
+    (cells, zone) of every placement of a ship which agrees with the
+    observation, for a board without sunk ships
+    """
+    misses = set(observation.shots) - set(observation.hits)
+    hits = set(observation.hits)
+    placements = []
+    for orientation in ORIENTATIONS:
+        for i in range(geometry.height):
+            for j in range(geometry.width):
+                try:
+                    cells, zone = geometry.fields(extent, orientation, (i, j))
+                except ValueError:
+                    continue
+                if (misses.isdisjoint(cells)
+                        and hits.isdisjoint(set(zone) - set(cells))
+                        and not hits.issuperset(cells)):
+                    placements.append((set(cells), set(zone)))
+    return placements
+
+
+def exactCoverage(observation, fleet):
+    """
+    the probability that a field is covered by a ship, over all fleets which
+    agree with the observation, by enumerating them
+    """
+    geometry = Geometry.get(observation.gridSize)
+    hits = set(observation.hits)
+    options = [legalPlacements(geometry, extent, observation)
+               for _, extent in fleet]
+    counts = np.zeros(geometry.size)
+    fleets = 0
+
+    def place(ship, covered, forbidden):
+        nonlocal fleets
+        if ship == len(fleet):
+            if hits <= covered:
+                fleets += 1
+                counts[list(covered)] += 1
+            return
+        for cells, zone in options[ship]:
+            if forbidden.isdisjoint(cells):
+                place(ship + 1, covered | cells, forbidden | zone)
+
+    place(0, set(), set())
+    return counts/fleets
+
+
+def observe(gridSize, fleet, placements, shots):
+    board = Board(gridSize)
+    for (shipId, extent), placement in zip(fleet, placements):
+        board.placeShip(shipId, extent, *placement)
+    for cell in shots:
+        board.shoot(cell)
+    return board.observe()
+
+
+@pytest.mark.parametrize('fleet', [
+        makeFleet({'Cruiser': 1, 'Submarine': 1, 'Destroyer': 1}),
+        makeFleet({'Cruiser': 1, 'Destroyer': 2})])
+def test_sampler_matches_enumeration(fleet):
+    """
+    the weighted frequencies of the sampler are the exact probabilities,
+    also for fleets with several ships of the same length
+    """
+    observation = observe(
+            (6, 6), fleet, [('h', (0, 0)), ('v', (5, 5)), ('h', (3, 1))][
+                :len(fleet)], [(3, 1), (0, 5), (5, 0), (2, 3)])
+    assert len(observation.hits) == 1
+    exact = exactCoverage(observation, fleet)
+    counts, samples = sampleCounts(
+            observation, fleet, float('inf'), seed=1, limit=20000)
+    assert samples == 20000
+    assert np.abs(counts/samples - exact).max() < .02
+
+
+def test_weights_of_large_fleets():
+    """
+    the product of the options of a hundred ships does not fit into a
+    float, the counts are normalized without it
+    """
+    fleet = makeFleet({'Destroyer': 120})
+    observation = Board((32, 32)).observe()
+    _, weight = FleetSampler(observation, fleet).sample(Random(0))
+    # the weight without the division by 120!
+    assert weight + lgamma(121) > log(sys.float_info.max)
+    counts, samples = sampleCounts(
+            observation, fleet, float('inf'), seed=0, limit=3)
+    assert samples == 3
+    assert np.isfinite(counts).all()
+    assert counts.sum() == pytest.approx(3*2*120)
+
+
+@pytest.mark.parametrize('gridSize, fleet', [
+        ((10, 10), FLEET), ((7, 12), makeFleet({'Cruiser': 2})),
+        ((60, 60), makeFleet({'Carrier': 3, 'Destroyer': 5}))])
+def test_random_moves_are_legal(gridSize, fleet):
+    playToEnd(RandomAI(fleet, seed=1), gridSize, fleet)
+
+
+@pytest.mark.parametrize('ai', [RandomAI, HunterAI])
+def test_no_field_left(ai):
+    ai = ai(makeFleet({'Destroyer': 1}), seed=0)
+    board = Board((4, 3))
+    for _ in range(12):
+        board.shoot(ai.nextShot(board.observe()))
+    with pytest.raises(ValueError):
+        ai.nextShot(board.observe())
+
+
+@pytest.mark.parametrize('openings', [False, True])
+@pytest.mark.parametrize('gridSize, fleet', [
+        ((10, 10), FLEET), ((7, 12), makeFleet({'Cruiser': 2})),
+        ((40, 40), makeFleet({'Carrier': 2, 'Destroyer': 6}))])
+def test_hunter_moves_are_legal(gridSize, fleet, openings):
+    for seed in range(3):
+        shots = playToEnd(HunterAI(fleet, seed, openings), gridSize, fleet,
+                          seed)
+        assert len(shots) < Geometry.get(gridSize).size
+
+
+def test_hunter_beats_random():
+    hunter = sum(len(playToEnd(HunterAI(seed=seed), seed=seed))
+                 for seed in range(10))
+    random = sum(len(playToEnd(RandomAI(seed=seed), seed=seed))
+                 for seed in range(10))
+    assert hunter < .7*random
+
+
+@pytest.mark.parametrize('gridSize, fleet', [
+        ((10, 10), FLEET), ((7, 12), makeFleet({'Cruiser': 2})),
+        ((40, 40), makeFleet({'Carrier': 2, 'Destroyer': 6}))])
+def test_expert_moves_are_legal(gridSize, fleet):
+    for seed in range(2):
+        ai = MonteCarloAI(fleet, seed, workers=0, sampleLimit=100)
+        shots = playToEnd(ai, gridSize, fleet, seed)
+        assert len(shots) < Geometry.get(gridSize).size
+
+
+def test_expert_with_workers_is_reproducible():
+    """
+    with a sampleLimit the moves depend on the seed only, not on how fast
+    the workers are
+    """
+    games = [playToEnd(MonteCarloAI(seed=5, workers=2, sampleLimit=200),
+                       seed=5) for _ in range(2)]
+    assert games[0] == games[1]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from src.engine import Board, Placement, ShotResult
+
+
+def fleetBoard(gridSize=(10, 10)):
+    board = Board(gridSize)
+    board.placeShip('Cruiser', 3, 'h', (0, 0))
+    board.placeShip('Destroyer', 2, 'v', (4, 9))
+    return board
+
+
+def test_shots():
+    board = fleetBoard()
+    assert board.shoot((5, 5)) == ShotResult('miss', None)
+    assert board.shoot((0, 1)) == ShotResult('hit', 'Cruiser')
+    assert board.health('Cruiser') == 2
+    assert board.shoot((0, 0)) == ShotResult('hit', 'Cruiser')
+    assert board.shoot((0, 2)) == ShotResult('sunk', 'Cruiser')
+    assert board.sunk == ['Cruiser']
+    assert not board.isEliminated()
+    assert board.shoot((3, 9)) == ShotResult('hit', 'Destroyer')
+    assert board.shoot((4, 9)) == ShotResult('destroyed', 'Destroyer')
+    assert board.isEliminated()
+    assert len(board.shots) == 6
+    assert len(board.hits) == 5
+
+
+def test_shot_twice():
+    board = fleetBoard()
+    board.shoot((0, 0))
+    with pytest.raises(ValueError):
+        board.shoot((0, 0))
+    with pytest.raises(ValueError):
+        board.shoot((10, 0))
+
+
+def test_moving_a_ship_keeps_the_shots():
+    """
+    the health of the ships is rebuilt from the shots when they move
+    """
+    board = fleetBoard()
+    board.shoot((2, 0))
+    board.placeShip('Cruiser', 3, 'v', (2, 0))
+    assert board.health('Cruiser') == 2
+    assert board.shipAt((1, 0)) == 'Cruiser'
+    assert board.shipAt((0, 1)) is None
+    assert board.shoot((1, 0)) == ShotResult('hit', 'Cruiser')
+    assert board.shoot((0, 0)) == ShotResult('sunk', 'Cruiser')
+
+
+def test_observation():
+    board = fleetBoard()
+    for cell in [(0, 0), (0, 1), (0, 2), (3, 9), (7, 7)]:
+        board.shoot(cell)
+    observation = board.observe()
+    assert observation.gridSize == (10, 10)
+    assert set(observation.shots) == {0, 1, 2, 39, 77}
+    assert set(observation.hits) == {0, 1, 2, 39}
+    assert observation.sunk == (Placement('Cruiser', 3, 'h', (0, 0)),)
+    # observations are copies
+    board.shoot((4, 9))
+    assert len(observation.shots) == 5
+
+
+def test_record():
+    """
+    shots at a board with unknown ships, e.g. of an opponent on the server
+    """
+    board = Board()
+    board.record((0, 0), ShotResult('miss', None))
+    board.record((1, 1), ShotResult('hit', 'Destroyer'))
+    placement = Placement('Destroyer', 2, 'h', (1, 1))
+    board.record((1, 2), ShotResult('sunk', 'Destroyer'), placement)
+    assert set(board.hits) == {11, 12}
+    assert board.observe().sunk == (placement,)
+    with pytest.raises(ValueError):
+        board.record((1, 1), ShotResult('hit', None))
+
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from src import openingBook
+from src.ai import HunterAI
+from src.engine import Board, makeFleet
+from src.openingBook import (
+        BookError, OpeningBook, bookPath, buildBook, canonical, sampleFleets,
+        symmetries, writeBook)
+
+FLEET = makeFleet({'Cruiser': 1, 'Destroyer': 2})
+
+
+@pytest.fixture(scope='module', params=[(8, 8), (6, 9)])
+def book(request):
+    gridSize = request.param
+    occupied = sampleFleets(2000, gridSize, FLEET, seed=1)
+    return gridSize, buildBook(occupied, gridSize, depth=5, tolerance=.05)
+
+
+def test_round_trip(tmp_path, book):
+    gridSize, entries = book
+    path = tmp_path / 'test.book'
+    writeBook(path, entries, gridSize, FLEET, 2000)
+    with OpeningBook(path) as opened:
+        assert opened.gridSize == gridSize
+        assert opened.fleet == FLEET
+        assert opened.samples == 2000
+        assert opened.entries == len(entries)
+        for pattern, chosen in entries.items():
+            assert opened.moves(pattern) == tuple(chosen)
+            assert not set(chosen) & set(pattern)
+        assert opened.moves(tuple(range(5))) == ()
+
+
+def test_symmetric_patterns(tmp_path, book):
+    """
+    a pattern looked up in any orientation gives the candidates of the
+    stored pattern in the same orientation
+    """
+    gridSize, entries = book
+    path = tmp_path / 'test.book'
+    writeBook(path, entries, gridSize, FLEET, 2000)
+    maps = symmetries(gridSize)
+    checked = 0
+    with OpeningBook(path) as opened:
+        for pattern, chosen in entries.items():
+            images = [tuple(sorted(int(forward[n]) for n in pattern))
+                      for forward, _ in maps]
+            if len(set(images)) < len(images):
+                # a symmetric pattern, its candidates may be any of its
+                # images
+                continue
+            for forward, _ in maps:
+                misses = [int(forward[n]) for n in pattern]
+                assert canonical(misses, maps)[0] == pattern
+                assert opened.moves(misses) == tuple(
+                        int(forward[n]) for n in chosen)
+            checked += 1
+    assert checked
+
+
+@pytest.mark.parametrize('data', [b'', b'BSOB', b'not an opening book' * 4])
+def test_not_a_book(tmp_path, data):
+    path = tmp_path / 'bad.book'
+    path.write_bytes(data)
+    with pytest.raises(BookError):
+        OpeningBook(path)
+
+
+def test_truncated(tmp_path, book):
+    gridSize, entries = book
+    path = tmp_path / 'test.book'
+    writeBook(path, entries, gridSize, FLEET, 2000)
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(BookError):
+        OpeningBook(path)
+
+
+def test_lookup_by_the_ai(tmp_path, monkeypatch, book):
+    """
+    the hunter AI takes its first shots from the book of its board and
+    fleet, no book is found for another fleet
+    """
+    gridSize, entries = book
+    monkeypatch.setattr(openingBook, 'bookDir', tmp_path)
+    monkeypatch.setattr(OpeningBook, '_books', {})
+    writeBook(bookPath(gridSize), entries, gridSize, FLEET, 2000)
+    assert OpeningBook.get(gridSize, makeFleet({'Carrier': 1})) is None
+    opened = OpeningBook.get(gridSize, FLEET)
+    assert OpeningBook.get(gridSize, FLEET) is opened
+
+    ai = HunterAI(FLEET, seed=0)
+    board = Board(gridSize)
+    for _ in range(3):
+        misses = tuple(board.shots)
+        i, j = ai.nextShot(board.observe())
+        assert i*gridSize[0] + j in opened.moves(misses)
+        # a board without ships, every shot is a miss
+        board.shoot((i, j))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from random import Random
+
+import pytest
+
+from src import metrics
+from src.engine import Board, FLEET, ORIENTATIONS, makeFleet
+from src.placement import (
+        PlacementTable, PlacementValidator, randomBoards, samplePlacements,
+        sampleUniform)
+
+
+def randomPlacement(rng, gridSize, extent):
+    """
+    a random placement of a ship which lies completely on the grid, it may
+    overlap or touch other ships
+    """
+    width, height = gridSize
+    orientation = rng.choice(ORIENTATIONS)
+    if orientation == 'h':
+        index = (rng.randrange(height), rng.randrange(width - extent + 1))
+    else:
+        index = (rng.randrange(extent - 1, height), rng.randrange(width))
+    return orientation, index
+
+
+def invalidShips(board):
+    """
+    the ships of a board whose body touches another ship
+    """
+    fields = {shipId: board.geometry.fields(*placement[1:])
+              for shipId, placement in board.ships.items()}
+    return {shipId for shipId, (cells, _) in fields.items()
+            if any(not set(cells).isdisjoint(zone)
+                   for other, (_, zone) in fields.items()
+                   if other != shipId)}
+
+
+@pytest.mark.parametrize('gridSize', [(10, 10), (8, 12), (40, 40)])
+def test_agrees_with_board(gridSize):
+    """
+    ships are moved, removed and placed again at random, validator and
+    board agree after every step
+    """
+    rng = Random(sum(gridSize))
+    fleet = makeFleet({'Carrier': 1, 'Cruiser': 2, 'Destroyer': 3})
+    validator = PlacementValidator(gridSize)
+    board = Board(gridSize)
+    valid = 0
+    for _ in range(2000):
+        shipId, extent = rng.choice(fleet)
+        if shipId in board.ships and rng.random() < .1:
+            validator.remove(shipId)
+            board.removeShip(shipId)
+        else:
+            placement = randomPlacement(rng, gridSize, extent)
+            validator.move(shipId, extent, *placement)
+            board.placeShip(shipId, extent, *placement)
+        assert validator.isValid() == board.isValid()
+        valid += board.isValid()
+        invalid = invalidShips(board)
+        for shipId in board.ships:
+            assert validator.isShipValid(shipId) == (shipId not in invalid)
+    # both outcomes were checked
+    assert 0 < valid < 2000
+
+
+def test_touching_ships():
+    validator = PlacementValidator()
+    validator.move('Carrier', 5, 'h', (0, 0))
+    validator.move('Destroyer', 2, 'h', (2, 0))
+    assert validator.isValid()
+    # diagonal neighbour
+    validator.move('Destroyer', 2, 'h', (1, 5))
+    assert not validator.isValid()
+    validator.move('Destroyer', 2, 'v', (2, 6))
+    assert validator.isValid()
+    # overlap
+    validator.move('Destroyer', 2, 'v', (1, 4))
+    assert not validator.isValid()
+    assert not validator.isShipValid('Carrier')
+    validator.remove('Destroyer')
+    assert validator.isValid()
+    assert not validator.bodies.keys() - validator.zones.keys()
+
+
+def test_outside_of_grid():
+    validator = PlacementValidator()
+    board = Board()
+    for placement in [('h', (0, 6)), ('v', (3, 0)), ('h', (10, 0))]:
+        with pytest.raises(ValueError):
+            board.placeShip('Carrier', 5, *placement)
+        with pytest.raises(ValueError):
+            validator.move('Carrier', 5, *placement)
+    assert validator.isValid()
+    assert not validator.ships
+
+
+@pytest.mark.parametrize('sample, gridSize', [
+        (samplePlacements, (10, 10)), (sampleUniform, (10, 10)),
+        (samplePlacements, (7, 7)), (samplePlacements, (100, 100))])
+def test_samples_are_valid(sample, gridSize):
+    rng = Random(1)
+    for _ in range(50):
+        placements = sample(gridSize, FLEET, rng)
+        assert sorted(shipId for shipId, _, _, _ in placements) == sorted(
+                shipId for shipId, _ in FLEET)
+        validator = PlacementValidator(gridSize)
+        board = Board(gridSize)
+        for placement in placements:
+            validator.move(*placement)
+            board.placeShip(*placement)
+        assert validator.isValid()
+        assert board.isValid()
+
+
+def test_random_boards_are_reproducible():
+    first = [board.ships for board in randomBoards(5, seed=3)]
+    assert first == [board.ships for board in randomBoards(5, seed=3)]
+
+
+def test_fleet_does_not_fit():
+    with pytest.raises(ValueError):
+        samplePlacements((5, 5), FLEET, Random(0))
+
+
+@pytest.mark.parametrize('uniform', [False, True])
+def test_attempts_per_call(monkeypatch, uniform):
+    """
+    the placements tried are counted per call, not on the shared table
+    """
+    recorded = []
+    monkeypatch.setattr(
+            metrics, 'record', lambda name, value: recorded.append(value))
+    table = PlacementTable.get((10, 10))
+    table.sample(makeFleet({'Destroyer': 1}), Random(0), uniform)
+    table.sample(FLEET, Random(0), uniform)
+    table.sample(makeFleet({'Destroyer': 1}), Random(1), uniform)
+    assert recorded[0] == recorded[2] == 1
+    assert recorded[1] >= len(FLEET)
+    assert not hasattr(table, 'attempts')
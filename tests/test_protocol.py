@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from src.engine import FLEET, Placement, ShotResult, makeFleet
+from src.protocol import (
+        ACCEPTED, ERROR, FIRE, JOIN, MATCHED, MAX_PAYLOAD, PLACE, QUEUED,
+        RESULT, START, INVALID_PLACEMENT, UNSUPPORTED_GAME, NO_SHIP,
+        OPPONENT_LEFT,
+        FrameBuffer, ProtocolError, decodeCell, decodeFlag, decodeGameOver,
+        decodeJoin, decodePlace, decodeResult, encodeCell, encodeGameOver,
+        encodeJoin, encodePlace, encodeResult, encodeStart, frame)
+from src.server import MatchServer
+
+
+def unframe(data):
+    """
+    the single message of data
+    """
+    messages = FrameBuffer().feed(data)
+    assert len(messages) == 1
+    return messages[0]
+
+
+@pytest.mark.parametrize('fleet', [
+        FLEET, makeFleet({'Carrier': 3, 'Destroyer': 1000})])
+def test_join(fleet):
+    opcode, body = unframe(encodeJoin((800, 600), fleet))
+    assert opcode == JOIN
+    gridSize, counts = decodeJoin(body)
+    assert gridSize == (800, 600)
+    assert makeFleet(counts) == fleet
+
+
+def test_place():
+    placements = [('h', (0, 0)), ('v', (9, 3)), ('h', (65535, 1))]
+    opcode, body = unframe(encodePlace(placements))
+    assert opcode == PLACE
+    assert decodePlace(body) == placements
+
+
+def test_cell():
+    opcode, body = unframe(encodeCell(FIRE, (12, 345)))
+    assert opcode == FIRE
+    assert decodeCell(body) == (12, 345)
+
+
+def test_result():
+    fleet = makeFleet({'Carrier': 1, 'Destroyer': 2})
+    messages = [
+            ((3, 4), ShotResult('miss', None), NO_SHIP, None),
+            ((3, 5), ShotResult('hit', 'Carrier'), 0, None),
+            ((7, 1), ShotResult('sunk', 'Destroyer#2'), 2,
+             Placement('Destroyer#2', 2, 'v', (7, 1))),
+            ((0, 0), ShotResult('destroyed', 'Destroyer#1'), 1,
+             Placement('Destroyer#1', 2, 'h', (0, 0)))]
+    for cell, result, shipNo, placement in messages:
+        opcode, body = unframe(encodeResult(cell, result, shipNo, placement))
+        assert opcode == RESULT
+        assert decodeResult(body, fleet) == (cell, result, placement)
+
+
+def test_flags():
+    assert unframe(encodeStart(True)) == (START, b'\x01')
+    assert decodeFlag(unframe(encodeStart(False))[1]) == 0
+    body = unframe(encodeGameOver(True, OPPONENT_LEFT))[1]
+    assert decodeGameOver(body) == (True, OPPONENT_LEFT)
+
+
+def test_frame_buffer_split():
+    data = (encodeJoin((10, 10), FLEET) + frame(QUEUED)
+            + encodeCell(FIRE, (1, 2)))
+    buffer = FrameBuffer()
+    messages = []
+    for n in range(len(data)):
+        messages += buffer.feed(data[n:n + 1])
+    assert [opcode for opcode, _ in messages] == [JOIN, QUEUED, FIRE]
+    assert not buffer.data
+
+
+@pytest.mark.parametrize('length', [0, MAX_PAYLOAD + 1])
+def test_frame_size(length):
+    with pytest.raises(ProtocolError):
+        FrameBuffer().feed(length.to_bytes(2, 'big') + b'x')
+
+
+@pytest.mark.parametrize('decode, body', [
+        (decodeJoin, b'\x00\x0a\x00'),
+        (decodeJoin, b'\x00\x0a\x00\x0a\xff\x00\x01'),
+        (decodeJoin, b'\x00\x0a\x00\x0a\x00\x00\x00'),
+        (decodePlace, b'\x00\x02\x00\x00\x00\x00\x00'),
+        (decodePlace, b'\x00\x01\x00\x00\x00\x00\x02'),
+        (decodeCell, b'\x00\x01\x00'),
+        (decodeGameOver, b'\x01')])
+def test_bad_messages(decode, body):
+    with pytest.raises(ProtocolError):
+        decode(body)
+
+
+def test_bad_result():
+    fleet = makeFleet({'Carrier': 1})
+    body = unframe(encodeResult((0, 0), ShotResult('hit', 'Carrier'), 1))[1]
+    with pytest.raises(ProtocolError):
+        decodeResult(body, fleet)
+
+
+def test_fleet_not_made_by_make_fleet():
+    with pytest.raises(ProtocolError):
+        encodeJoin((10, 10), (('Destroyer', 2), ('Destroyer#2', 2)))
+
+
+class Client:
+    """
+    stands in for a Connection of the server
+    """
+
+    def __init__(self):
+        self.match = None
+        self.no = None
+        self.queue = None
+        self.messages = []
+
+    def send(self, data):
+        self.messages.append(unframe(data))
+
+
+def test_server_matches_and_places():
+    server = MatchServer()
+    first, second = Client(), Client()
+    join = unframe(encodeJoin((10, 10), FLEET))[1]
+    server.join(first, join)
+    server.join(second, join)
+    assert first.messages == [(QUEUED, b''), (MATCHED, b'')]
+    assert second.messages == [(MATCHED, b'')]
+    assert first.match is second.match
+    assert first.match.shipNumbers == {
+            shipId: no for no, (shipId, _) in enumerate(FLEET)}
+
+    touching = [('h', (no, 0)) for no in range(len(FLEET))]
+    server.place(first, unframe(encodePlace(touching))[1])
+    assert first.messages[2] == (ERROR, bytes((INVALID_PLACEMENT,)))
+    del first.messages[2]
+
+    placements = [('h', (2*no, 0)) for no in range(len(FLEET))]
+    for client in (first, second):
+        server.place(client, unframe(encodePlace(placements))[1])
+    assert first.messages[2] == (ACCEPTED, b'')
+    assert {first.messages[-1], second.messages[-1]} == {
+            (START, b'\x00'), (START, b'\x01')}
+
+
+def test_server_rejects_too_many_ships(monkeypatch):
+    """
+    the number of ships is checked before the fleet is built
+    """
+    server = MatchServer(maxShips=10)
+    client = Client()
+    monkeypatch.setattr('src.server.makeFleet', None)
+    server.join(client, unframe(encodeJoin(
+            (100, 100), makeFleet({'Destroyer': 11})))[1])
+    assert client.messages == [(ERROR, bytes((UNSUPPORTED_GAME,)))]
+    assert not server.waiting
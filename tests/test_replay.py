@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from random import Random
+
+import pytest
+
+from src.engine import FLEET, makeFleet
+from src.replay import (
+        Replay, ReplayError, ReplayWriter, decodeFleet, encodeFleet)
+from src.session import GameSession
+
+
+def playGame(session, rng, shots=None):
+    """
+    both players fire at random fields until the game is over (or shots
+    were fired), returns the (player, cell) of every shot
+    """
+    width, height = session.gridSize
+    fired = []
+    while not session.finished and len(fired) != shots:
+        player = session.currentPlayer
+        board = session.boards[session.opponent(player)]
+        cell = (rng.randrange(height), rng.randrange(width))
+        if board.isShot(cell):
+            continue
+        session.fire(player, cell)
+        fired.append((player, cell))
+    return fired
+
+
+def recordGame(path, gridSize=(10, 10), fleet=FLEET, seed=1, shots=None):
+    session = GameSession(gridSize, fleet, seed=seed, players=(0, 1))
+    session.recorder = ReplayWriter(path)
+    for player in session.players:
+        session.placeRandom(player)
+    session.start()
+    fired = playGame(session, Random(seed), shots)
+    session.recorder.close()
+    return session, fired
+
+
+# one, two and four bytes per field, the large game is not finished
+@pytest.mark.parametrize('gridSize, shots', [
+        ((10, 10), None), ((20, 30), None), ((300, 300), 500)])
+def test_round_trip(tmp_path, gridSize, shots):
+    path = tmp_path / 'game.bsr'
+    fleet = makeFleet({'Battleship': 1, 'Destroyer': 2})
+    session, fired = recordGame(path, gridSize, fleet, 7, shots)
+    with Replay(path) as replay:
+        assert replay.gridSize == gridSize
+        assert replay.fleet == fleet
+        assert replay.seed == 7
+        assert replay.turns == len(fired)
+        assert replay.placements == [
+                session.boards[player].ships for player in session.players]
+        for turn, (player, cell) in enumerate(fired):
+            shooter, field, _ = replay.shot(turn)
+            assert (shooter, field) == (player, cell)
+        assert replay.winner() == session.winner
+        for player in session.players:
+            board = session.boards[player]
+            assert set(replay.hits[player]) == set(board.hits)
+            assert len(replay.misses[player]) == len(board.shots) - len(
+                    board.hits)
+            assert sorted(replay.sunk[player]) == sorted(board.sunk)
+
+
+def test_seek_backwards(tmp_path):
+    path = tmp_path / 'game.bsr'
+    recordGame(path)
+    with Replay(path) as replay:
+        middle = replay.turns//2
+        states = []
+        for turn in (middle, replay.turns, middle, 0):
+            replay.seek(turn)
+            states.append((
+                    [set(hits) for hits in replay.hits],
+                    [set(misses) for misses in replay.misses],
+                    [set(sunk) for sunk in replay.sunk], replay.ticks))
+        assert states[0] == states[2]
+        assert states[3] == ([set(), set()], [set(), set()],
+                             [set(), set()], 0)
+        assert replay.seek(-5).turn == 0
+        assert replay.seek(replay.turns + 5).turn == replay.turns
+
+
+def test_unknown_seed(tmp_path):
+    path = tmp_path / 'game.bsr'
+    recordGame(path, seed='not an integer')
+    with Replay(path) as replay:
+        assert replay.seed is None
+
+
+@pytest.mark.parametrize('data', [b'', b'BSRP', b'not a replay file' * 4])
+def test_not_a_replay(tmp_path, data):
+    path = tmp_path / 'bad.bsr'
+    path.write_bytes(data)
+    with pytest.raises(ReplayError):
+        Replay(path)
+
+
+def test_fleet_round_trip():
+    fleet = makeFleet({'Carrier': 2, 'Submarine': 1, 'Destroyer': 4})
+    types, data = encodeFleet(fleet)
+    assert decodeFleet(data, 0, types) == (fleet, len(data))
+
+
+def test_fleet_not_made_by_make_fleet():
+    with pytest.raises(ReplayError):
+        encodeFleet((('Destroyer', 2), ('Carrier', 5), ('Destroyer#2', 2)))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+
+import pytest
+
+from src.engine import makeFleet
+from src.simulate import (
+        Statistics, parseFleet, parseSize, playGames, simulate)
+
+
+def gameResults(players, games, **kwargs):
+    results = []
+    simulate(players, games, onChunk=results.extend, **kwargs)
+    return sorted(results)
+
+
+@pytest.mark.parametrize('players', [
+        ('hunter', 'random'), ('expert', 'hunter')])
+def test_same_seed_same_games(players):
+    """
+    the games depend on the seed only, not on the number of workers or how
+    the games are split into chunks
+    """
+    games = 6 if 'expert' in players else 20
+    kwargs = {'seed': 'test', 'sampleLimit': 50}
+    single = gameResults(players, games, workers=1, chunkSize=games,
+                         **kwargs)
+    assert [gameNo for gameNo, _, _ in single] == list(range(games))
+    assert gameResults(players, games, workers=3, chunkSize=1,
+                       **kwargs) == single
+    assert gameResults(players, games, workers=2, chunkSize=4,
+                       **kwargs) == single
+    assert gameResults(players, games, workers=2, seed='other',
+                       sampleLimit=50) != single
+
+
+def test_games_in_this_process():
+    players = ('hunter', 'random')
+    assert playGames(players, 'test', 2, 5) == gameResults(
+            players, 8, seed='test', workers=2)[2:5]
+
+
+def test_statistics():
+    statistics = Statistics(('a', 'b'))
+    for winner, shots in [(0, [30, 29]), (0, [40, 39]), (1, [50, 51])]:
+        statistics.add(winner, shots)
+    summary = statistics.summary()
+    assert summary['games'] == 3
+    a, b = summary['players']
+    assert (a['wins'], b['wins']) == (2, 1)
+    assert a['shotsToWin']['mean'] == 35
+    assert a['shotsToWin']['histogram'] == {30: 1, 40: 1}
+    assert b['shotsToWin']['min'] == 51
+
+
+def test_board_and_fleet():
+    fleet = parseFleet('Carrier=2,Destroyer')
+    assert fleet == makeFleet({'Carrier': 2, 'Destroyer': 1})
+    assert parseSize('12x8') == (12, 8)
+    assert parseSize('15') == (15, 15)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parseFleet('Rowboat=3')
+    statistics = simulate(('hunter', 'random'), 4, workers=2,
+                          gridSize=(12, 8), fleet=fleet)
+    assert statistics.games == 4
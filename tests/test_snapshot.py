@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from random import Random
+
+import pytest
+
+from src.engine import makeFleet
+from src.session import GameSession
+from src.snapshot import SnapshotError, load, restore, snapshot, writeAtomic
+
+
+def newSession(gridSize=(10, 10), seed=3):
+    session = GameSession(gridSize, seed=seed)
+    for player in session.players:
+        session.placeRandom(player)
+    return session
+
+
+def fireRandom(session, rng, shots):
+    """
+    the players fire at random fields, returns the results
+    """
+    width, height = session.gridSize
+    results = []
+    while not session.finished and len(results) < shots:
+        player = session.currentPlayer
+        cell = (rng.randrange(height), rng.randrange(width))
+        if session.boards[session.opponent(player)].isShot(cell):
+            continue
+        results.append((player, cell, session.fire(player, cell)))
+    return results
+
+
+def assertSameState(session, copy):
+    assert copy.gridSize == session.gridSize
+    assert copy.fleet == session.fleet
+    assert copy.currentPlayer == session.currentPlayer
+    assert copy.finished == session.finished
+    assert copy.winner == session.winner
+    for player in session.players:
+        board, other = session.boards[player], copy.boards[player]
+        assert other.ships == board.ships
+        assert other.shots == board.shots
+        assert other.hits == board.hits
+        assert sorted(other.sunk) == sorted(board.sunk)
+        assert other.isEliminated() == board.isEliminated()
+
+
+@pytest.mark.parametrize('gridSize', [(10, 10), (40, 40), (300, 300)])
+def test_round_trip(gridSize):
+    session = newSession(gridSize)
+    session.start()
+    fireRandom(session, Random(1), 60)
+    assertSameState(session, restore(snapshot(session)))
+
+
+def test_not_started():
+    session = newSession()
+    copy = restore(snapshot(session))
+    assertSameState(session, copy)
+    assert copy.currentPlayer is None
+
+
+def test_finished():
+    session = newSession()
+    session.start()
+    fireRandom(session, Random(2), 200)
+    assert session.finished
+    assertSameState(session, restore(snapshot(session)))
+
+
+def test_game_continues_the_same():
+    """
+    a restored session draws the same random numbers and the rest of the
+    game gives the same results
+    """
+    session = newSession(seed=5)
+    session.start()
+    fireRandom(session, Random(3), 30)
+    copy = restore(snapshot(session))
+    assert copy.rng.random() == session.rng.random()
+    assert (fireRandom(copy, Random(4), 200)
+            == fireRandom(session, Random(4), 200))
+    assertSameState(session, copy)
+
+
+def test_fleet_with_several_ships_of_a_type():
+    session = GameSession((12, 12), makeFleet({'Carrier': 2, 'Destroyer': 3}))
+    for player in session.players:
+        session.placeRandom(player)
+    session.start()
+    fireRandom(session, Random(6), 40)
+    assertSameState(session, restore(snapshot(session)))
+
+
+def test_truncated():
+    session = newSession()
+    session.start()
+    fireRandom(session, Random(1), 20)
+    data = snapshot(session)
+    for size in (0, 10, len(data)//2, len(data) - 1):
+        with pytest.raises(SnapshotError):
+            restore(data[:size])
+
+
+def test_not_a_snapshot():
+    data = bytearray(snapshot(newSession()))
+    data[:4] = b'BSRP'
+    with pytest.raises(SnapshotError):
+        restore(bytes(data))
+
+
+def test_file(tmp_path):
+    session = newSession()
+    session.start()
+    fireRandom(session, Random(1), 20)
+    path = tmp_path / 'saves' / 'autosave.bss'
+    writeAtomic(path, snapshot(session))
+    writeAtomic(path, snapshot(session))
+    assertSameState(session, load(path))
+    assert [file.name for file in path.parent.iterdir()] == ['autosave.bss']
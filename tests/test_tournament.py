@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from src.engine import makeFleet
+from src.tournament import (
+        ResultsError, fitRatings, loadResults, ratings, tournament)
+
+
+def games(pair, won, lost, shots=(40, 50), cpu=(.04, .05)):
+    """
+    results of won games of the first player of the pair and lost ones
+    """
+    return [{'pair': list(pair), 'game': no, 'first': no % 2,
+             'winner': int(no >= won), 'shots': list(shots), 'cpu': list(cpu)}
+            for no in range(won + lost)]
+
+
+def test_fit_ratings():
+    wins = np.array([[0, 30, 40], [10, 0, 30], [0, 10, 0]])
+    elo = fitRatings(wins)
+    assert np.isfinite(elo).all()
+    assert elo.mean() == pytest.approx(1500)
+    assert elo[0] > elo[1] > elo[2]
+
+
+def test_even_players():
+    results = games(('a', 'b'), 10, 10)
+    summary = ratings(['a', 'b'], results)
+    for stat in summary.values():
+        assert stat['elo'] == pytest.approx(1500)
+        assert stat['low'] < 1500 < stat['high']
+        assert stat['games'] == 20
+        assert stat['winRate'] == .5
+
+
+def test_statistics():
+    results = games(('a', 'b'), 3, 1, shots=(40, 60), cpu=(.08, .12))
+    summary = ratings(['a', 'b'], results, resamples=0)
+    assert summary['a']['winRate'] == .75
+    assert summary['a']['shotsToWin'] == 40
+    assert summary['b']['shotsToWin'] == 60
+    assert summary['a']['cpuPerMove'] == pytest.approx(2)
+    assert summary['a']['low'] == summary['a']['elo']
+
+
+def test_one_sided_pair():
+    """
+    a pair with one winner only has an interval, not a single value
+    """
+    summary = ratings(['a', 'b'], games(('a', 'b'), 20, 0))
+    a, b = summary['a'], summary['b']
+    assert a['elo'] > 1500 > b['elo']
+    assert a['low'] < a['high'] and b['low'] < b['high']
+    assert a['low'] > b['high']
+
+
+def test_other_players_are_ignored():
+    results = games(('a', 'b'), 5, 5) + games(('a', 'c'), 10, 0)
+    summary = ratings(['a', 'b'], results)
+    assert set(summary) == {'a', 'b'}
+    assert summary['a']['games'] == 10
+    assert summary['a']['elo'] == pytest.approx(1500)
+
+
+def test_reproducible():
+    results = games(('a', 'b'), 12, 5) + games(('b', 'c'), 7, 9)
+    players = ['a', 'b', 'c']
+    assert ratings(players, results, seed=3) == ratings(
+            players, results, seed=3)
+
+
+def test_resume(tmp_path):
+    """
+    a tournament resumes from its results file, but not with other settings
+    """
+    path = tmp_path / 'results.jsonl'
+    players = ['random', 'hunter']
+    first = tournament(players, 3, seed=1, workers=1, results=path)
+    assert len(first) == 3
+    resumed = tournament(players, 5, seed=1, workers=1, results=path)
+    assert resumed[:3] == first and len(resumed) == 5
+    settings, results = loadResults(path)
+    assert settings['seed'] == '1' and results == resumed
+    for changed in ({'seed': 2}, {'gridSize': (12, 12)},
+                    {'fleet': makeFleet({'Carrier': 2})},
+                    {'sampleLimit': 10}):
+        with pytest.raises(ResultsError):
+            tournament(players, 5, workers=1, results=path,
+                       **{'seed': 1, **changed})